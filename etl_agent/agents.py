@@ -1,24 +1,6 @@
 from agents import Agent
 from etl_agent.tools import *
-from etl_agent.templates import PLAN_SCHEMA_HINT
-
-GREETING = (
-    "Hey! I’m your data engineer agent.\n"
-    "Capabilities: extract (CSV/API/DB), transform (SQL or NL like 'clean, aggregate by date'), "
-    "load (Postgres/CSV), DQ checks, verification, and optional alerts.\n\n"
-    "Prompt format (example):\n"
-    "limits:\n"
-    "  max_input_bytes: 1073741824  # optional 1 GiB cap\n"
-    "Source: db conn_str=$POSTGRES_URL\n"
-    "Query:\n"
-    "  SELECT sku, name, price AS salePrice, updated_at AS itemUpdateDate FROM upstream.products;\n"
-    "Transform:\n"
-    "  clean data; aggregate numeric columns (sum, avg) grouped by date/name-like fields\n"
-    "Load: conn_str=$POSTGRES_URL, table=analytics.products_db, mode=replace\n"
-    "Checks: min_rows=2, nonnull_cols=[sku,name,sale_price]\n"
-    "Verify: ts_col=loaded_at, max_lag_minutes=60\n"
-    "Alerts:  # optional; omit if not set up\n"
-)
+from etl_agent.templates import PLAN_SCHEMA_HINT, GREETING
 
 PLANNER_SYS = (
     "You are the planning agent for etl_agent. Convert the user's natural-language request "
@@ -0,0 +1,263 @@
+"""Paginated REST extraction.
+
+Pages are fetched on asyncio with bounded concurrency, retried with exponential
+backoff (honouring Retry-After), throttled to an optional request rate, and
+normalized into Arrow record batches as they arrive. Page bodies are dropped as
+soon as their batch is built; batches reach the sink in page order (run() keeps
+them for one table, run_into() appends each to a DuckDB table straight away).
+
+source.api (or a source.inputs entry of kind api):
+  url, params, headers, json_path
+  pagination: {type: page|offset|cursor, param, size_param, size, start,
+               total_pages_path, cursor_path, max_pages}
+  concurrency: 4, retries: 4, backoff: 0.5, rate_limit: <requests/sec>, timeout: 60
+"""
+import asyncio, random, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import pandas as pd
+import pyarrow as pa
+from etl_agent.ops import select_json
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class ApiExtractor:
+    def __init__(self, url: str, params: Optional[dict] = None, json_path: str = "",
+                 pagination: Optional[dict] = None, headers: Optional[dict] = None,
+                 concurrency: int = 4, retries: int = 4, backoff: float = 0.5,
+                 rate_limit: Optional[float] = None, timeout: float = 60):
+        self.url = url
+        self.params = dict(params or {})
+        self.json_path = json_path
+        self.pagination = dict(pagination or {})
+        self.headers = headers or {}
+        self.concurrency = max(1, int(concurrency))
+        self.retries = int(retries)
+        self.backoff = float(backoff)
+        self.interval = 1.0 / float(rate_limit) if rate_limit else 0.0
+        self.timeout = timeout
+        self.stats = {"pages": 0, "requests": 0, "retries": 0, "rows": 0}
+        self._next_slot = 0.0
+        self._sink = None
+
+    @classmethod
+    def from_spec(cls, spec: dict, params: Optional[dict] = None) -> "ApiExtractor":
+        opts = {k: spec[k] for k in ("headers", "concurrency", "retries", "backoff", "rate_limit", "timeout") if k in spec}
+        return cls(spec["url"], params=spec.get("params", {}) if params is None else params,
+                   json_path=spec.get("json_path", ""), pagination=spec.get("pagination"), **opts)
+
+    def run(self) -> pa.Table:
+        """Fetch every page and return one Arrow table (columns unified across pages)."""
+        batches = []
+        self._fetch_all(batches.append)
+        return _concat(batches)
+
+    def run_into(self, con, table: str) -> dict:
+        """Append every page to DuckDB table `table` on `con` as it arrives, so only the
+        pages in flight are held; returns the stats."""
+        writer = _TableWriter(con, table)
+        self._fetch_all(writer)
+        if not writer.types:
+            raise ValueError(f"api source {self.url} returned no rows")
+        return dict(self.stats)
+
+    def _fetch_all(self, sink) -> None:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.run_async(sink))
+        # called from inside an event loop (e.g. an async tool runner): use a private one
+        with ThreadPoolExecutor(max_workers=1) as ex:
+            return ex.submit(asyncio.run, self.run_async(sink)).result()
+
+    async def run_async(self, sink) -> None:
+        """Fetch every page, calling sink(batch) for each non-empty one in page order."""
+        import requests
+        self._session = requests.Session()
+        self._sem = asyncio.Semaphore(self.concurrency)
+        self._throttle_lock = asyncio.Lock()
+        self._sink, self._ready, self._next_seq, self._last, self._closed = sink, {}, 0, None, False
+        try:
+            kind = self.pagination.get("type")
+            if not kind:
+                await self._page(self.params, 0)
+            elif kind in ("page", "offset"):
+                await self._numbered(kind)
+            elif kind == "cursor":
+                await self._cursor()
+            else:
+                raise ValueError(f"pagination.type must be page|offset|cursor; got {kind!r}")
+        finally:
+            self._session.close()
+
+    async def _numbered(self, kind: str) -> None:
+        p = self.pagination
+        size = p.get("size")
+        if kind == "offset" and not size:
+            raise ValueError("offset pagination requires pagination.size")
+        param = p.get("param", "page" if kind == "page" else "offset")
+        start = p.get("start", 1 if kind == "page" else 0)
+        step = 1 if kind == "page" else size
+        max_pages = int(p.get("max_pages", 10_000))
+
+        def params_for(i: int) -> dict:
+            d = dict(self.params)
+            d[param] = start + i * step
+            if size and p.get("size_param"):
+                d[p["size_param"]] = size
+            return d
+
+        def last(rows: int) -> bool:
+            return rows == 0 or bool(size and rows < size)
+
+        body, rows = await self._page(params_for(0), 0, keep_body=True)
+        total = _optional(body, p.get("total_pages_path"))
+        del body
+        if total is not None:
+            # page count known up front: schedule every remaining page at once (the
+            # semaphore keeps `concurrency` in flight)
+            await asyncio.gather(*(self._page(params_for(i), i) for i in range(1, min(int(total), max_pages))))
+            return
+        # pages past the first short/empty one are not delivered
+        self._last = last
+        i, done = 1, last(rows)
+        while not done and i < max_pages:
+            # unknown length: fetch `concurrency` pages per round until a short/empty page
+            window = range(i, min(i + self.concurrency, max_pages))
+            done = any(last(n) for _, n in await asyncio.gather(*(self._page(params_for(j), j) for j in window)))
+            i += len(window)
+
+    async def _cursor(self) -> None:
+        p = self.pagination
+        if not p.get("cursor_path"):
+            raise ValueError("cursor pagination requires pagination.cursor_path")
+        param, max_pages = p.get("param", "cursor"), int(p.get("max_pages", 10_000))
+        params = dict(self.params)
+        for i in range(max_pages):
+            body, rows = await self._page(params, i, keep_body=True)
+            nxt = _optional(body, p["cursor_path"])
+            if not nxt or not rows:
+                break
+            params = {**self.params, param: nxt}
+
+    async def _page(self, params: dict, seq: int, keep_body: bool = False):
+        # (body if keep_body else None, rows); the batch goes to the sink, not the caller
+        async with self._sem:
+            body = await self._get(params)
+        batch = _normalize(select_json(body, self.json_path))
+        rows = batch.num_rows if batch is not None else 0
+        self.stats["pages"] += 1
+        self.stats["rows"] += rows
+        self._deliver(seq, batch, rows)
+        return (body if keep_body else None), rows
+
+    def _deliver(self, seq: int, batch, rows: int) -> None:
+        # pages finish out of order: hold only those that overtook a slower one
+        self._ready[seq] = (batch, rows)
+        while self._next_seq in self._ready and not self._closed:
+            batch, rows = self._ready.pop(self._next_seq)
+            self._next_seq += 1
+            if rows:
+                self._sink(batch)
+            if self._last is not None and self._last(rows):
+                self._closed = True
+        if self._closed:
+            self._ready.clear()
+
+    async def _get(self, params: dict):
+        import requests
+        for attempt in range(self.retries + 1):
+            await self._throttle()
+            self.stats["requests"] += 1
+            wait = None
+            try:
+                r = await asyncio.to_thread(self._session.get, self.url, params=params,
+                                            headers=self.headers, timeout=self.timeout)
+                if r.status_code not in RETRY_STATUS:
+                    r.raise_for_status()
+                    return r.json()
+                wait = _retry_after(r.headers.get("Retry-After"))
+                if attempt == self.retries:
+                    r.raise_for_status()
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+            self.stats["retries"] += 1
+            await asyncio.sleep(wait if wait is not None else self.backoff * (2 ** attempt) * (1 + random.random() / 2))
+
+    async def _throttle(self):
+        if not self.interval:
+            return
+        async with self._throttle_lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+def _optional(body, path: Optional[str]):
+    if not path:
+        return None
+    try:
+        return select_json(body, path)
+    except (KeyError, IndexError, TypeError):
+        return None
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None  # HTTP-date form: fall back to exponential backoff
+
+def _normalize(rows):
+    if isinstance(rows, dict):
+        rows = [rows]
+    if not rows:
+        return None
+    return pa.RecordBatch.from_pandas(pd.json_normalize(rows), preserve_index=False)
+
+_NUMERIC = ("TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "FLOAT", "DOUBLE", "DECIMAL")
+
+def _qident(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+class _TableWriter:
+    """Sink appending Arrow batches to a DuckDB table. Later pages may bring new columns
+    (added) or a different type (numbers widen to DOUBLE, anything else to VARCHAR), the
+    way _concat unifies pages in memory."""
+
+    def __init__(self, con, table: str):
+        self.con, self.table, self.types = con, table, None
+
+    def __call__(self, batch: pa.RecordBatch) -> None:
+        con, t = self.con, _qident(self.table)
+        con.register("_api_page", batch)
+        try:
+            if self.types is None:
+                con.execute(f"CREATE OR REPLACE TABLE {t} AS SELECT * FROM _api_page")
+            else:
+                for col, typ, *_ in con.execute("DESCRIBE _api_page").fetchall():
+                    have = self.types.get(col)
+                    if have is None:
+                        con.execute(f"ALTER TABLE {t} ADD COLUMN {_qident(col)} {typ}")
+                    elif pa.types.is_null(batch.schema.field(col).type):
+                        continue  # an all-null page says nothing about the type
+                    elif have != typ:
+                        wide = "DOUBLE" if have.startswith(_NUMERIC) and typ.startswith(_NUMERIC) else "VARCHAR"
+                        if wide != have:
+                            con.execute(f"ALTER TABLE {t} ALTER {_qident(col)} TYPE {wide}")
+                con.execute(f"INSERT INTO {t} BY NAME SELECT * FROM _api_page")
+            self.types = dict(r[:2] for r in con.execute(f"DESCRIBE {t}").fetchall())
+        finally:
+            con.unregister("_api_page")
+
+def _concat(batches: list) -> pa.Table:
+    if not batches:
+        return pa.table({})
+    tables = [pa.Table.from_batches([b]) for b in batches]
+    for opts in ({"promote_options": "permissive"}, {"promote_options": "default"}, {"promote": True}):
+        try:
+            return pa.concat_tables(tables, **opts)
+        except TypeError:
+            continue  # older pyarrow without promote_options
+    return pa.concat_tables(tables)
@@ -0,0 +1,110 @@
+"""`etl_agent batch`: run many prompts / plan YAMLs in one invocation.
+
+Jobs run on a bounded pool of worker processes. Each worker pays the imports and
+the executor snippet once, then reuses them for every job it picks up; each run
+still frees its own dataframe registry handles. The combined JSON summary carries
+per-job status and timings.
+"""
+import os, sys, json, time, argparse, traceback, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List
+
+JOB_SUFFIXES = (".yaml", ".yml", ".txt", ".prompt")
+
+def collect_jobs(target: str) -> List[dict]:
+    """[{name, prompt}] from a directory of prompt/plan files, or a manifest file:
+    .json/.jsonl/.yaml list of paths or {name, path|prompt} entries, else one path per line."""
+    p = Path(target)
+    if p.is_dir():
+        files = sorted(f for f in p.iterdir() if f.is_file() and f.suffix.lower() in JOB_SUFFIXES)
+        return [{"name": f.name, "prompt": f.read_text()} for f in files]
+    if not p.is_file():
+        raise FileNotFoundError(target)
+    text = p.read_text()
+    if p.suffix.lower() == ".jsonl":
+        entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+    elif p.suffix.lower() == ".json":
+        entries = json.loads(text)
+    elif p.suffix.lower() in (".yaml", ".yml"):
+        import yaml
+        entries = yaml.safe_load(text)
+    else:
+        entries = [line.strip() for line in text.splitlines() if line.strip() and not line.lstrip().startswith("#")]
+    jobs = []
+    for i, e in enumerate(entries or []):
+        if isinstance(e, str):
+            e = {"path": e}
+        if "prompt" in e:
+            jobs.append({"name": e.get("name", f"job{i}"), "prompt": e["prompt"]})
+        else:
+            path = (p.parent / e["path"]) if not os.path.isabs(e["path"]) else Path(e["path"])
+            jobs.append({"name": e.get("name", Path(e["path"]).name), "prompt": path.read_text()})
+    return jobs
+
+def _warm():
+    # worker initializer: heavy imports + executor snippet, once per process
+    from etl_agent import runtime
+    runtime.executor_namespace()
+
+def _run_job(job: dict, use_cache: bool = True) -> dict:
+    from etl_agent.runtime import run_prompt
+    t0 = time.perf_counter()
+    out = {"name": job["name"], "pid": os.getpid()}
+    try:
+        result = run_prompt(job["prompt"], use_cache=use_cache)
+        ok = isinstance(result, dict) and result.get("status") == "ok"
+        out.update({"status": "ok" if ok else "failed", "result": result})
+    except Exception as e:
+        out.update({"status": "error", "error": f"{type(e).__name__}: {e}",
+                    "traceback": traceback.format_exc(limit=5)})
+    out["seconds"] = round(time.perf_counter() - t0, 3)
+    return out
+
+def run_batch(jobs: List[dict], workers: int = 4, use_cache: bool = True, max_jobs_per_worker=None) -> dict:
+    t0 = time.perf_counter()
+    workers = max(1, min(int(workers), len(jobs) or 1))
+    kw = {}
+    if max_jobs_per_worker and sys.version_info >= (3, 11):
+        kw["max_tasks_per_child"] = int(max_jobs_per_worker)  # recycle workers (leaky plans)
+    # spawn: workers must not inherit the parent's pooled connections or threads
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_warm, **kw) as pool:
+        futures = [pool.submit(_run_job, job, use_cache) for job in jobs]
+        for fut in as_completed(futures):
+            r = fut.result()
+            print(f"[batch] {r['name']}: {r['status']} in {r['seconds']}s", file=sys.stderr)
+            results.append(r)
+    order = {job["name"]: i for i, job in enumerate(jobs)}
+    results.sort(key=lambda r: order.get(r["name"], 0))
+    status = {s: sum(r["status"] == s for r in results) for s in ("ok", "failed", "error")}
+    return {
+        "jobs": len(jobs), **status, "workers": workers,
+        "wall_seconds": round(time.perf_counter() - t0, 3),
+        "job_seconds": round(sum(r["seconds"] for r in results), 3),
+        "results": results,
+    }
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="etl_agent batch", description="Run many prompts / plan YAMLs concurrently")
+    ap.add_argument("target", help="Directory of prompt/plan files, or a manifest (.json/.jsonl/.yaml/.txt list).")
+    ap.add_argument("-j", "--workers", type=int, default=int(os.getenv("ETL_AGENT_BATCH_WORKERS", os.cpu_count() or 4)),
+                    help="Worker processes (default: CPU count).")
+    ap.add_argument("--max-jobs-per-worker", type=int, default=None, help="Restart a worker after this many jobs.")
+    ap.add_argument("--no-plan-cache", action="store_true", help="Always plan with the LLM; do not read or write the plan cache.")
+    ap.add_argument("-o", "--out", help="Write the JSON summary here instead of stdout.")
+    args = ap.parse_args(argv)
+
+    jobs = collect_jobs(args.target)
+    if not jobs:
+        print(f"no jobs found in {args.target}", file=sys.stderr)
+        return 0
+    summary = run_batch(jobs, workers=args.workers, use_cache=not args.no_plan_cache,
+                        max_jobs_per_worker=args.max_jobs_per_worker)
+    text = json.dumps(summary, indent=2, default=str)
+    if args.out:
+        Path(args.out).write_text(text)
+    else:
+        print(text)
+    return 0 if summary["ok"] == summary["jobs"] else 1
@@ -0,0 +1,306 @@
+"""`etl_agent bench`: performance benchmarks.
+
+startup  cold-start cost of the offline path: `python -X importtime` of the
+         executor (cumulative time per top-level import) and wall time of
+         fresh `etl_agent` processes running a YAML plan.
+scale    the prompt.txt plan over synthetic Walmart-style sales/features/stores
+         at several scale factors: per-stage time, throughput and peak RSS of a
+         fresh process per run, stored in the memory DB and compared against a
+         baseline run.
+"""
+import os, sys, json, time, argparse, statistics, subprocess
+from pathlib import Path
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+DEFAULT_PLAN = Path(__file__).resolve().parents[1] / "prompt.txt"
+BENCH_DIR = os.getenv("ETL_AGENT_BENCH_DIR", ".etl_agent_bench")
+# sales history covers the first 143 weeks of the features calendar; stores carry
+# about 81 of 99 department ids (the shape of the Walmart sales data at 1x)
+SALES_WEEKS, DEPTS, DEPT_SHARE = 143, 99, 82
+# a stage regresses when it is this much slower than the baseline (and by more than the noise floor)
+REGRESSION_THRESHOLD, NOISE_FLOOR_MS = 0.20, 50.0
+
+# modules the offline path should never pull in (planning/tooling/orchestration only)
+LAZY_MODULES = ("agents", "openai", "sqlalchemy", "requests", "prefect", "etl_agent.tools", "etl_agent.memory")
+
+def import_times(module: str = "etl_agent.executor", top: int = 15) -> dict:
+    """Parse `python -X importtime -c 'import <module>'`: total and the slowest top-level imports (ms)."""
+    probe = f"import sys, {module}; print(sorted(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", probe],
+                          capture_output=True, text=True, check=True, env=_env())
+    rows = []  # (module, depth, self_us, cumulative_us)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cum_us)))
+    total = sum(r[2] for r in rows)
+    shallow = sorted((r for r in rows if r[1] <= 1), key=lambda r: -r[3])[:top]
+    return {
+        "module": module,
+        "total_ms": round(total / 1000, 1),
+        "top": [{"module": n, "cumulative_ms": round(c / 1000, 1)} for n, _, _, c in shallow],
+        "lazy_modules_loaded": json.loads(proc.stdout.strip().replace("'", '"') or "[]"),
+    }
+
+def cold_runs(plan: str, repeat: int = 5) -> dict:
+    """Wall time of fresh `python -m etl_agent.cli -p <plan>` processes in offline mode."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "etl_agent.cli", "--no-greet", "-p", plan],
+                       capture_output=True, check=True, env={**_env(), "ETL_AGENT_OFFLINE": "1"})
+        times.append(time.perf_counter() - t0)
+    return {"plan": plan, "repeat": repeat, "median_s": round(statistics.median(times), 3),
+            "min_s": round(min(times), 3), "max_s": round(max(times), 3)}
+
+def _env() -> dict:
+    # children import this checkout, whatever the caller's working directory
+    root = str(Path(__file__).resolve().parents[1])
+    return {**os.environ, "PYTHONPATH": os.pathsep.join(p for p in (root, os.environ.get("PYTHONPATH")) if p)}
+
+def startup(plan: str = "", repeat: int = 5) -> dict:
+    out = {"python": sys.version.split()[0], "imports": import_times()}
+    if plan:
+        out["cold_run"] = cold_runs(plan, repeat)
+    return out
+
+# --- scale-factor suite
+
+def _u(*keys: str) -> str:
+    # deterministic uniform in (0, 1] from a hash of the given SQL expressions
+    return f"((hash({', '.join(keys)}) % 1000000) + 1) / 1000000.0"
+
+def generate(scale: float, out_dir: str = BENCH_DIR, seed: int = 0) -> dict:
+    """Write sales/features/stores CSVs at `scale` x the bundled data (45 stores x 182 weeks).
+
+    Stores are cloned (with jittered sizes and temperatures) so every sales row still
+    joins exactly one features row and one store row; dates are written as ISO dates.
+    A dataset already generated with the same parameters is reused."""
+    import duckdb
+    from etl_agent.ops import sql_literal
+    out = Path(out_dir) / f"sf{scale:g}"
+    meta_path = out / "dataset.json"
+    params = {"scale": scale, "seed": seed, "version": 1}
+    if meta_path.exists():
+        meta = json.loads(meta_path.read_text())
+        if meta.get("params") == params and all(Path(p).exists() for p in meta["paths"].values()):
+            return meta
+    out.mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+    con = duckdb.connect()
+    con.execute(f"""CREATE TEMP TABLE base_stores AS
+        SELECT *, row_number() OVER (ORDER BY Store) - 1 AS idx
+        FROM read_csv({sql_literal(str(DATA_DIR / 'stores_dataset.csv'))}, all_varchar=true)""")
+    n_base = con.execute("SELECT COUNT(*) FROM base_stores").fetchone()[0]
+    n = max(1, round(n_base * scale))
+    con.execute(f"""CREATE TEMP TABLE sx AS
+        SELECT i + 1 AS Store, b.Store AS base, b.Type, i >= {n_base} AS clone
+        FROM range({n}) t(i) JOIN base_stores b ON i % {n_base} = b.idx""")
+    con.execute(f"""CREATE TEMP TABLE base_features AS
+        SELECT *, strptime(Date, '%d/%m/%Y')::DATE AS d,
+               row_number() OVER (PARTITION BY Store ORDER BY strptime(Date, '%d/%m/%Y')) AS wk
+        FROM read_csv({sql_literal(str(DATA_DIR / 'Features_dataset.csv'))}, all_varchar=true)""")
+    paths = {k: str(out / f"{k}.csv") for k in ("sales", "features", "stores")}
+    z = f"sqrt(-2 * ln({_u(str(seed), 'sx.Store', 'dp.Dept', '1')})) * cos(2 * pi() * {_u(str(seed), 'sx.Store', 'dp.Dept', '2')})"
+    rows = {}
+    rows["stores"] = con.execute(f"""COPY (
+        SELECT sx.Store, sx.Type,
+               CASE WHEN clone THEN round(CAST(b.Size AS BIGINT) * (0.9 + 0.2 * {_u(str(seed), 'sx.Store')}))::BIGINT
+                    ELSE CAST(b.Size AS BIGINT) END AS Size
+        FROM sx JOIN base_stores b ON b.Store = sx.base ORDER BY sx.Store
+        ) TO {sql_literal(paths['stores'])} (HEADER)""").fetchone()[0]
+    rows["features"] = con.execute(f"""COPY (
+        SELECT sx.Store, strftime(f.d, '%Y-%m-%d') AS Date,
+               round(TRY_CAST(f.Temperature AS DOUBLE) + CASE WHEN clone THEN 4 * ({_u(str(seed), 'sx.Store', 'f.wk')} - 0.5) ELSE 0 END, 2) AS Temperature,
+               f.Fuel_Price, f.MarkDown1, f.MarkDown2, f.MarkDown3, f.MarkDown4, f.MarkDown5,
+               f.CPI, f.Unemployment, f.IsHoliday
+        FROM sx JOIN base_features f ON f.Store = sx.base ORDER BY sx.Store, f.d
+        ) TO {sql_literal(paths['features'])} (HEADER)""").fetchone()[0]
+    # weekly sales: log-normal level per (store, dept), weekly noise, holiday lift
+    rows["sales"] = con.execute(f"""COPY (
+        WITH sd AS (
+          SELECT sx.Store, sx.base, dp.Dept, exp(8.6 + 1.3 * {z}) AS level
+          FROM sx CROSS JOIN (SELECT i + 1 AS Dept FROM range({DEPTS}) t(i)) dp
+          WHERE hash({seed}, sx.Store, dp.Dept) % 100 < {DEPT_SHARE}
+        )
+        SELECT sd.Store, sd.Dept, strftime(f.d, '%Y-%m-%d') AS Date,
+               round(sd.level * (0.85 + 0.3 * {_u(str(seed), 'sd.Store', 'sd.Dept', 'f.wk')})
+                     * CASE WHEN f.IsHoliday = 'TRUE' THEN 1.12 ELSE 1 END, 2) AS Weekly_Sales,
+               f.IsHoliday = 'TRUE' AS IsHoliday
+        FROM sd JOIN base_features f ON f.Store = sd.base AND f.wk <= {SALES_WEEKS}
+        ORDER BY sd.Store, sd.Dept, f.d
+        ) TO {sql_literal(paths['sales'])} (HEADER)""").fetchone()[0]
+    con.close()
+    meta = {"params": params, "stores": n, "paths": paths, "rows": rows,
+            "bytes": {k: os.path.getsize(p) for k, p in paths.items()},
+            "seconds": round(time.perf_counter() - t0, 3)}
+    meta_path.write_text(json.dumps(meta, indent=2))
+    return meta
+
+def _scale_plan(template: str, dataset: dict, out_dir: Path) -> str:
+    import yaml
+    plan = yaml.safe_load(template)
+    plan["source"] = {"kind": "csv", "csv": {"paths": dataset["paths"]}}
+    # file sinks only: a benchmark must not write into a real database
+    ld = plan.get("load", {})
+    sink = "parquet" if ld.get("to") == "parquet" else "csv"
+    plan["load"] = {**{k: v for k, v in ld.items() if k not in ("conn_str", "table")},
+                    "to": sink, "file_path": str(out_dir / f"output.{sink}")}
+    path = out_dir / "plan.yaml"
+    path.write_text(yaml.safe_dump(plan, sort_keys=False))
+    return str(path)
+
+def _child(plan_path: str) -> int:
+    # runs in a fresh process: peak RSS belongs to this one plan
+    from etl_agent.profiling import Profiler, _peak_rss_kb
+    from etl_agent.runtime import run_prompt
+    prof = Profiler()
+    try:
+        result = run_prompt(Path(plan_path).read_text(), use_cache=False, profiler=prof)
+        status = result.get("status") if isinstance(result, dict) else "unknown"
+    except Exception as e:
+        status = f"error: {type(e).__name__}: {e}"
+    print(json.dumps({"status": status, "peak_rss_kb": _peak_rss_kb(), "spans": prof.spans()}, default=str))
+    return 0
+
+def _stage_rows(spans: list) -> dict:
+    # {stage: metrics}; 'total' is the whole run (without interpreter startup/imports)
+    out = {}
+    for sp in spans:
+        if sp["name"] == "startup":
+            continue
+        stage = "total" if sp["name"] == "run" else sp["name"]
+        rows = sp.get("rows_out") if sp.get("rows_out") is not None else sp.get("rows_in")
+        nbytes = sp.get("bytes_read") or sp.get("bytes_written")
+        secs = (sp["wall_ms"] or 0) / 1000
+        out[stage] = {"wall_ms": sp["wall_ms"], "cpu_ms": sp["cpu_ms"], "rows": rows, "bytes": nbytes,
+                      "rows_per_sec": round(rows / secs) if rows and secs else None,
+                      "mb_per_sec": round(nbytes / 1048576 / secs, 1) if nbytes and secs else None}
+    return out
+
+def run_scale(scale: float, template: str, out_dir: str = BENCH_DIR, repeat: int = 1) -> dict:
+    """Generate (or reuse) the dataset for `scale` and run the plan on it in fresh processes."""
+    dataset = generate(scale, out_dir)
+    work = Path(out_dir) / f"sf{scale:g}"
+    plan_path = _scale_plan(template, dataset, work)
+    env = {**_env(), "ETL_AGENT_OFFLINE": "1", "ETL_AGENT_RUN_HISTORY": "0"}
+    runs = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-m", "etl_agent.bench", "_child", plan_path],
+                              capture_output=True, text=True, env=env)
+        if proc.returncode:
+            raise RuntimeError(f"scale {scale:g}: benchmark process failed:\n{proc.stderr[-2000:]}")
+        runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    per_run = [_stage_rows(r["spans"]) for r in runs]
+    stages = {}
+    for stage, first in per_run[0].items():
+        walls = [r[stage]["wall_ms"] for r in per_run if stage in r]
+        med = statistics.median(walls)
+        secs = med / 1000
+        stages[stage] = {**first, "wall_ms": round(med, 1),
+                         "rows_per_sec": round(first["rows"] / secs) if first["rows"] and secs else None,
+                         "mb_per_sec": round(first["bytes"] / 1048576 / secs, 1) if first["bytes"] and secs else None}
+    return {"scale": scale, "status": runs[-1]["status"], "stores": dataset["stores"],
+            "input_rows": sum(dataset["rows"].values()), "input_bytes": sum(dataset["bytes"].values()),
+            "generate_seconds": dataset["seconds"], "peak_rss_kb": max(r["peak_rss_kb"] for r in runs),
+            "repeat": repeat, "stages": stages}
+
+def compare(current: list, baseline: list, threshold: float = REGRESSION_THRESHOLD,
+            noise_floor_ms: float = NOISE_FLOOR_MS) -> list:
+    """Regressions of `current` vs `baseline` (rows of memory.get_bench_results):
+    stage wall time or peak RSS up by more than `threshold`."""
+    base = {(r["scale"], r["stage"]): r for r in baseline}
+    out = []
+    for r in current:
+        b = base.get((r["scale"], r["stage"]))
+        if not b:
+            continue
+        for metric, floor in (("wall_ms", noise_floor_ms), ("peak_rss_kb", 0)):
+            cur, old = r.get(metric), b.get(metric)
+            if cur is None or not old:
+                continue
+            if cur > old * (1 + threshold) and cur - old > floor:
+                out.append({"scale": r["scale"], "stage": r["stage"], "metric": metric,
+                            "baseline": old, "current": cur, "ratio": round(cur / old, 2)})
+    return out
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parents[1]).stdout.strip()
+    except OSError:
+        return ""
+
+def scale_suite(scales: list, plan: str = "", out_dir: str = BENCH_DIR, repeat: int = 1, suite: str = "walmart",
+                save: bool = True, baseline: str = "", set_baseline: bool = False,
+                threshold: float = REGRESSION_THRESHOLD) -> dict:
+    template = Path(plan or DEFAULT_PLAN).read_text()
+    bench_id = f"bench_{time.strftime('%Y%m%dT%H%M%S')}_{os.getpid()}"
+    results = []
+    for scale in scales:
+        r = run_scale(scale, template, out_dir, repeat)
+        print(f"[bench] sf{scale:g}: {r['input_rows']:,} input rows, total {r['stages'].get('total', {}).get('wall_ms')} ms, "
+              f"peak {r['peak_rss_kb'] / 1024:,.0f} MB ({r['status']})", file=sys.stderr)
+        results.append(r)
+    out = {"bench_id": bench_id, "suite": suite, "git_rev": _git_rev(), "results": results}
+    if not save:
+        return out
+    from etl_agent import memory
+    memory.init()
+    rows = [{"scale": r["scale"], "stage": stage, **{k: m.get(k) for k in ("wall_ms", "cpu_ms", "rows", "bytes")},
+             "peak_rss_kb": r["peak_rss_kb"] if stage == "total" else None}
+            for r in results for stage, m in r["stages"].items()]
+    memory.put_bench_results(bench_id, suite, rows, git_rev=out["git_rev"])
+    baseline = baseline or memory.get_state(f"bench_baseline:{suite}")
+    if baseline:
+        out["baseline"] = baseline
+        out["regressions"] = compare(rows, memory.get_bench_results(baseline), threshold)
+    if set_baseline or not baseline:
+        # the first stored run becomes the baseline
+        memory.set_state(f"bench_baseline:{suite}", bench_id)
+        out["baseline_set"] = bench_id
+    return out
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="etl_agent bench", description="ETL agent benchmarks")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    st = sub.add_parser("startup", help="Cold-start import/run cost of the offline YAML path.")
+    st.add_argument("--plan", default="", help="Plan YAML to time in fresh processes (optional).")
+    st.add_argument("-n", "--repeat", type=int, default=5)
+    st.add_argument("-o", "--out", help="Write the JSON result here instead of stdout.")
+    sc = sub.add_parser("scale", help="Run the prompt.txt plan on synthetic data at several scale factors.")
+    sc.add_argument("-s", "--scales", type=float, nargs="+", default=[1, 10], help="Scale factors (1 = the bundled 45 stores).")
+    sc.add_argument("--plan", default="", help=f"Plan YAML to run (default {DEFAULT_PLAN.name}); its source/load are rewritten.")
+    sc.add_argument("--dir", default=BENCH_DIR, help="Where generated datasets and outputs live (reused across runs).")
+    sc.add_argument("-n", "--repeat", type=int, default=1, help="Runs per scale; stage times are medians.")
+    sc.add_argument("--suite", default="walmart", help="Name results and the baseline are stored under.")
+    sc.add_argument("--baseline", default="", help="bench_id to compare against (default: the suite's stored baseline).")
+    sc.add_argument("--set-baseline", action="store_true", help="Make this run the suite's baseline.")
+    sc.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Relative slowdown flagged as a regression.")
+    sc.add_argument("--no-save", action="store_true", help="Do not store results in the memory DB (no comparison).")
+    sc.add_argument("-o", "--out", help="Write the JSON result here instead of stdout.")
+    ch = sub.add_parser("_child")  # internal: one profiled run in a fresh process
+    ch.add_argument("plan")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "_child":
+        return _child(args.plan)
+    if args.cmd == "scale":
+        result = scale_suite(args.scales, args.plan, args.dir, args.repeat, args.suite, save=not args.no_save,
+                             baseline=args.baseline, set_baseline=args.set_baseline, threshold=args.threshold)
+    else:
+        result = startup(args.plan, args.repeat)
+    text = json.dumps(result, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+    else:
+        print(text)
+    for r in result.get("regressions", []):
+        print(f"[bench] REGRESSION sf{r['scale']:g} {r['stage']} {r['metric']}: {r['baseline']} -> {r['current']} "
+              f"(x{r['ratio']})", file=sys.stderr)
+    return 1 if result.get("regressions") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
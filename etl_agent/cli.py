@@ -2,8 +2,7 @@
 import sys, argparse, json, os
 from pathlib import Path
 from dotenv import load_dotenv
-from etl_agent.runtime import run_prompt
-from etl_agent.agents import GREETING
+from etl_agent.templates import GREETING
 
 # load .env from repo root
 load_dotenv(Path(__file__).resolve().parents[1] / ".env")
@@ -19,10 +18,28 @@ def _read_prompt_arg(arg: str) -> str:
         return arg
 
 def main():
-    ap = argparse.ArgumentParser(description="ETL Agent — run prompt from terminal")
+    # subcommands; a bare invocation keeps running one prompt
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from etl_agent.batch import main as batch_main
+        return batch_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from etl_agent.server import serve_main
+        return serve_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "submit":
+        from etl_agent.server import submit_main
+        return submit_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        from etl_agent.bench import main as bench_main
+        return bench_main(sys.argv[2:])
+
+    ap = argparse.ArgumentParser(description="ETL Agent — run prompt from terminal (or: etl_agent batch|serve|submit|bench ...)")
     ap.add_argument("-p", "--prompt", help="Prompt text OR path to a file containing the prompt.")
     ap.add_argument("--greet", action="store_true", help="Print greeting/capabilities and exit.")
     ap.add_argument("--no-greet", action="store_true", help="Do not print greeting on startup.")
+    ap.add_argument("--no-plan-cache", action="store_true", help="Always plan with the LLM; do not read or write the plan cache.")
+    ap.add_argument("--refresh-plan", action="store_true", help="Re-plan with the LLM and overwrite the cached plan for this prompt.")
+    ap.add_argument("--profile", action="store_true", help="Print a per-stage time/CPU/memory/rows breakdown to stderr.")
+    ap.add_argument("--trace", metavar="PATH", help="Write the run's stages as Chrome trace JSON (chrome://tracing, Perfetto).")
     args = ap.parse_args()
 
     if args.greet:
@@ -44,7 +61,17 @@ def main():
     if not args.no_greet and os.getenv("MEL_NO_GREETING", "0") != "1":
         print(GREETING, file=sys.stderr)
 
-    result = run_prompt(prompt)
+    from etl_agent.runtime import run_prompt
+    from etl_agent.profiling import Profiler
+    prof = Profiler()
+    try:
+        result = run_prompt(prompt, use_cache=not args.no_plan_cache, refresh_plan=args.refresh_plan, profiler=prof)
+    finally:
+        # failed runs are profiled too: the breakdown shows where it stopped
+        if args.profile:
+            print(prof.report(), file=sys.stderr)
+        if args.trace:
+            prof.write_chrome_trace(args.trace)
     try:
         print(json.dumps(result, indent=2))
     except Exception:
@@ -0,0 +1,94 @@
+"""Process-wide SQLAlchemy engine registry.
+
+fetch_db, load_to_postgres and verify_table share one pooled engine per
+(env-expanded) connection string and pool settings instead of building a new
+pool per call. A run's limits.pool applies to its own context only, so jobs in
+one `serve` process do not see each other's settings.
+"""
+import os, atexit, threading, contextvars
+from contextlib import contextmanager
+from typing import Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+# limits.pool keys -> create_engine kwargs
+_POOL_KEYS = {
+    "size": "pool_size",
+    "max_overflow": "max_overflow",
+    "pre_ping": "pool_pre_ping",
+    "recycle": "pool_recycle",
+    "timeout": "pool_timeout",
+}
+POOL_DEFAULTS = {"pool_size": 5, "max_overflow": 10, "pool_pre_ping": True, "pool_recycle": 1800}
+
+# engines are keyed on (url, pool settings): the same database under other settings gets its own pool
+_ENGINES: dict = {}
+_STATS: dict = {}
+_POOL_OPTS = contextvars.ContextVar("etl_agent_pool_opts", default=POOL_DEFAULTS)
+_LOCK = threading.Lock()
+
+def pool_options(pool: Optional[dict] = None) -> dict:
+    """create_engine kwargs for plan `limits.pool` ({size, max_overflow, pre_ping, recycle, timeout})."""
+    opts = dict(POOL_DEFAULTS)
+    for k, v in (pool or {}).items():
+        if k not in _POOL_KEYS:
+            raise ValueError(f"limits.pool: unknown key {k!r} (expected {', '.join(_POOL_KEYS)})")
+        opts[_POOL_KEYS[k]] = v
+    return opts
+
+@contextmanager
+def configure_pool(pool: Optional[dict] = None):
+    """Engines fetched in this context (and tasks copied from it) use `limits.pool`."""
+    token = _POOL_OPTS.set(pool_options(pool))
+    try:
+        yield _POOL_OPTS.get()
+    finally:
+        _POOL_OPTS.reset(token)
+
+def get_engine(conn_str: str):
+    """Shared engine for `conn_str` ($VARS expanded) under the current pool settings; created on first use."""
+    url = os.path.expandvars(conn_str or "")
+    opts = _POOL_OPTS.get()
+    key = (url, tuple(sorted(opts.items())))
+    with _LOCK:
+        eng = _ENGINES.get(key)
+        if eng is not None:
+            _STATS[key]["engine_hits"] += 1
+            return eng
+        try:
+            eng = create_engine(url, **opts)
+        except TypeError:
+            # pools without sizing (e.g. SQLite's SingletonThreadPool/StaticPool)
+            eng = create_engine(url, pool_pre_ping=opts.get("pool_pre_ping", True))
+        stats = _STATS[key] = {"engine_hits": 0, "connects": 0, "checkouts": 0}
+        event.listen(eng, "connect", lambda *a: _bump(stats, "connects"))
+        event.listen(eng, "checkout", lambda *a: _bump(stats, "checkouts"))
+        _ENGINES[key] = eng
+        return eng
+
+def _bump(stats: dict, key: str) -> None:
+    stats[key] += 1
+
+def engine_stats() -> dict:
+    """Reuse counters per connection string (password hidden), summed over its pool settings."""
+    out = {}
+    for (url, _), st in _STATS.items():
+        try:
+            name = make_url(url).render_as_string(hide_password=True)
+        except Exception:
+            name = url.split("@")[-1]
+        acc = out.setdefault(name, {"engine_hits": 0, "connects": 0, "checkouts": 0})
+        for k, v in st.items():
+            acc[k] += v
+    for acc in out.values():
+        acc["reused_connections"] = max(acc["checkouts"] - acc["connects"], 0)
+    return out
+
+def dispose_engines() -> None:
+    with _LOCK:
+        for eng in _ENGINES.values():
+            eng.dispose()
+        _ENGINES.clear()
+        _STATS.clear()
+
+atexit.register(dispose_engines)
@@ -0,0 +1,689 @@
+"""Plan executor: run_from_plan(yaml) extracts, transforms, checks, loads and verifies.
+
+A regular module (imported once, bytecode-cached) rather than exec'd source;
+templates.EXECUTOR_SNIPPET remains as a shim that star-imports it. Anything a
+plan may not need (SQLAlchemy engines, the memory DB, the API client) is
+imported only by the branch that uses it.
+"""
+import os, re, sys, json, time, threading, contextvars, contextlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import yaml
+import pandas as pd
+from etl_agent.ops import (
+    load_csv_op, write_csv_op, dq_check_op, verify_csv_op,
+    registry_put, registry_get, registry_free, registry_scope, registry_configure,
+    ingest_mode_op, duckdb_connect_op, scan_csv_op,
+    fetch_db_op, stream_db_op, fetch_api_op, load_json_op, load_to_postgres_op, verify_table_op,
+    bulk_load_postgres, load_message, MERGE_BATCH_ROWS, column_stats, write_parquet_op, verify_parquet_op,
+    emit_status,
+    expand_paths, changed_files, file_fingerprint, watermark_value, sql_literal, strip_sql,
+)
+from etl_agent.sqlscan import step_dependencies, references, column_refs
+from etl_agent.stepcache import StepCache
+from etl_agent.schemacache import SchemaCache, widen_sql
+from etl_agent.profiling import span, current_span
+
+# aliases so the rest of the executor can keep using old names
+load_csv   = load_csv_op
+write_csv  = write_csv_op
+dq_check   = dq_check_op
+verify_csv = verify_csv_op
+ingest_mode    = ingest_mode_op
+duckdb_connect = duckdb_connect_op
+scan_csv       = scan_csv_op
+fetch_db       = fetch_db_op
+stream_db      = stream_db_op
+fetch_api      = fetch_api_op
+load_json      = load_json_op
+load_to_postgres = load_to_postgres_op
+write_parquet    = write_parquet_op
+verify_parquet   = verify_parquet_op
+verify_table     = verify_table_op
+
+def _to_yaml_map(text):
+    s = str(text or "").strip()
+    m = re.search(r"```(?:yaml|yml)?\s*\n(.*?)\n```", s, flags=re.DOTALL|re.IGNORECASE)
+    if m: s = m.group(1).strip()
+    if s.startswith('mel <<EOF'):
+        s = re.sub(r'^mel <<EOF\n?(.*)\nEOF\s*$', r"\1", s, flags=re.DOTALL)
+    doc = yaml.safe_load(s)
+    if not isinstance(doc, dict):
+        raise ValueError(f"Plan YAML must be a mapping; got {type(doc).__name__}")
+    return doc
+
+def send_alert(*args, **kwargs): return "skipped"
+def report_status(*args, **kwargs):
+    emit_status(*args, **kwargs)
+    return "ok"
+
+def _infer_kind(src: dict) -> str:
+    kind = src.get('kind','auto')
+    if kind != 'auto':
+        return kind
+    # Heuristics: conn string -> db, http(s) -> api, file ext -> csv/json
+    if 'db' in src and src['db'].get('conn_str'): return 'db'
+    if 'api' in src and src['api'].get('url','').startswith(('http://','https://')): return 'api'
+    if 'csv' in src and src['csv'].get('path','').lower().endswith('.csv'): return 'csv'
+    if 'json' in src and src['json'].get('path','').lower().endswith(('.json','.ndjson')): return 'json'
+    return 'api'  # conservative default
+
+
+def run_from_plan(yml: str):
+    plan = yaml.safe_load(yml)
+    limits = plan.get('limits', {})
+    # every dataframe handle this run creates is freed when it returns; the registry
+    # budget and spill dir apply to this run's scope only
+    with registry_scope():
+        registry_configure(limits.get('registry_bytes'), limits.get('spill_dir'))
+        return _run_plan(plan)
+
+
+def _input_kind(spec: dict) -> str:
+    kind = spec.get('kind', 'auto')
+    if kind != 'auto':
+        return kind
+    if spec.get('conn_str'): return 'db'
+    if str(spec.get('url', '')).startswith(('http://','https://')): return 'api'
+    if str(spec.get('path', '')).lower().endswith(('.json','.ndjson')): return 'json'
+    return 'csv'
+
+
+def _plan_inputs(src: dict) -> dict:
+    # normalize the source section to {table name: {kind, ...}} for extraction
+    if 'inputs' in src:
+        # generalized form: any number of named sources of any kind
+        return {name: {**spec, 'kind': _input_kind(spec)} for name, spec in src['inputs'].items()}
+    kind = _infer_kind(src)
+    if kind == 'csv':
+        csvspec = src.get('csv', {})
+        if 'paths' in csvspec:
+            p = csvspec['paths']
+            required = {'sales','features','stores'}
+            if not required.issubset(p.keys()):
+                raise ValueError("csv.paths must include keys: sales, features, stores")
+            return {k: {'kind': 'csv', 'path': p[k]} for k in ('sales','features','stores')}
+        if 'path' in csvspec:
+            return {'input_df': {'kind': 'csv', 'path': csvspec['path']}}
+        raise ValueError("CSV source requires either csv.path or csv.paths{sales,features,stores}")
+    if kind == 'json':
+        return {'input_df': {'kind': 'json', **src.get('json', {})}}
+    if kind == 'db':
+        return {'input_df': {'kind': 'db', **src['db']}}
+    return {'input_df': {'kind': 'api', **src['api']}}
+
+
+def _incremental_state(plan: dict, inputs: dict) -> dict:
+    # {input name: {cursor, key, state}} for the inputs named in plan.incremental
+    inc = plan.get('incremental')
+    if not inc:
+        return {}
+    from etl_agent import memory
+    memory.init()
+    # fact table of the csv triplet; otherwise the single input
+    default = ['sales'] if 'sales' in inputs else list(inputs)[:1]
+    plan_id = inc.get('key') or memory.prompt_hash(json.dumps(plan['source'], sort_keys=True, default=str))
+    out = {}
+    for name in inc.get('sources') or default:
+        if name not in inputs:
+            raise ValueError(f"incremental.sources: unknown input {name!r}")
+        key = f"watermark:{plan_id}:{name}"
+        state = memory.get_state(key, {}) or {}
+        if state.get('watermark') is None and inc.get('initial') is not None:
+            state['watermark'] = inc['initial']
+        out[name] = {'cursor': inc['cursor'], 'param': inc.get('param'), 'key': key, 'state': state}
+    return out
+
+
+def _pushdown(name: str, spec: dict, push: dict, inc: dict = None):
+    # rewrite a db input's query to the columns/rows the transform SQL needs; the outcome is
+    # recorded in `push` for the run result. None when nothing can be pushed.
+    from etl_agent.pushdown import rewrite
+    try:
+        pushed = rewrite(spec['conn_str'], spec['query'], push['refs'], push['predicates'],
+                         always=[inc['cursor']] if inc else ())
+    except Exception as e:
+        push['error'] = f"{type(e).__name__}: {e}"  # probe failed: fetch the query as written
+        return None
+    if pushed:
+        push.update(query=pushed['query'], columns=pushed['columns'], pushed=pushed['predicates'])
+        report_status(step=f'extract:{name}', detail=f"pushdown: {pushed['query']}")
+        current_span().set(pushdown=pushed['query'])
+    return pushed
+
+
+def _fetch_db(cur, name: str, spec: dict, inc: dict, wm, pushed: dict = None):
+    query, params = (pushed['query'], dict(pushed['params'])) if pushed else (spec['query'], None)
+    if wm is not None:
+        # pushed down: the upstream database only returns rows past the watermark
+        query = f'SELECT * FROM ({strip_sql(query)}) AS _inc WHERE {inc["cursor"]} > :_watermark'
+        params = {**(params or {}), '_watermark': wm}
+    if spec.get('stream'):
+        # server-side cursor, appended to a DuckDB table batch by batch
+        progress = lambda st: report_status(step=f'extract:{name}', detail=f"{st['rows']:,} rows ({st['rows_per_sec'] or 0:,.0f} rows/s)")
+        stats = stream_db(spec['conn_str'], query, cur, name, params=params,
+                          fetch_size=int(spec.get('fetch_size', 50_000)),
+                          spill_path=spec.get('spill_path'), progress=progress)
+        return 'table', stats, ''
+    return 'handle', fetch_db(conn_str=spec['conn_str'], query=query, params=params), ''
+
+
+def _fetch(cur, name: str, spec: dict, ingest: str, max_bytes, inc: dict = None, schemas=None, refs=None,
+           push=None):
+    # pull one input; runs on the extraction thread pool, so only streamed db and api inputs
+    # touch DuckDB, through `cur` (opened for them by the caller; None for the rest). With `inc`, only rows past the stored watermark
+    # (and, for files, only files changed since the last successful run) are read.
+    # With `schemas`, in-memory csv reads are typed from the cached schema and keep only
+    # the columns in `refs` (identifiers of the transform SQL; None = all).
+    # With `push`, a db input's query is narrowed by pushdown (falling back to the query as
+    # written if the upstream rejects the rewrite).
+    # Returns (how, obj, where): ('scan', files, where) for streamed csv, ('table', stats, where)
+    # for streamed db and api, ('handle', registry handle, where) for pandas reads, else ('frame', table, where).
+    kind = spec['kind']
+    wm = inc['state'].get('watermark') if inc else None
+    where = f'"{inc["cursor"]}" > {sql_literal(wm)}' if wm is not None else ''
+    if kind == 'csv':
+        files = expand_paths(spec['path'])
+        if inc:
+            todo = changed_files(files, inc['state'].get('files'))
+            inc['files'] = {f: file_fingerprint(f) for f in todo}
+            # nothing changed: keep the schema, read no rows
+            files, where = (todo, where) if todo else (files[:1], 'false')
+        total = sum(os.path.getsize(f) for f in files)
+        current_span().set(bytes_read=total)
+        if ingest == 'stream':
+            return 'scan', files, where
+        if max_bytes is not None and total > max_bytes:
+            raise ValueError(f"input too large: {total} bytes > {max_bytes}")
+        if schemas is not None:
+            df, how = schemas.read_files(files, refs, always=[inc['cursor']] if inc else ())
+            current_span().set(schema=",".join(sorted(set(how))), columns=df.num_columns)
+        else:
+            parts = [load_csv(path=f, max_bytes=max_bytes) for f in files]
+            if len(parts) == 1:
+                return 'handle', parts[0], where
+            handle = registry_put(pd.concat([registry_get(h) for h in parts], ignore_index=True), 'csv')
+            for h in parts:
+                registry_free(h)
+            return 'handle', handle, where
+    elif kind == 'json':
+        return 'handle', load_json(path=spec['path'], json_path=spec.get('json_path', '')), where
+    elif kind == 'db':
+        pushed = _pushdown(name, spec, push, inc) if push is not None else None
+        try:
+            return _fetch_db(cur, name, spec, inc, wm, pushed)
+        except Exception as e:
+            if not pushed:
+                raise
+            push['fallback'] = f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"
+            report_status(step=f'extract:{name}', detail=f"pushdown rejected upstream ({push['fallback']}); fetching the query as written")
+            return _fetch_db(cur, name, spec, inc, wm)
+    elif kind == 'api':
+        params = dict(spec.get('params', {}))
+        if inc and inc.get('param') and wm is not None:
+            params[inc['param']] = wm
+        # pages are normalized to Arrow and appended to a DuckDB table (through this input's
+        # own cursor) as they arrive; a watermark filter becomes a view over it in _register
+        from etl_agent.api import ApiExtractor
+        stats = ApiExtractor.from_spec(spec, params=params).run_into(cur, f'_{name}_raw' if where else name)
+        return 'table', stats, where
+    else:
+        raise ValueError(f"source {name!r}: unknown kind {kind!r}")
+    return 'frame', df, where
+
+
+def _register(con, name: str, fetched, local: dict, spill: dict):
+    # expose a fetched input to the transform SQL under its name; pandas/Arrow objects are
+    # connection-local in DuckDB, so they are also kept in `local` for worker cursors
+    how, obj, where = fetched
+    if how == 'table':
+        # already written into the shared database by its cursor
+        if where:
+            con.execute(f'CREATE OR REPLACE VIEW "{name}" AS SELECT * FROM "_{name}_raw" WHERE {where}')
+        return
+    if how == 'scan':
+        scan_csv(con, name, obj, where=where)
+        return
+    handle = None
+    if how == 'handle':
+        handle, obj = obj, registry_get(obj)
+    # typed reads narrow integers; the SQL still sees them as BIGINT
+    select = widen_sql(obj)
+    reg = f'_{name}_raw' if where or select else name
+    con.register(reg, obj)
+    local[reg] = obj
+    if handle:
+        spill['owners'][handle] = reg
+    if reg != name:
+        con.execute(f'CREATE OR REPLACE VIEW "{name}" AS SELECT {select or "*"} FROM "{reg}"'
+                    + (f' WHERE {where}' if where else ''))
+
+
+def _spill_hook(local: dict, spill: dict):
+    # registry on_spill: a spilled frame is swapped in `local` for an Arrow dataset over its
+    # Parquet file (DuckDB scans it from disk), so the run stops holding it in memory. Runs
+    # on whichever thread put() the frame; the shared connection follows in _sync_spilled.
+    def on_spill(handle, path):
+        name = spill['owners'].get(handle)
+        if name is not None:
+            import pyarrow.dataset as pads
+            local[name] = pads.dataset(path)
+            spill['pending'].add(name)
+    return on_spill
+
+
+def _sync_spilled(con, local: dict, spill: dict):
+    # calling thread only: re-register spilled frames' datasets on the shared connection,
+    # which drops its reference to the frame
+    while spill['pending']:
+        name = spill['pending'].pop()
+        con.register(name, local[name])
+
+
+def _extract_all(con, inputs: dict, ingest: str, limits: dict, incremental: dict, local: dict, spill: dict,
+                 schemas=None, refs=None, push=None):
+    # fetch every input concurrently (I/O and the pandas/pyarrow/DuckDB readers release
+    # the GIL), then register them on the one connection.
+    # Returns ({input: seconds}, {input: rows/batches/rows_per_sec (pages/requests for api)} for streamed inputs)
+    max_bytes = limits.get('max_input_bytes', 1_000_000_000)
+    workers = max(1, min(int(limits.get('max_parallel_sources', 4)), len(inputs)))
+
+    def timed(name, spec, cur):
+        t0 = time.perf_counter()
+        with span(f'extract:{name}', kind=spec['kind']) as sp:
+            out = _fetch(cur, name, spec, ingest, max_bytes, incremental.get(name), schemas, refs,
+                         (push or {}).get(name))
+            how, obj, _ = out
+            sp.set(rows_out=obj['rows'] if how == 'table' else len(registry_get(obj)) if how == 'handle'
+                   else (len(obj) if how == 'frame' else None))
+        return out, round(time.perf_counter() - t0, 3)
+
+    timings = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='etl-extract') as pool:
+        # cursors are opened here, for the inputs that write into DuckDB: only this thread
+        # touches the shared connection
+        curs = {name: con.cursor() for name, spec in inputs.items()
+                if spec['kind'] == 'api' or (spec['kind'] == 'db' and spec.get('stream'))}
+        # copy_context: handles put() on worker threads still belong to this run's registry scope
+        futures = {name: pool.submit(contextvars.copy_context().run, timed, name, spec, curs.get(name))
+                   for name, spec in inputs.items()}
+        streamed = {}
+        for name, fut in futures.items():
+            fetched, timings[name] = fut.result()
+            if fetched[0] == 'table':
+                streamed[name] = fetched[1]
+            _register(con, name, fetched, local, spill)
+    _sync_spilled(con, local, spill)
+    return timings, streamed
+
+
+def _step_modes(steps: list, deps: dict, lazy: bool) -> dict:
+    # view: lazy DuckDB view; table: computed once inside DuckDB (the final step, which
+    # DQ and the sinks read from the connection, or a step shared by several consumers);
+    # pull: pulled out into the registry (materialize: true, or every needed intermediate
+    # step when lazy is off); steps nobody downstream reads are dropped
+    final = steps[-1]['name']
+    wanted = [final] + [st['name'] for st in steps if st.get('materialize')]
+    needed = set()
+    while wanted:
+        n = wanted.pop()
+        if n not in needed:
+            needed.add(n)
+            wanted.extend(deps[n])
+    consumers = {n: sum(n in deps[m] for m in needed) for n in needed}
+    modes = {}
+    for st in steps:
+        n = st['name']
+        if n not in needed:
+            modes[n] = 'pruned'
+        elif n == final:
+            modes[n] = 'table'
+        elif st.get('materialize') or not lazy:
+            modes[n] = 'pull'
+        else:
+            modes[n] = 'table' if consumers[n] > 1 else 'view'
+    return modes
+
+
+def _critical_path(deps: dict, ms: dict) -> dict:
+    # longest chain of dependent step durations, i.e. the transform's lower bound
+    finish, prev = {}, {}
+    for n in ms:  # insertion order is topological
+        best = max(deps[n], key=lambda d: finish[d], default=None)
+        finish[n] = ms[n] + (finish[best] if best else 0.0)
+        prev[n] = best
+    node = max(finish, key=finish.get, default=None)
+    total = finish.get(node, 0.0)
+    path = []
+    while node:
+        path.append(node)
+        node = prev[node]
+    return {"steps": path[::-1], "ms": round(total, 1)}
+
+
+def _cache_plan(cache, steps: list, deps: dict, modes: dict, input_keys: dict):
+    # content keys per step, then walk down from the wanted steps: a stored step that hits
+    # is loaded from Parquet and nothing above it needs to run
+    keys = {}
+    for st in steps:
+        n = st['name']
+        upstream = {d: keys[d] for d in deps[n]}
+        upstream.update({i: input_keys.get(i) for i in references(st['sql'], input_keys)})
+        keys[n] = cache.step_key(strip_sql(st['sql']), upstream)
+    hits, reached = {}, set()
+    wanted = [steps[-1]['name']] + [n for n, m in modes.items() if m == 'pull']
+    while wanted:
+        n = wanted.pop()
+        if n in reached:
+            continue
+        reached.add(n)
+        path = cache.lookup(keys[n]) if modes[n] in ('table', 'pull') else None
+        if path:
+            hits[n] = path
+        else:
+            wanted.extend(deps[n])
+    return keys, hits, reached
+
+
+def _run_steps(con, steps: list, tr: dict, limits: dict, local: dict, spill: dict, cache=None,
+               input_keys: dict = None):
+    # Run transform.steps as a DAG: each step waits only for the earlier steps its SQL
+    # reads, so independent branches execute concurrently on their own DuckDB cursors.
+    # With a StepCache, steps whose inputs are unchanged are read back from Parquet.
+    # Returns (final step's table name on `con`, report with per-step timings and the critical path).
+    deps = step_dependencies(steps)
+    modes = _step_modes(steps, deps, tr.get('lazy', True))
+    final = steps[-1]['name']
+    sql_of = {st['name']: strip_sql(st['sql']) for st in steps}
+    keys, hits = {}, {}
+    todo = [st['name'] for st in steps if modes[st['name']] != 'pruned']
+    if cache:
+        keys, hits, reached = _cache_plan(cache, steps, deps, modes, input_keys or {})
+        todo = [n for n in todo if n in reached]
+    # a cache hit does not wait for (or run) the steps it was computed from
+    waits = {n: [] if n in hits else deps[n] for n in todo}
+    workers = max(1, int(limits.get('transform_threads', 4)))
+    handles, timings, lock = {}, {}, threading.Lock()
+    t_start = time.perf_counter()
+
+    def run_step(name, cur):
+        with span(f'transform:{name}', mode=modes[name]) as sp:
+            _step(name, sp, cur)
+
+    def _step(name, sp, cur):
+        with lock:
+            visible = dict(local)
+        for obj_name, obj in visible.items():
+            cur.register(obj_name, obj)
+        t0 = time.perf_counter()
+        mode, hit, rows = modes[name], hits.get(name), None
+        sql = f'SELECT * FROM read_parquet({sql_literal(hit)})' if hit else sql_of[name]
+        if mode == 'view':
+            cur.execute(f'CREATE OR REPLACE VIEW "{name}" AS {sql}')
+        elif mode == 'table':
+            if hit:
+                cur.execute(f'CREATE OR REPLACE VIEW "{name}" AS {sql}')
+                if name == final:
+                    rows = cur.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+            else:
+                cur.execute(f'CREATE OR REPLACE TABLE "{name}" AS {sql}')
+                rows = cur.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+                if cache:
+                    cache.store(keys[name], name, cur, name)
+        else:
+            out_df = cur.execute(sql).df()
+            rows = len(out_df)
+            if cache and not hit:
+                cur.register(name, out_df)
+                cache.store(keys[name], name, cur, name)
+            # later steps register it on their own cursors (from `local`); the shared
+            # connection is not touched from worker threads
+            with lock:
+                local[name] = out_df
+            handles[name] = registry_put(out_df, name)
+            spill['owners'][handles[name]] = name
+        t1 = time.perf_counter()
+        timings[name] = {"mode": mode, "deps": deps[name],
+                         "start_ms": round((t0 - t_start) * 1000, 1), "ms": round((t1 - t0) * 1000, 1)}
+        if rows is not None:
+            timings[name]["rows"] = rows
+            sp.set(rows_out=rows)
+        if cache:
+            timings[name]["cache"] = 'hit' if hit else ('miss' if keys.get(name) and mode != 'view' else 'off')
+        report_status(step=f'transform:{name}', detail=f"{mode}{' (cached)' if hit else ''} in {timings[name]['ms']} ms")
+
+    done, running = set(), {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='etl-step') as pool:
+        while todo or running:
+            for name in [n for n in todo if all(d in done for d in waits[n])]:
+                todo.remove(name)
+                # cursors are opened here: only this thread touches the shared connection
+                running[pool.submit(contextvars.copy_context().run, run_step, name, con.cursor())] = name
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                fut.result()  # re-raise the step's error
+                done.add(running.pop(fut))
+            _sync_spilled(con, local, spill)
+    # pulled frames become visible on the shared connection here, on the calling thread
+    for name in handles:
+        con.register(name, local[name])
+
+    ordered = {st['name']: timings[st['name']]['ms'] for st in steps if st['name'] in timings}
+    report = {
+        "steps": {n: timings[n] for n in ordered},
+        "critical_path": _critical_path(waits, ordered),
+        "pruned_steps": [n for n, m in modes.items() if m == 'pruned'],
+        "wall_ms": round((time.perf_counter() - t_start) * 1000, 1),
+    }
+    if cache:
+        report["cache"] = {**cache.stats,
+                           "skipped_steps": [n for n, m in modes.items() if m != 'pruned' and n not in timings]}
+    return final, report
+
+
+def _run_plan(plan: dict):
+    cache = StepCache.from_plan(plan.get('transform', {}).get('cache'))
+    pool = contextlib.nullcontext()
+    if plan.get('limits', {}).get('pool'):
+        # engines this run fetches use its pool settings; other runs in the process keep theirs
+        from etl_agent.engines import configure_pool
+        pool = configure_pool(plan['limits']['pool'])
+    try:
+        with pool:
+            result = _execute_plan(plan, cache)
+    finally:
+        # only once load and verify are done: a cache-hit final step is still a view over its Parquet file
+        if cache:
+            cache.evict()
+    if cache and 'cache' in result.get('transform', {}):
+        result['transform']['cache']['evicted'] = cache.stats['evicted']
+    return result
+
+
+def _execute_plan(plan: dict, cache=None):
+    alerts = plan.get('alerts', {})
+    # 1) Extract (choose tool based on kind or heuristics)
+    inputs = _plan_inputs(plan['source'])
+    limits = plan.get('limits', {})
+    # stream: DuckDB scans csv files directly, max_input_bytes is its memory budget
+    # memory: pandas frames, max_input_bytes stays a hard cap
+    csv_paths = [sp['path'] for sp in inputs.values() if sp['kind'] == 'csv']
+    ingest = ingest_mode(csv_paths, limits) if csv_paths else 'memory'
+    con = duckdb_connect(limits, streaming=(ingest == 'stream'))
+    incremental = _incremental_state(plan, inputs)
+    tr = plan.get('transform', {})
+    steps = tr.get('steps')
+    if not steps:
+        # Backward-compat: single SQL using sales/features/stores
+        if not tr.get('sql'):
+            raise ValueError("Provide transform.steps[...].sql (preferred) or transform.sql.")
+        steps = [{'name': 'transform', 'sql': tr['sql']}]
+    # in-memory csv inputs: typed from their cached schema, only the columns the SQL names
+    schemas = SchemaCache.from_plan(limits) if ingest == 'memory' and csv_paths else None
+    refs = column_refs(st['sql'] for st in steps) if schemas else None
+    # plan udfs are loaded up front, so a broken definition fails before any extraction
+    udfs = None
+    if plan.get('udfs'):
+        from etl_agent.udfs import UdfSet
+        udfs = UdfSet.from_plan(plan)
+    # db inputs: referenced columns and the WHERE conjuncts every read shares go upstream
+    # (incremental inputs keep their rows, so the stored watermark stays the true maximum)
+    db_inputs = [n for n, sp in inputs.items() if sp['kind'] == 'db' and sp.get('pushdown', True)]
+    push = {}
+    if db_inputs:
+        from etl_agent.pushdown import predicates
+        sqls = [st['sql'] for st in steps]
+        db_refs = column_refs(sqls)
+        push = {n: {'refs': db_refs, 'predicates': [] if n in incremental else predicates(sqls, n)}
+                for n in db_inputs}
+    local, spill = {}, {'owners': {}, 'pending': set()}
+    registry_configure(on_spill=_spill_hook(local, spill))
+    with span('extract', ingest=ingest):
+        extract_seconds, streamed = _extract_all(con, inputs, ingest, limits, incremental, local, spill,
+                                                 schemas, refs, push)
+
+    inc_report = {}
+    for name, inc in incremental.items():
+        n, hi = con.execute(f'SELECT COUNT(*), MAX("{inc["cursor"]}") FROM "{name}"').fetchone()
+        prev = inc['state'].get('watermark')
+        inc['new_watermark'] = watermark_value(hi) if hi is not None else prev
+        inc_report[name] = {"rows": int(n), "watermark": inc['new_watermark'], "previous": prev}
+    if incremental and all(r['rows'] == 0 for r in inc_report.values()):
+        return {"status": "ok", "skipped": "no new rows since last watermark", "incremental": inc_report}
+
+    # 2) Transform
+    input_keys = {}
+    if cache:
+        # file fingerprints (and incremental state) address the inputs; db/api inputs stay unkeyed
+        input_keys = {n: cache.input_key(sp, incremental[n]['state'] if n in incremental else None)
+                      for n, sp in inputs.items()}
+        if udfs:
+            # a step calling a UDF is keyed on its definition, like an input
+            input_keys.update(udfs.keys())
+    if udfs:
+        udfs.register(con)
+    with span('transform') as sp:
+        final, step_report = _run_steps(con, steps, tr, limits, local, spill, cache, input_keys)
+        final_rows = step_report['steps'][final]['rows']
+        sp.set(rows_out=final_rows)
+
+    # 3) DQ
+    cks = plan.get('checks', {})
+    # one aggregate over the final step as DuckDB already holds it
+    with span('dq', rows_in=final_rows) as sp:
+        dq = dq_check(con=con, relation=final, min_rows=cks.get('min_rows',1), nonnull_cols=cks.get('nonnull_cols',[]),
+                      freshness_minutes=cks.get('freshness_minutes'), timestamp_col=cks.get('timestamp_col',''),
+                      unique_cols=cks.get('unique'), ranges=cks.get('ranges'), accepted_values=cks.get('accepted_values'))
+        dqj = json.loads(dq)
+        sp.set(status=dqj['status'])
+    if not dqj['status']:
+        if alerts:
+            send_alert(channel=alerts.get('on_fail',''), message=f"DQ failed: {dq}")
+        return {"status":"failed", "dq": dqj}
+
+    # 4) Load
+    ld = plan['load']
+    manifest = None
+    sink = ld.get('to','postgres')
+    if sink not in ('csv', 'parquet', 'postgres'):
+        raise ValueError(f"load.to must be csv|parquet|postgres; got {sink!r}")
+    with span('load', sink=sink, rows_in=final_rows) as sp:
+        if sink == 'parquet':
+            # DuckDB writes the final relation straight to (optionally Hive-partitioned) Parquet
+            pq = write_parquet(ld['file_path'], con=con, relation=final,
+                               compression=ld.get('compression', 'zstd'),
+                               row_group_size=ld.get('row_group_size', 122_880),
+                               partition_by=ld.get('partition_by'))
+            msg = f"wrote {pq['rows']:,} rows to {pq['path']} ({pq['files']} parquet files, {pq['bytes']:,} bytes) in {pq['seconds']}s"
+            sp.set(rows_out=pq['rows'], bytes_written=pq['bytes'])
+        elif sink == 'csv':
+            # the writer leaves <file>.manifest.json (rows, bytes, sha256, per-column stats) for verify
+            msg = write_csv(None, ld['file_path'], include_header=ld.get('include_header', True), con=con, relation=final)
+            sp.set(rows_out=final_rows, bytes_written=os.path.getsize(ld['file_path']))
+        else:
+            # load.batch_col: every row carries this run's batch id, so verify can count exactly what landed
+            batch_id = time.strftime('%Y%m%dT%H%M%S') + f"-{os.getpid()}" if ld.get('batch_col') else None
+            # upsert merges through a temp stage in transactions of load.merge_batch_rows
+            st = bulk_load_postgres(None, ld['conn_str'], ld['table'], mode=ld.get('mode','append'), key_cols=ld.get('key_cols'),
+                                    tag={ld['batch_col']: batch_id} if batch_id else None,
+                                    merge_rows=int(ld.get('merge_batch_rows', MERGE_BATCH_ROWS)),
+                                    con=con, relation=final)
+            msg = load_message(st)
+            manifest = {**st, "rows_seen": st['rows'], "columns": column_stats(con, final)}
+            sp.set(rows_out=manifest['rows_written'])
+
+    # 5) Verify
+    vf = plan.get('verify', {})
+    result = {"status": "ok", "dq": dqj, "message": msg, "extract_seconds": extract_seconds,
+              "transform": step_report}
+    if streamed:
+        result["extract_stream"] = streamed
+    if schemas:
+        result["schema_cache"] = schemas.stats
+    if udfs:
+        result["udfs"] = udfs.report()
+    pushdown = {n: {k: p[k] for k in ('query', 'columns', 'pushed', 'fallback', 'error') if k in p}
+                for n, p in push.items()}
+    if any(pushdown.values()):
+        result["pushdown"] = {n: p for n, p in pushdown.items() if p}
+
+    with span('verify', sink=sink) as sp:
+        if sink == 'parquet':
+            ver = verify_parquet(
+                path=ld['file_path'],
+                min_rows=vf.get('min_rows', cks.get('min_rows', 1)),
+                nonnull_cols=vf.get('nonnull_cols', cks.get('nonnull_cols', [])),
+                timestamp_col=vf.get('ts_col', ''),
+                max_lag_minutes=vf.get('max_lag_minutes', 180),
+            )
+        elif sink == 'csv':
+            ver = verify_csv(
+                path=ld['file_path'],
+                min_rows=vf.get('min_rows', cks.get('min_rows', 1)),
+                nonnull_cols=vf.get('nonnull_cols', cks.get('nonnull_cols', [])),
+                timestamp_col=vf.get('ts_col', ''),
+                max_lag_minutes=vf.get('max_lag_minutes', 180),
+                deep=vf.get('deep', False),
+            )
+        else:
+            ver = verify_table(
+                conn_str=ld['conn_str'],
+                table=ld['table'],
+                ts_col=vf.get('ts_col', ''),
+                max_lag_minutes=vf.get('max_lag_minutes', 180),
+                mode=vf.get('mode', 'auto'),
+                # upsert: unchanged rows are not rewritten and keep the batch id they were written with
+                expected_rows=(manifest['inserted'] + manifest['updated'] if ld.get('mode') == 'upsert'
+                               else manifest['rows_written']),
+                batch_col=ld.get('batch_col', ''),
+                batch_id=batch_id,
+            )
+
+        vj = json.loads(ver)
+        if manifest is not None:
+            # every row the loader streamed must have been stored by the server
+            result["load_manifest"] = manifest
+            vj["manifest_ok"] = manifest['rows_written'] == manifest['rows_seen']
+            vj["status"] = bool(vj.get('status') and vj["manifest_ok"])
+            ver = json.dumps(vj)
+        sp.set(rows_in=vj.get('rows'), status=vj.get('status', False))
+    if not vj.get('status', False):
+        if alerts:
+            send_alert(channel=alerts.get('on_fail', ''), message=f"Verify failed: {ver}")
+        return {"status": "failed", "verify": vj}
+
+    result["verify"] = vj
+    if 'etl_agent.engines' in sys.modules:
+        # only plans that touched a database loaded SQLAlchemy at all
+        from etl_agent.engines import engine_stats
+        if engine_stats():
+            result["engines"] = engine_stats()
+    # watermarks only advance once the load has landed and verified
+    if incremental:
+        from etl_agent import memory
+        for name, inc in incremental.items():
+            files = {f: fp for f, fp in (inc['state'].get('files') or {}).items() if os.path.exists(f)}
+            files.update(inc.get('files', {}))
+            memory.set_state(inc['key'], {"watermark": inc['new_watermark'], "files": files})
+        result["incremental"] = inc_report
+    report_status(step='load', detail=msg)
+    return result
@@ -1,13 +1,41 @@
-import os, json, hashlib, time
-from datetime import datetime
-from sqlalchemy import create_engine, text
+import os, re, json, hashlib, time, uuid, sqlite3
+from datetime import datetime, timezone
 from typing import Optional
 
-ENGINE = create_engine(os.getenv("etl_agent_MEMORY_URL", "sqlite:///etl_agent.db"))
+MEMORY_URL = os.getenv("etl_agent_MEMORY_URL", "sqlite:///etl_agent.db")
+# a plain sqlite file is opened with the stdlib driver, so recording a run never imports
+# SQLAlchemy; any other URL (Postgres, in-memory sqlite, ...) goes through an engine
+_SQLITE_FILE = re.match(r"sqlite:///([^?]+)$", MEMORY_URL)
+_engine = None
+
+class _Rows(list):
+    """Fetched rows plus the statement's rowcount (the connection is closed by then)."""
+    def __init__(self, rows, rowcount):
+        super().__init__(rows)
+        self.rowcount = rowcount
+
+    def fetchone(self):
+        return self[0] if self else None
+
+def _run(sql, params, many=False):
+    global _engine
+    if _SQLITE_FILE and _SQLITE_FILE.group(1) != ":memory:":
+        con = sqlite3.connect(_SQLITE_FILE.group(1), timeout=30)
+        try:
+            with con:
+                cur = con.executemany(sql, params) if many else con.execute(sql, params)
+                return _Rows(cur.fetchall(), cur.rowcount)
+        finally:
+            con.close()
+    from sqlalchemy import create_engine, text
+    if _engine is None:
+        _engine = create_engine(MEMORY_URL)
+    with _engine.begin() as c:
+        r = c.execute(text(sql), params)
+        return _Rows(r.fetchall() if r.returns_rows else [], r.rowcount)
 
 def _exec(sql, **kw):
-    with ENGINE.begin() as c:
-        return c.execute(text(sql), kw)
+    return _run(sql, kw)
 
 def init():
     _exec("""
@@ -21,6 +49,24 @@ def init():
     );
     """)
     _exec("""
+    CREATE TABLE IF NOT EXISTS etl_agent_run_stages (
+      run_id TEXT, seq INTEGER,
+      name TEXT, parent INTEGER, thread TEXT,
+      start_ms REAL, wall_ms REAL, cpu_ms REAL, rss_delta_kb INTEGER,
+      rows_in INTEGER, rows_out INTEGER, bytes_read INTEGER, bytes_written INTEGER,
+      attrs_json TEXT,
+      PRIMARY KEY (run_id, seq)
+    );
+    """)
+    _exec("""
+    CREATE TABLE IF NOT EXISTS etl_agent_bench (
+      bench_id TEXT, suite TEXT, scale REAL, stage TEXT,
+      wall_ms REAL, cpu_ms REAL, rows INTEGER, bytes INTEGER, peak_rss_kb INTEGER,
+      git_rev TEXT, created_at TIMESTAMP,
+      PRIMARY KEY (bench_id, scale, stage)
+    );
+    """)
+    _exec("""
     CREATE TABLE IF NOT EXISTS etl_agent_state (
       key TEXT PRIMARY KEY,
       value_json TEXT,
@@ -28,6 +74,25 @@ def init():
     );
     """)
     _exec("""
+    CREATE TABLE IF NOT EXISTS etl_agent_plan_cache (
+      cache_key TEXT PRIMARY KEY,
+      prompt_hash TEXT,
+      plan_yaml TEXT,
+      created_at TIMESTAMP, last_hit_at TIMESTAMP,
+      hits INTEGER DEFAULT 0
+    );
+    """)
+    _exec("""
+    CREATE TABLE IF NOT EXISTS etl_agent_step_cache (
+      cache_key TEXT PRIMARY KEY,
+      step_name TEXT,
+      path TEXT,
+      bytes INTEGER, rows INTEGER,
+      created_at TIMESTAMP, last_hit_at TIMESTAMP,
+      hits INTEGER DEFAULT 0
+    );
+    """)
+    _exec("""
     CREATE TABLE IF NOT EXISTS etl_agent_source_schema (
       source_hash TEXT PRIMARY KEY,
       schema_json TEXT,
@@ -38,12 +103,74 @@ def init():
 def prompt_hash(prompt: str) -> str:
     return hashlib.sha256(prompt.encode()).hexdigest()[:16]
 
+def normalize_prompt(prompt: str) -> str:
+    return " ".join((prompt or "").split())
+
+def plan_cache_key(prompt: str, expanded: str) -> str:
+    """Normalized prompt hash + env-expanded hash: changing $VARS re-plans."""
+    return f"{prompt_hash(normalize_prompt(prompt))}:{prompt_hash(normalize_prompt(expanded))}"
+
+def get_cached_plan(cache_key: str, ttl_seconds: Optional[int] = None) -> Optional[str]:
+    r = _exec("SELECT plan_yaml, created_at FROM etl_agent_plan_cache WHERE cache_key=:k", k=cache_key).fetchone()
+    if not r:
+        return None
+    if ttl_seconds is not None:
+        created = r[1] if isinstance(r[1], datetime) else datetime.fromisoformat(str(r[1]))
+        if created.tzinfo is None:
+            created = created.replace(tzinfo=timezone.utc)  # rows written before timestamps carried a zone
+        if (datetime.now(timezone.utc) - created).total_seconds() > ttl_seconds:
+            invalidate_plan_cache(cache_key)
+            return None
+    _exec("UPDATE etl_agent_plan_cache SET hits=hits+1, last_hit_at=:ts WHERE cache_key=:k",
+          ts=datetime.now(timezone.utc), k=cache_key)
+    return r[0]
+
+def put_cached_plan(cache_key: str, prompt: str, plan_yaml: str):
+    _exec("""
+      INSERT INTO etl_agent_plan_cache(cache_key, prompt_hash, plan_yaml, created_at, hits)
+      VALUES (:k, :ph, :plan, :ts, 0)
+      ON CONFLICT(cache_key) DO UPDATE SET plan_yaml=excluded.plan_yaml, created_at=excluded.created_at, hits=0
+    """, k=cache_key, ph=prompt_hash(normalize_prompt(prompt)), plan=plan_yaml, ts=datetime.now(timezone.utc))
+
+def invalidate_plan_cache(cache_key: Optional[str] = None) -> int:
+    """Drop one cached plan, or all of them when no key is given."""
+    if cache_key is None:
+        return _exec("DELETE FROM etl_agent_plan_cache").rowcount
+    return _exec("DELETE FROM etl_agent_plan_cache WHERE cache_key=:k", k=cache_key).rowcount
+
+def get_cached_step(cache_key: str) -> Optional[str]:
+    """Parquet path of a memoized transform step (hit counted), or None."""
+    r = _exec("SELECT path FROM etl_agent_step_cache WHERE cache_key=:k", k=cache_key).fetchone()
+    if not r:
+        return None
+    _exec("UPDATE etl_agent_step_cache SET hits=hits+1, last_hit_at=:ts WHERE cache_key=:k",
+          ts=datetime.now(timezone.utc), k=cache_key)
+    return r[0]
+
+def put_cached_step(cache_key: str, step_name: str, path: str, nbytes: int, rows: int):
+    ts = datetime.now(timezone.utc)
+    _exec("""
+      INSERT INTO etl_agent_step_cache(cache_key, step_name, path, bytes, rows, created_at, last_hit_at, hits)
+      VALUES (:k, :step, :path, :b, :r, :ts, :ts, 0)
+      ON CONFLICT(cache_key) DO UPDATE SET path=excluded.path, bytes=excluded.bytes, rows=excluded.rows,
+        created_at=excluded.created_at, last_hit_at=excluded.last_hit_at, hits=0
+    """, k=cache_key, step=step_name, path=path, b=nbytes, r=rows, ts=ts)
+
+def list_cached_steps() -> list:
+    """(cache_key, path, bytes) of every memoized step, least recently used first."""
+    return [tuple(r) for r in _exec(
+        "SELECT cache_key, path, bytes FROM etl_agent_step_cache ORDER BY COALESCE(last_hit_at, created_at)")]
+
+def drop_cached_step(cache_key: str) -> int:
+    return _exec("DELETE FROM etl_agent_step_cache WHERE cache_key=:k", k=cache_key).rowcount
+
 def start_run(prompt: str, plan_yaml: str) -> str:
-    rid = f"run_{int(time.time()*1000)}"
+    # concurrent runs (serve, batch) can start in the same millisecond
+    rid = f"run_{int(time.time()*1000)}_{uuid.uuid4().hex[:6]}"
     _exec("""
       INSERT INTO etl_agent_runs(run_id, started_at, prompt, prompt_hash, plan_yaml, status)
       VALUES (:rid, :ts, :prompt, :ph, :plan, 'running')
-    """, rid=rid, ts=datetime.utcnow(), prompt=prompt, ph=prompt_hash(prompt), plan=plan_yaml)
+    """, rid=rid, ts=datetime.now(timezone.utc), prompt=prompt, ph=prompt_hash(prompt), plan=plan_yaml)
     return rid
 
 def finish_run(
@@ -57,9 +184,59 @@ def finish_run(
   _exec("""
     UPDATE etl_agent_runs SET ended_at=:ts, status=:status, rows_written=:rows,
       dq_json=:dq, verify_json=:ver, error=:err WHERE run_id=:rid
-  """, ts=datetime.utcnow(), status=status, rows=rows_written,
+  """, ts=datetime.now(timezone.utc), status=status, rows=rows_written,
       dq=json.dumps(dq_json or {}), ver=json.dumps(verify_json or {}), err=error, rid=run_id)
 
+_STAGE_COLS = ("seq", "name", "parent", "thread", "start_ms", "wall_ms", "cpu_ms", "rss_delta_kb",
+               "rows_in", "rows_out", "bytes_read", "bytes_written")
+
+def record_stages(run_id: str, spans: list) -> int:
+    """Persist a run's profiling spans (profiling.Profiler.spans())."""
+    if not spans:
+        return 0
+    rows = [{"rid": run_id, **{c: sp.get(c) for c in _STAGE_COLS},
+             "attrs": json.dumps(sp.get("attrs") or {}, default=str)} for sp in spans]
+    _run(f"""
+      INSERT INTO etl_agent_run_stages(run_id, {", ".join(_STAGE_COLS)}, attrs_json)
+      VALUES (:rid, {", ".join(":" + col for col in _STAGE_COLS)}, :attrs)
+    """, rows, many=True)
+    return len(rows)
+
+def get_stages(run_id: str) -> list:
+    r = _exec(f"SELECT {', '.join(_STAGE_COLS)}, attrs_json FROM etl_agent_run_stages WHERE run_id=:rid ORDER BY seq",
+              rid=run_id)
+    return [{**dict(zip(_STAGE_COLS, row[:-1])), "attrs": json.loads(row[-1] or "{}")} for row in r]
+
+_BENCH_COLS = ("scale", "stage", "wall_ms", "cpu_ms", "rows", "bytes", "peak_rss_kb")
+
+def put_bench_results(bench_id: str, suite: str, rows: list, git_rev: Optional[str] = None) -> int:
+    """Store one benchmark run: a row per (scale, stage)."""
+    if not rows:
+        return 0
+    ts = datetime.now(timezone.utc)
+    params = [{"bid": bench_id, "suite": suite, "rev": git_rev, "ts": ts, **{c: r.get(c) for c in _BENCH_COLS}}
+              for r in rows]
+    _run(f"""
+      INSERT INTO etl_agent_bench(bench_id, suite, {", ".join(_BENCH_COLS)}, git_rev, created_at)
+      VALUES (:bid, :suite, {", ".join(":" + col for col in _BENCH_COLS)}, :rev, :ts)
+    """, params, many=True)
+    return len(params)
+
+def get_bench_results(bench_id: str) -> list:
+    r = _exec(f"SELECT {', '.join(_BENCH_COLS)} FROM etl_agent_bench WHERE bench_id=:bid ORDER BY scale, stage",
+              bid=bench_id)
+    return [dict(zip(_BENCH_COLS, row)) for row in r]
+
+def get_source_schema(source_hash: str) -> Optional[dict]:
+    r = _exec("SELECT schema_json FROM etl_agent_source_schema WHERE source_hash=:h", h=source_hash).fetchone()
+    return json.loads(r[0]) if r and r[0] else None
+
+def put_source_schema(source_hash: str, schema: dict):
+    _exec("""
+      INSERT INTO etl_agent_source_schema(source_hash, schema_json, sample_ts) VALUES (:h, :s, :ts)
+      ON CONFLICT(source_hash) DO UPDATE SET schema_json=excluded.schema_json, sample_ts=excluded.sample_ts
+    """, h=source_hash, s=json.dumps(schema), ts=datetime.now(timezone.utc))
+
 def get_state(key: str, default=None):
     r = _exec("SELECT value_json FROM etl_agent_state WHERE key=:k", k=key).fetchone()
     return json.loads(r[0]) if r and r[0] else default
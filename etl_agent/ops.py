@@ -1,19 +1,204 @@
-import os, json
-from typing import Optional, List
+import os, io, re, glob, json, time, hashlib, tempfile, threading, itertools, contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional, List
 import pandas as pd
+import duckdb
 
-# --- simple in-memory registry for dataframes
-_DF_REGISTRY: dict[str, pd.DataFrame] = {}
+# --- memory-budgeted registry for dataframes
+
+class DataFrameRegistry:
+    """Handle -> DataFrame store with a byte budget.
+
+    Every handle's size is tracked; once resident frames exceed the budget the
+    least-recently-used ones are spilled to Parquet under the spill dir and reloaded
+    transparently by get(). Handles created inside scope() are freed when it exits,
+    so a run releases everything it produced even in a long-lived worker. A scope
+    carries its own budget, spill dir and on_spill(handle, path) hook (configure()
+    inside it), so concurrent runs never see each other's limits; frames put outside
+    any scope use the registry-wide defaults.
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None, spill_dir: Optional[str] = None):
+        self.budget_bytes = budget_bytes
+        self.spill_dir = spill_dir
+        self._frames: "OrderedDict[str, pd.DataFrame]" = OrderedDict()   # resident, LRU first
+        self._spilled: dict[str, str] = {}                                # handle -> parquet path
+        self._sizes: dict[str, int] = {}
+        self._owner: dict[str, dict] = {}                                 # handle -> its scope
+        self._seq = itertools.count(1)
+        self._lock = threading.RLock()
+        self._scope = contextvars.ContextVar("etl_agent_registry_scope", default=None)
+        self.spills = 0
+        self.reloads = 0
+
+    def put(self, df: pd.DataFrame, tag: str) -> str:
+        with self._lock:
+            key = f"{tag}_{next(self._seq)}"
+            self._frames[key] = df
+            self._sizes[key] = _frame_bytes(df)
+            scope = self._scope.get()
+            if scope is not None:
+                scope["owned"].append(key)
+                self._owner[key] = scope
+            self._evict(keep=key)
+            return key
+
+    def get(self, handle: str) -> pd.DataFrame:
+        with self._lock:
+            if handle in self._frames:
+                self._frames.move_to_end(handle)
+                return self._frames[handle]
+            if handle not in self._spilled:
+                raise KeyError(f"unknown dataframe handle: {handle}")
+            path = self._spilled.pop(handle)
+            df = pd.read_parquet(path)
+            os.remove(path)
+            self.reloads += 1
+            self._frames[handle] = df
+            self._evict(keep=handle)
+            return df
+
+    def free(self, handle: str) -> None:
+        with self._lock:
+            self._frames.pop(handle, None)
+            self._sizes.pop(handle, None)
+            self._owner.pop(handle, None)
+            path = self._spilled.pop(handle, None)
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    @contextmanager
+    def scope(self):
+        """Free every handle put() inside the block (per run, per thread/task)."""
+        scope = {"owned": [], "budget_bytes": self.budget_bytes, "spill_dir": self.spill_dir, "on_spill": None}
+        token = self._scope.set(scope)
+        try:
+            yield scope["owned"]
+        finally:
+            self._scope.reset(token)
+            for key in scope["owned"]:
+                self.free(key)
+
+    def configure(self, budget_bytes: Optional[int] = None, spill_dir: Optional[str] = None,
+                  on_spill=None) -> None:
+        """Set the current scope's budget / spill dir / spill hook (the defaults outside a scope)."""
+        scope = self._scope.get()
+        if scope is None:
+            if budget_bytes is not None:
+                self.budget_bytes = int(budget_bytes)
+            if spill_dir:
+                self.spill_dir = spill_dir
+            return
+        if budget_bytes is not None:
+            scope["budget_bytes"] = int(budget_bytes)
+        if spill_dir:
+            scope["spill_dir"] = spill_dir
+        if on_spill is not None:
+            scope["on_spill"] = on_spill
+
+    def resident_bytes(self) -> int:
+        return sum(self._sizes[k] for k in self._frames)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "handles": len(self._sizes), "resident": len(self._frames), "spilled": len(self._spilled),
+                "resident_bytes": self.resident_bytes(), "budget_bytes": self.budget_bytes,
+                "spills": self.spills, "reloads": self.reloads,
+            }
+
+    def __contains__(self, handle: str) -> bool:
+        return handle in self._sizes
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def _evict(self, keep: str) -> None:
+        # only frames of keep's own scope count against (and are spilled for) its budget
+        scope = self._owner.get(keep)
+        budget = scope["budget_bytes"] if scope is not None else self.budget_bytes
+        if budget is None:
+            return
+        mine = [k for k in self._frames if self._owner.get(k) is scope]
+        resident = sum(self._sizes[k] for k in mine)
+        for key in mine:
+            if resident <= budget:
+                break
+            if key != keep and self._spill(key, scope):
+                resident -= self._sizes[key]
+
+    def _spill(self, key: str, scope: Optional[dict]) -> bool:
+        spill_dir = (scope or {}).get("spill_dir") or self.spill_dir \
+            or os.path.join(tempfile.gettempdir(), f"etl_agent_registry_{os.getpid()}")
+        os.makedirs(spill_dir, exist_ok=True)
+        path = os.path.join(spill_dir, f"{key.replace('/', '_').replace(':', '_')}.parquet")
+        try:
+            self._frames[key].to_parquet(path)
+        except Exception:
+            return False  # not representable in Parquet (e.g. mixed object columns): stays resident
+        del self._frames[key]
+        self._spilled[key] = path
+        self.spills += 1
+        if scope is not None and scope["on_spill"] is not None:
+            # the owner drops its own references, or the spill frees nothing
+            scope["on_spill"](key, path)
+        return True
+
+# rows sampled to size object columns without touching every Python object
+_SIZE_SAMPLE_ROWS = 1_000
+
+def _frame_bytes(df: pd.DataFrame) -> int:
+    # shallow sizes are exact for numeric and Arrow-backed (pandas 3 string) columns;
+    # object columns are estimated from the first rows
+    total = int(df.memory_usage(index=True, deep=False).sum())
+    obj = df.loc[:, (df.dtypes == object).to_numpy()]
+    if obj.shape[1] and len(df):
+        head = obj.iloc[:_SIZE_SAMPLE_ROWS]
+        extra = head.memory_usage(index=False, deep=True).sum() - head.memory_usage(index=False, deep=False).sum()
+        total += int(extra / len(head) * len(df))
+    return total
+
+_DF_REGISTRY = DataFrameRegistry(
+    budget_bytes=int(os.getenv("ETL_AGENT_REGISTRY_BYTES", 2 * 1024**3)),
+    spill_dir=os.getenv("ETL_AGENT_SPILL_DIR") or None,
+)
 
 def registry_put(df: pd.DataFrame, tag: str) -> str:
-    key = f"{tag}_{len(_DF_REGISTRY)+1}"
-    _DF_REGISTRY[key] = df
-    return key
+    return _DF_REGISTRY.put(df, tag)
 
 def registry_get(handle: str) -> pd.DataFrame:
-    if handle not in _DF_REGISTRY:
-        raise KeyError(f"unknown dataframe handle: {handle}")
-    return _DF_REGISTRY[handle]
+    return _DF_REGISTRY.get(handle)
+
+def registry_free(handle: str) -> None:
+    _DF_REGISTRY.free(handle)
+
+def registry_scope():
+    return _DF_REGISTRY.scope()
+
+def registry_configure(budget_bytes: Optional[int] = None, spill_dir: Optional[str] = None,
+                       on_spill=None) -> None:
+    """Apply plan limits (limits.registry_bytes / limits.spill_dir) to the current run's
+    registry scope; on_spill(handle, path) is called when one of its frames is spilled."""
+    _DF_REGISTRY.configure(budget_bytes, spill_dir, on_spill)
+
+# --- status events: report_status calls reach whoever set a sink for this run (e.g. `etl_agent serve`)
+
+_STATUS_SINK = contextvars.ContextVar("etl_agent_status_sink", default=None)
+
+@contextmanager
+def status_sink(fn):
+    """Route status events raised in this context (and tasks copied from it) to fn(event)."""
+    token = _STATUS_SINK.set(fn)
+    try:
+        yield
+    finally:
+        _STATUS_SINK.reset(token)
+
+def emit_status(step: str = "", detail: str = "", **extra) -> None:
+    fn = _STATUS_SINK.get()
+    if fn is not None:
+        fn({"ts": time.time(), "step": step, "detail": detail, **extra})
 
 # --- IO + checks
 
@@ -25,26 +210,896 @@ def load_csv_op(path: str, max_bytes: Optional[int] = 1_000_000_000) -> str:
     df = pd.read_csv(path)
     return registry_put(df, "csv")
 
-def write_csv_op(handle: str, path: str, include_header: bool = True) -> str:
-    df = registry_get(handle)
+# --- out-of-core ingestion: DuckDB scans straight over the files
+
+# pandas' default NA markers, so streamed and in-memory reads agree on nulls
+CSV_NULLS = ["", "NA", "N/A", "NULL", "NaN", "nan", "#N/A", "null"]
+# no DATE/TIMESTAMP candidates: pandas leaves dates as strings and plan SQL parses them itself
+_CSV_TYPES = ["BOOLEAN", "BIGINT", "DOUBLE", "VARCHAR"]
+# DuckDB cannot run scans/joins in less than a few blocks per thread
+_MIN_DUCKDB_MEMORY = 256 * 1024 * 1024
+
+def ingest_mode_op(paths: List[str], limits: Optional[dict] = None) -> str:
+    """Pick 'memory' (pandas) or 'stream' (DuckDB scan) for a set of input files.
+
+    limits.ingest: auto (default) streams once the inputs exceed max_input_bytes,
+    memory/stream force one mode.
+    """
+    limits = limits or {}
+    mode = limits.get("ingest", "auto")
+    if mode in ("memory", "stream"):
+        return mode
+    if mode != "auto":
+        raise ValueError(f"limits.ingest must be auto|memory|stream; got {mode!r}")
+    max_bytes = limits.get("max_input_bytes", 1_000_000_000)
+    total = sum(os.path.getsize(p) for p in expand_paths(paths))
+    return "stream" if max_bytes is not None and total > max_bytes else "memory"
+
+def duckdb_connect_op(limits: Optional[dict] = None, streaming: bool = False):
+    """DuckDB connection configured from plan limits.
+
+    In streaming mode max_input_bytes becomes DuckDB's memory_limit (a soft budget:
+    operators spill to limits.spill_dir instead of failing), so peak RSS stays
+    bounded regardless of input size.
+    """
+    limits = limits or {}
+    con = duckdb.connect()
+    mem = limits.get("memory_limit")
+    if mem is None and streaming:
+        mem = max(int(limits.get("max_input_bytes") or 1_000_000_000), _MIN_DUCKDB_MEMORY)
+    if mem is not None:
+        mem = f"{int(mem)}B" if isinstance(mem, (int, float)) else str(mem)
+        con.execute(f"SET memory_limit='{mem}'")
+    if streaming:
+        spill = limits.get("spill_dir") or os.path.join(tempfile.gettempdir(), "etl_agent_spill")
+        os.makedirs(spill, exist_ok=True)
+        con.execute(f"SET temp_directory='{_sql_str(spill)}'")
+        # lets scans/aggregates stream without buffering to keep row order (ORDER BY still holds)
+        con.execute("SET preserve_insertion_order=false")
+    if limits.get("threads"):
+        con.execute(f"SET threads={int(limits['threads'])}")
+    return con
+
+def scan_csv_op(con, name: str, path, where: str = "") -> str:
+    """Expose CSV file(s) to DuckDB as view `name` over a streaming scan (no pandas frame).
+
+    `path` may be a single file or a list of files with the same header; `where`
+    is an optional row filter pushed into the view.
+    """
+    paths = [path] if isinstance(path, str) else list(path)
+    for p in paths:
+        if not os.path.exists(p):
+            raise FileNotFoundError(p)
+    files = ", ".join(f"'{_sql_str(p)}'" for p in paths)
+    nulls = ", ".join(f"'{v}'" for v in CSV_NULLS)
+    types = ", ".join(f"'{t}'" for t in _CSV_TYPES)
+    con.execute(
+        f'CREATE OR REPLACE VIEW "{name}" AS SELECT * FROM read_csv('
+        f"[{files}], header=true, nullstr=[{nulls}], auto_type_candidates=[{types}])"
+        + (f" WHERE {where}" if where else "")
+    )
+    return name
+
+def _sql_str(v: str) -> str:
+    return str(v).replace("'", "''")
+
+def sql_literal(v) -> str:
+    """Render a watermark/filter value as a DuckDB literal (strings cast to the column's type)."""
+    if isinstance(v, bool):
+        return "TRUE" if v else "FALSE"
+    if isinstance(v, (int, float)):
+        return repr(v)
+    return f"'{_sql_str(v)}'"
+
+def strip_sql(sql: str) -> str:
+    """Drop trailing semicolons so a statement can be wrapped as a subquery/view."""
+    return str(sql or "").strip().rstrip(";").strip()
+
+# --- incremental extraction helpers (state lives in memory.etl_agent_state)
+
+def expand_paths(path) -> List[str]:
+    """A path, glob pattern or list of either -> sorted list of existing files."""
+    out: List[str] = []
+    for p in ([path] if isinstance(path, str) else list(path)):
+        hits = sorted(glob.glob(p)) if glob.has_magic(p) else [p]
+        if not hits:
+            raise FileNotFoundError(p)
+        out.extend(hits)
+    return out
+
+def file_fingerprint(path: str) -> list:
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+def changed_files(paths: List[str], seen: Optional[dict] = None) -> List[str]:
+    """Files whose size/mtime differ from the fingerprints recorded by the last successful run."""
+    seen = seen or {}
+    return [p for p in paths if seen.get(p) != file_fingerprint(p)]
+
+def watermark_value(v):
+    """JSON-safe watermark (dates/decimals as ISO/str, numbers kept numeric)."""
+    if v is None or isinstance(v, (bool, int, float, str)):
+        return v
+    if hasattr(v, "isoformat"):
+        return v.isoformat()
+    return str(v)
+
+# --- other sources
+
+_JSON_PATH_TOKEN = re.compile(r"""\.([A-Za-z_][\w-]*)|\[(\d+)\]|\[['"]([^'"]+)['"]\]|(\[\*\]|\.\*)""")
+_JSON_PATH_ROOT = re.compile(r"(\$|data)(?=$|[.\[])")
+_WILDCARD = object()
+
+def _json_path_tokens(json_path: str) -> list:
+    path = (json_path or "").strip()
+    # "$" or a whole leading "data" token is the document root ("dataset" is a key)
+    root = _JSON_PATH_ROOT.match(path)
+    if root:
+        path = path[root.end():]
+    if path and path[0] not in ".[":
+        path = "." + path
+    tokens, pos = [], 0
+    while pos < len(path):
+        m = _JSON_PATH_TOKEN.match(path, pos)
+        if not m:
+            raise ValueError(f"unsupported json_path: {json_path!r}")
+        key, idx, quoted, star = m.groups()
+        tokens.append(_WILDCARD if star else int(idx) if idx is not None else key if key is not None else quoted)
+        pos = m.end()
+    return tokens
+
+def _walk_json(node, tokens: list):
+    for i, tok in enumerate(tokens):
+        if tok is _WILDCARD:
+            items = node.values() if isinstance(node, dict) else node
+            rest = tokens[i + 1:]
+            out = []
+            for item in items:
+                v = _walk_json(item, rest)
+                # nested wildcards flatten into one list of matches
+                out.extend(v if _WILDCARD in rest else [v])
+            return out
+        node = node[tok]
+    return node
+
+def select_json(data, json_path: str = ""):
+    """Evaluate a small, safe JSONPath subset (no eval): `$.a.b[0]`, `$['a']`,
+    wildcards `$.items[*].sku`, and the legacy `data['a']` form."""
+    return _walk_json(data, _json_path_tokens(json_path))
+
+def fetch_db_op(conn_str: str, query: str, params: Optional[dict] = None) -> str:
+    from sqlalchemy import text
+    from etl_agent.engines import get_engine
+    eng = get_engine(conn_str)
+    df = pd.read_sql_query(text(query) if params else query, eng, params=params or None)
+    return registry_put(df, "db")
+
+DB_FETCH_SIZE = 50_000
+
+def _decimal_types(df: pd.DataFrame) -> dict:
+    """Object columns holding decimal.Decimal -> decimal128(38, scale seen in the sample)."""
+    import decimal, pyarrow as pa
+    out = {}
+    for c in df.columns:
+        if df[c].dtype != object:
+            continue
+        sample = df[c].dropna().head(1000)
+        if len(sample) and isinstance(sample.iloc[0], decimal.Decimal):
+            scale = max(max(-v.as_tuple().exponent, 0) for v in sample if v.is_finite())
+            out[c] = pa.decimal128(38, min(scale, 37))
+    return out
+
+def stream_db_op(conn_str: str, query: str, con, name: str, params: Optional[dict] = None,
+                 fetch_size: int = DB_FETCH_SIZE, spill_path: Optional[str] = None,
+                 progress=None) -> dict:
+    """Stream an upstream query into DuckDB table `name` through a server-side cursor.
+
+    Rows arrive `fetch_size` at a time (psycopg2 named cursor via stream_results) and
+    are appended batch by batch, so the client never holds the whole result. With
+    `spill_path` batches go to a Parquet file that `name` is a view over instead.
+    `progress(stats)` is called after every batch.
+    """
+    import pyarrow as pa, pyarrow.parquet as pq
+    from sqlalchemy import text
+    from etl_agent.engines import get_engine
+    eng = get_engine(conn_str)
+    t0 = time.perf_counter()
+    stats = {"rows": 0, "batches": 0, "seconds": 0.0, "rows_per_sec": None}
+    writer = None
+    with eng.connect() as c:
+        result = c.execution_options(stream_results=True, yield_per=fetch_size).execute(text(query), params or {})
+        columns = list(result.keys())
+        decimals = None
+        for part in result.partitions(fetch_size):
+            batch = pd.DataFrame.from_records(part, columns=columns)
+            if decimals is None:
+                decimals = _decimal_types(batch)
+            for col, typ in decimals.items():
+                # DuckDB sizes object Decimals from a sample; pin precision/scale from the first batch
+                batch[col] = pd.array(batch[col], dtype=pd.ArrowDtype(typ))
+            if stats["batches"] == 0:
+                # all-null columns in the first batch would otherwise be typed INTEGER
+                nulls = [c for c in columns if batch[c].isna().all()]
+                cast = f" REPLACE ({', '.join(f'CAST({_qident(c)} AS VARCHAR) AS {_qident(c)}' for c in nulls)})" if nulls else ""
+                if spill_path:
+                    first = con.execute(f"SELECT *{cast} FROM batch").arrow()
+                    first = first.read_all() if hasattr(first, "read_all") else first
+                    writer = pq.ParquetWriter(spill_path, first.schema)
+                    writer.write_table(first)
+                else:
+                    con.execute(f'CREATE OR REPLACE TABLE "{name}" AS SELECT *{cast} FROM batch')
+            elif writer is not None:
+                writer.write_table(pa.Table.from_pandas(batch, preserve_index=False).cast(writer.schema))
+            else:
+                con.execute(f'INSERT INTO "{name}" SELECT * FROM batch')
+            stats["rows"] += len(batch)
+            stats["batches"] += 1
+            stats["seconds"] = round(time.perf_counter() - t0, 3)
+            stats["rows_per_sec"] = round(stats["rows"] / stats["seconds"], 1) if stats["seconds"] else None
+            if progress:
+                progress(dict(stats))
+        if stats["batches"] == 0:
+            # empty result: keep the column names so the transform SQL still binds
+            cols = ", ".join(f"NULL::VARCHAR AS {_qident(c)}" for c in columns)
+            con.execute(f'CREATE OR REPLACE TABLE "{name}" AS SELECT {cols} LIMIT 0')
+    if writer is not None:
+        writer.close()
+        con.execute(f"CREATE OR REPLACE VIEW \"{name}\" AS SELECT * FROM read_parquet('{_sql_str(spill_path)}')")
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    stats["rows_per_sec"] = round(stats["rows"] / stats["seconds"], 1) if stats["seconds"] else None
+    return stats
+
+def fetch_api_op(url: str, params: Optional[dict] = None, json_path: str = "",
+                 pagination: Optional[dict] = None, **opts) -> str:
+    from etl_agent.api import ApiExtractor
+    table = ApiExtractor(url, params=params, json_path=json_path, pagination=pagination, **opts).run()
+    return registry_put(table.to_pandas(), "api")
+
+def load_json_op(path: str, json_path: str = "") -> str:
+    with open(path) as f:
+        data = json.load(f)
+    return registry_put(pd.json_normalize(select_json(data, json_path)), "json")
+
+# --- bulk Postgres loading (COPY FROM STDIN fed from Arrow batches)
+
+COPY_CHUNK_ROWS = 100_000
+
+def _qident(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _split_table(table: str):
+    """'schema.table' -> ('schema', 'table'); bare names -> (None, name)."""
+    schema, _, name = table.rpartition(".")
+    return (schema or None), name
+
+def _qtable(table: str) -> str:
+    schema, name = _split_table(table)
+    return f"{_qident(schema)}.{_qident(name)}" if schema else _qident(name)
+
+def _batch_source(handle: Optional[str] = None, con=None, relation: Optional[str] = None,
+                  extra: Optional[dict] = None):
+    # (DuckDB connection, query) reading a registry handle or relation plus `extra` constants
+    cols = "".join(f", {sql_literal(v)} AS {_qident(k)}" for k, v in (extra or {}).items())
+    if relation is not None:
+        return con, f'SELECT *{cols} FROM "{relation}"'
+    src = duckdb.connect()
+    src.register("_batch_src", registry_get(handle))
+    return src, f"SELECT *{cols} FROM _batch_src"
+
+def dedupe_sql(query: str, key_cols: List[str]) -> str:
+    """`query` keeping one row per key: the last one in input order."""
+    keys = ", ".join(_qident(c) for c in key_cols)
+    return (f"SELECT * EXCLUDE (_etl_ord) FROM (SELECT *, row_number() OVER () AS _etl_ord FROM ({query})) "
+            f"QUALIFY row_number() OVER (PARTITION BY {keys} ORDER BY _etl_ord DESC) = 1")
+
+def record_batches(handle: Optional[str] = None, con=None, relation: Optional[str] = None,
+                   chunk_rows: int = COPY_CHUNK_ROWS, extra: Optional[dict] = None, query: Optional[str] = None):
+    """(zero-row pandas schema frame, iterator of Arrow record batches) for a registry
+    handle or a DuckDB relation, with `extra` {column: constant} appended. DuckDB produces
+    the batches lazily, so the result is never rendered in one piece. `query` replaces the
+    plain read (it runs on `con`)."""
+    if query is not None:
+        src = con
+    else:
+        src, query = _batch_source(handle, con=con, relation=relation, extra=extra)
+    empty = src.execute(f"{query} LIMIT 0").df()
+    reader = src.execute(query).fetch_record_batch(chunk_rows)
+    return empty, iter(reader)
+
+class _CSVBatchStream:
+    """Read-only file object rendering record batches to CSV on demand for COPY FROM STDIN."""
+
+    def __init__(self, batches):
+        import pyarrow.csv as pacsv
+        self._pacsv = pacsv
+        self._opts = pacsv.WriteOptions(include_header=False)
+        self._batches = iter(batches)
+        self._buf = b""
+        self._pos = 0
+        self.rows = 0
+        self.bytes = 0
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buf) - self._pos < size:
+            batch = next(self._batches, None)
+            if batch is None:
+                break
+            sink = io.BytesIO()
+            self._pacsv.write_csv(batch, sink, self._opts)
+            self._buf = self._buf[self._pos:] + sink.getvalue()
+            self._pos = 0
+            self.rows += batch.num_rows
+        end = len(self._buf) if size < 0 else self._pos + size
+        out = self._buf[self._pos:end]
+        self._pos += len(out)
+        self.bytes += len(out)
+        return out
+
+    def readline(self, size: int = -1) -> bytes:
+        return self.read(size)
+
+def _copy_into(eng, cur, table: str, columns: List[str], batches):
+    # (rows sent, rows stored, method) through an open DB-API cursor; the caller commits
+    if hasattr(cur, "copy_expert"):
+        stream = _CSVBatchStream(batches)
+        cols = ", ".join(_qident(c) for c in columns)
+        cur.copy_expert(f"COPY {_qtable(table)} ({cols}) FROM STDIN WITH (FORMAT csv)", stream, size=1 << 20)
+        # the server's own count of rows COPY stored
+        written = cur.rowcount if cur.rowcount is not None and cur.rowcount >= 0 else stream.rows
+        return stream.rows, written, "copy"
+    rows, written = 0, 0
+    marks = ", ".join("?" if eng.dialect.paramstyle == "qmark" else "%s" for _ in columns)
+    sql = f"INSERT INTO {_qtable(table)} ({', '.join(_qident(c) for c in columns)}) VALUES ({marks})"
+    for batch in batches:
+        cur.executemany(sql, list(zip(*(col.to_pylist() for col in batch.columns))))
+        rows += batch.num_rows
+        written += cur.rowcount if cur.rowcount is not None and cur.rowcount >= 0 else batch.num_rows
+    return rows, written, "insert"
+
+def copy_batches(eng, table: str, columns: List[str], batches, ddl: Optional[List[str]] = None) -> dict:
+    """COPY record batches into an existing table. Falls back to chunked INSERTs when
+    the driver has no COPY support (non-psycopg2 engines such as SQLite). `ddl` statements
+    run first on the same connection and commit together with the rows."""
+    t0 = time.perf_counter()
+    raw = eng.raw_connection()
+    try:
+        cur = raw.cursor()
+        for stmt in ddl or []:
+            cur.execute(stmt)
+        rows, written, method = _copy_into(eng, cur, table, columns, batches)
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    secs = time.perf_counter() - t0
+    return {"rows": int(rows), "rows_written": int(written), "seconds": round(secs, 3),
+            "rows_per_sec": round(rows / secs, 1) if secs else None, "method": method}
+
+# upsert: rows merged per transaction (bounds lock time and WAL per commit)
+MERGE_BATCH_ROWS = 50_000
+
+# unique indexes (or primary key) on exactly the key columns, which ON CONFLICT can infer
+_PG_UNIQUE_ON = """
+SELECT i.relname
+FROM pg_index x
+JOIN pg_class c ON c.oid = x.indrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_class i ON i.oid = x.indexrelid
+WHERE n.nspname = COALESCE(%(schema)s, current_schema()) AND c.relname = %(name)s
+  AND x.indisunique AND x.indisvalid AND x.indpred IS NULL AND x.indexprs IS NULL
+  AND x.indnkeyatts = %(n)s
+  AND (SELECT array_agg(a.attname::text ORDER BY a.attname::text) FROM pg_attribute a
+       WHERE a.attrelid = x.indrelid AND a.attnum = ANY(x.indkey[0:x.indnkeyatts - 1])) = %(keys)s::text[]
+"""
+
+def _ensure_unique_index(cur, table: str, key_cols: List[str]):
+    """(name, created) of the unique index ON CONFLICT (key_cols) will use, creating it when missing."""
+    schema, name = _split_table(table)
+    cur.execute(_PG_UNIQUE_ON, {"schema": schema, "name": name, "n": len(key_cols), "keys": sorted(key_cols)})
+    row = cur.fetchone()
+    if row:
+        return row[0], False
+    index = f"{name}_{'_'.join(key_cols)}_key"[:63]
+    keys = ", ".join(_qident(c) for c in key_cols)
+    try:
+        cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {_qident(index)} ON {_qtable(table)} ({keys})")
+    except Exception as e:
+        raise ValueError(f"upsert: cannot create a unique index on {table} ({keys}); "
+                         f"the table already holds duplicate keys: {e}") from e
+    return index, True
+
+def upsert_postgres(eng, table: str, src, query: str, key_cols: List[str],
+                    chunk_rows: int = COPY_CHUNK_ROWS, merge_rows: int = MERGE_BATCH_ROWS,
+                    tag_cols: Optional[List[str]] = None) -> dict:
+    """Merge the rows of DuckDB `query` (run on `src`) into `table` on `key_cols`.
+
+    Keys are deduplicated in DuckDB (last row wins) before anything is sent; rows
+    COPY into a session-local temp stage (temp tables write no WAL); the target
+    gets a unique index on the keys if it has none; then the stage is merged in
+    transactions of `merge_rows`. Rows whose values already match are left alone,
+    so re-running a load rewrites nothing; `tag_cols` (e.g. a batch id, new every run)
+    are written with a changed row but not compared. Batches commit as they go: a failed
+    load leaves the earlier batches merged, and re-running it is safe.
+    """
+    if eng.dialect.name != "postgresql":
+        raise ValueError(f"upsert needs PostgreSQL; got {eng.dialect.name}")
+    if not key_cols:
+        raise ValueError("upsert needs key_cols")
+    t0 = time.perf_counter()
+    missing = [c for c in key_cols if c not in [d[0] for d in src.execute(f"{query} LIMIT 0").description]]
+    if missing:
+        raise ValueError(f"upsert: key_cols not in the data: {missing}")
+    keys = ", ".join(_qident(c) for c in key_cols)
+    total, distinct, null_keys = src.execute(
+        f"SELECT COUNT(*), COUNT(DISTINCT ({keys})), "
+        f"COUNT(*) FILTER (WHERE {' OR '.join(f'{_qident(c)} IS NULL' for c in key_cols)}) FROM ({query})").fetchone()
+    if null_keys:
+        raise ValueError(f"upsert: {null_keys:,} rows have NULL in key_cols {key_cols}")
+    if distinct < total:
+        query = dedupe_sql(query, key_cols)
+    empty, batches = record_batches(con=src, query=query, chunk_rows=chunk_rows)
+    cols = list(empty.columns)
+    schema, name = _split_table(table)
+    # zero-row to_sql only issues the DDL when the target is new
+    empty.to_sql(name, eng, schema=schema, if_exists="append", index=False)
+    qcols = ", ".join(_qident(c) for c in cols)
+    rest = [c for c in cols if c not in key_cols]
+    stage = "_etl_stage"
+    raw = eng.raw_connection()
+    try:
+        cur = raw.cursor()
+        index, created = _ensure_unique_index(cur, table, key_cols)
+        # same column types as the target, so the merge needs no casts
+        cur.execute(f"DROP TABLE IF EXISTS {stage}")
+        cur.execute(f"CREATE TEMP TABLE {stage} AS SELECT {qcols} FROM {_qtable(table)} WHERE false")
+        cur.execute(f"ALTER TABLE {stage} ADD COLUMN _etl_seq bigserial")
+        rows, written, _ = _copy_into(eng, cur, stage, cols, batches)
+        cur.execute(f"CREATE INDEX ON {stage} (_etl_seq)")
+        cur.execute(f"ANALYZE {stage}")
+        raw.commit()
+        t_staged = time.perf_counter()
+        compare = [c for c in rest if c not in (tag_cols or [])]
+        if compare:
+            changed = ", ".join(f"{_qtable(table)}.{_qident(c)}" for c in compare)
+            incoming = ", ".join(f"EXCLUDED.{_qident(c)}" for c in compare)
+            action = (f"DO UPDATE SET {', '.join(f'{_qident(c)} = EXCLUDED.{_qident(c)}' for c in rest)} "
+                      f"WHERE ({changed}) IS DISTINCT FROM ({incoming})")
+        else:
+            action = "DO NOTHING"
+        # xmax = 0 on a returned row: it was inserted, not updated
+        merge = (f"WITH m AS (INSERT INTO {_qtable(table)} ({qcols}) SELECT {qcols} FROM {stage} "
+                 f"WHERE _etl_seq > %(lo)s AND _etl_seq <= %(hi)s ON CONFLICT ({keys}) {action} "
+                 f"RETURNING (xmax = 0) AS ins) "
+                 f"SELECT COUNT(*) FILTER (WHERE ins), COUNT(*) FILTER (WHERE NOT ins) FROM m")
+        cur.execute(f"SELECT COALESCE(MAX(_etl_seq), 0) FROM {stage}")
+        top = cur.fetchone()[0]
+        inserted = updated = merges = 0
+        for lo in range(0, top, merge_rows):
+            cur.execute(merge, {"lo": lo, "hi": lo + merge_rows})
+            ins, upd = cur.fetchone()
+            raw.commit()
+            inserted, updated, merges = inserted + ins, updated + upd, merges + 1
+        cur.execute(f"DROP TABLE IF EXISTS {stage}")
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    secs = time.perf_counter() - t0
+    return {"rows": int(rows), "rows_written": int(written), "seconds": round(secs, 3),
+            "rows_per_sec": round(rows / secs, 1) if secs else None, "method": "copy+merge",
+            "inserted": int(inserted), "updated": int(updated), "unchanged": int(rows - inserted - updated),
+            "duplicates": int(total - distinct), "merge_batches": merges,
+            "stage_seconds": round(t_staged - t0, 3), "merge_seconds": round(time.perf_counter() - t_staged, 3),
+            "unique_index": index, "index_created": created}
+
+def bulk_load_postgres(handle: Optional[str], conn_str: str, table: str, mode: str = "append",
+                       key_cols: Optional[List[str]] = None, con=None, relation: Optional[str] = None,
+                       chunk_rows: int = COPY_CHUNK_ROWS, tag: Optional[dict] = None,
+                       merge_rows: int = MERGE_BATCH_ROWS) -> dict:
+    """Stream a registry handle (or DuckDB relation) into Postgres with COPY.
+
+    append/replace create the target from the frame's schema when needed; upsert
+    merges on key_cols through a temp stage (see upsert_postgres).
+    `tag` ({column: value}, e.g. a batch id) is stamped on every row written.
+    """
+    from etl_agent.engines import get_engine
+    if mode not in ("append", "replace", "upsert"):
+        raise ValueError(f"load mode must be append|replace|upsert; got {mode!r}")
+    eng = get_engine(conn_str)
+    if mode == "upsert":
+        src, query = _batch_source(handle, con=con, relation=relation, extra=tag)
+        stats = upsert_postgres(eng, table, src, query, list(key_cols or []), chunk_rows=chunk_rows,
+                                merge_rows=merge_rows, tag_cols=list(tag or {}))
+    else:
+        empty, batches = record_batches(handle, con=con, relation=relation, chunk_rows=chunk_rows, extra=tag)
+        schema, name = _split_table(table)
+        ddl = None
+        if mode == "replace":
+            # dropped and recreated in the COPY's transaction: a failed load leaves the old table
+            ddl = [f"DROP TABLE IF EXISTS {_qtable(table)}", pd.io.sql.get_schema(empty, name, con=eng, schema=schema)]
+        else:
+            # zero-row to_sql only issues the DDL; the rows go through COPY
+            empty.to_sql(name, eng, schema=schema, if_exists="append", index=False)
+        stats = copy_batches(eng, table, list(empty.columns), batches, ddl=ddl)
+    stats.update({"table": table, "mode": mode})
+    if tag:
+        stats["tag"] = dict(tag)
+    return stats
+
+def load_message(st: dict) -> str:
+    msg = f"wrote {st['rows']:,} rows to {st['table']} via {st['method']} in {st['seconds']}s ({st['rows_per_sec'] or 0:,.0f} rows/s)"
+    if st.get("mode") == "upsert":
+        msg += f": {st['inserted']:,} inserted, {st['updated']:,} updated, {st['unchanged']:,} unchanged"
+        if st.get("duplicates"):
+            msg += f", {st['duplicates']:,} duplicate keys dropped"
+    return msg
+
+def load_to_postgres_op(handle: str, conn_str: str, table: str, mode: str = "append",
+                        key_cols: Optional[List[str]] = None) -> str:
+    return load_message(bulk_load_postgres(handle, conn_str, table, mode=mode, key_cols=key_cols))
+
+# verify.mode auto: tables estimated above this many rows get the catalog-based check
+VERIFY_EXACT_MAX_ROWS = int(os.getenv("ETL_AGENT_VERIFY_EXACT_MAX_ROWS", 5_000_000))
+
+_PG_TABLE_STATS = """
+SELECT c.oid, c.reltuples::bigint, s.n_live_tup, s.n_tup_ins, s.last_analyze, s.last_autoanalyze
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+WHERE n.nspname = COALESCE(:schema, current_schema()) AND c.relname = :name
+"""
+
+# indexes whose leading key is the column: MAX() on it is an index-only backward scan
+_PG_LEADING_INDEX = """
+SELECT i.relname
+FROM pg_index x
+JOIN pg_class i ON i.oid = x.indexrelid
+JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = x.indkey[0]
+WHERE x.indrelid = :oid AND a.attname = :col AND x.indisvalid
+ORDER BY i.relname
+"""
+
+def _lag_minutes(max_ts):
+    """(lag in minutes or None, error or None) for a MAX(ts) value."""
+    if max_ts is None:
+        return None, None
+    max_ts = pd.to_datetime(max_ts, utc=True, errors="coerce")
+    if pd.isna(max_ts):
+        return None, "could_not_parse_ts"
+    return float((pd.Timestamp.now("UTC") - max_ts).total_seconds() / 60.0), None
+
+def verify_table_op(conn_str: str, table: str, ts_col: str = "", max_lag_minutes: int = 180,
+                    mode: str = "exact", expected_rows: Optional[int] = None,
+                    batch_col: str = "", batch_id: Optional[str] = None) -> str:
+    """Target table checks as a JSON string.
+
+    exact: COUNT(*) and MAX(ts_col) over the table. fast: table size from the catalog
+    (pg_class.reltuples / pg_stat_user_tables), this run's rows by `batch_col = batch_id`
+    when an index leads with batch_col (else the load's reported `expected_rows`, else
+    skipped), and MAX(ts_col) only when an index leads with ts_col, otherwise freshness is
+    skipped (lag_ok null) and the missing index reported. auto: fast once the estimate
+    exceeds VERIFY_EXACT_MAX_ROWS.
+    """
+    from sqlalchemy import text
+    from etl_agent.engines import get_engine
+    if mode not in ("exact", "fast", "auto"):
+        return json.dumps({"error": f"verify mode must be exact|fast|auto; got {mode!r}", "status": False})
+    try:
+        eng = get_engine(conn_str)
+    except Exception as e:
+        return json.dumps({"error": f"engine_error: {e}", "status": False})
+    if eng.dialect.name != "postgresql":
+        if mode == "fast":
+            return json.dumps({"error": "verify mode fast needs a Postgres target", "status": False})
+        mode = "exact"
+
+    rows = 0
+    lag_min = None
+    lag_ok = True
+
+    try:
+        with eng.connect() as c:
+            if mode != "exact":
+                schema, name = _split_table(table)
+                st = c.execute(text(_PG_TABLE_STATS), {"schema": schema, "name": name}).fetchone()
+                if st is None:
+                    return json.dumps({"error": f"verify_error: table not found: {table}", "status": False})
+                oid, reltuples, live, inserted, analyzed, autoanalyzed = st
+                # reltuples is -1 (or 0) until the first ANALYZE; the stats collector fills the gap
+                estimate = max(int(reltuples or 0), int(live or 0))
+                if mode == "auto":
+                    mode = "fast" if estimate > VERIFY_EXACT_MAX_ROWS else "exact"
+            if mode == "fast":
+                out = {"mode": "fast", "rows_estimate": estimate, "n_tup_ins": inserted,
+                       "last_analyze": str(analyzed or autoanalyzed) if (analyzed or autoanalyzed) else None}
+                # counting a batch is a full scan unless an index leads with batch_col
+                batch_idx = []
+                if batch_col and batch_id is not None:
+                    batch_idx = [r[0] for r in c.execute(text(_PG_LEADING_INDEX), {"oid": oid, "col": batch_col})]
+                if batch_idx:
+                    run_rows = c.execute(text(f"SELECT COUNT(*) FROM {_qtable(table)} WHERE {_qident(batch_col)} = :b"),
+                                         {"b": batch_id}).scalar() or 0
+                    out["run_rows_source"] = f"{batch_col}={batch_id}"
+                elif expected_rows is not None:
+                    run_rows = expected_rows
+                    out["run_rows_source"] = "load rowcount" + (f" (no index on {batch_col})" if batch_col else "")
+                else:
+                    run_rows = None
+                    out["run_rows_source"] = f"skipped: no index on {batch_col}" if batch_col else "skipped"
+                out["run_rows"] = run_rows
+                if run_rows is None:
+                    rows_ok = estimate > 0
+                else:
+                    # an upsert that changed nothing expects (and tags) no rows
+                    rows_ok = run_rows == expected_rows if expected_rows is not None else run_rows > 0
+                if ts_col:
+                    idx = [r[0] for r in c.execute(text(_PG_LEADING_INDEX), {"oid": oid, "col": ts_col})]
+                    out["ts_index"] = idx[0] if idx else None
+                    if idx:
+                        max_ts = c.execute(text(f"SELECT MAX({_qident(ts_col)}) FROM {_qtable(table)}")).scalar()
+                        lag_min, err = _lag_minutes(max_ts)
+                        if err:
+                            return json.dumps({**out, "error": f"{err}({ts_col})", "status": False})
+                        lag_ok = lag_min is None or lag_min <= max_lag_minutes
+                    else:
+                        # no full scan: freshness is skipped (lag_ok null), which does not fail the run
+                        lag_ok = None
+                        out["warning"] = f"no index on {ts_col}; freshness skipped (CREATE INDEX ON {table} ({ts_col}))"
+                status = rows_ok and lag_ok is not False
+                return json.dumps({**out, "rows": int(run_rows if run_rows is not None else estimate),
+                                   "lag_minutes": lag_min, "lag_ok": lag_ok, "status": bool(status)})
+
+            # Count rows (will raise if table doesn't exist)
+            rows = c.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar() or 0
+
+            # Freshness check (optional)
+            if ts_col:
+                max_ts = c.execute(text(f"SELECT MAX({ts_col}) FROM {table}")).scalar()
+                lag_min, err = _lag_minutes(max_ts)
+                if err:
+                    return json.dumps({"rows": int(rows), "error": f"{err}({ts_col})", "status": False})
+                if lag_min is not None:
+                    lag_ok = lag_min <= max_lag_minutes
+    except Exception as e:
+        return json.dumps({"rows": int(rows), "error": f"verify_error: {e}", "status": False})
+
+    status = (rows > 0) and lag_ok
+    return json.dumps({"rows": int(rows), "lag_minutes": lag_min, "lag_ok": lag_ok, "status": bool(status)})
+
+# --- write-time manifests: what the writer saw, so verify need not re-read the output
+
+MANIFEST_SUFFIX = ".manifest.json"
+_NESTED_TYPES = ("[", "STRUCT", "MAP", "UNION")
+
+# text timestamps the manifest parses besides ISO: the month-first forms pandas reads by default
+_TEXT_TS_FORMATS = ["%m/%d/%Y", "%m/%d/%Y %H:%M", "%m/%d/%Y %H:%M:%S"]
+
+def column_stats(con, relation: str) -> dict:
+    """{column: {nulls, min, max}} for a DuckDB relation in one aggregate (no min/max for nested
+    types). VARCHAR columns also get ts_max, the latest value that parses as a timestamp, so
+    freshness from the manifest compares times rather than strings."""
+    cols = con.execute(f'DESCRIBE SELECT * FROM "{relation}"').fetchall()
+    exprs, slots = [], []
+    fmts = ", ".join(sql_literal(f) for f in _TEXT_TS_FORMATS)
+    for name, ctype, *_ in cols:
+        exprs.append(f"COUNT(*) - COUNT({_qident(name)})")
+        slots.append((name, "nulls"))
+        if not any(t in str(ctype) for t in _NESTED_TYPES):
+            exprs += [f"MIN({_qident(name)})", f"MAX({_qident(name)})"]
+            slots += [(name, "min"), (name, "max")]
+        if str(ctype) == "VARCHAR":
+            exprs.append(f"MAX(COALESCE(TRY_CAST({_qident(name)} AS TIMESTAMP), TRY_STRPTIME({_qident(name)}, [{fmts}])))")
+            slots.append((name, "ts_max"))
+    out = {name: {"type": str(ctype)} for name, ctype, *_ in cols}
+    if exprs:
+        for (name, key), v in zip(slots, con.execute(f'SELECT {", ".join(exprs)} FROM "{relation}"').fetchone()):
+            out[name][key] = watermark_value(v)
+    return out
+
+def frame_stats(df: pd.DataFrame) -> dict:
+    con = duckdb.connect()
+    con.register("_stats_src", df)
+    return column_stats(con, "_stats_src")
+
+def manifest_path(path: str) -> str:
+    return f"{path}{MANIFEST_SUFFIX}"
+
+def write_manifest(path: str, manifest: dict) -> str:
+    """Write `path`'s sidecar manifest atomically; returns the manifest path."""
+    mpath = manifest_path(path)
+    tmp = f"{mpath}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, default=str)
+    os.replace(tmp, mpath)
+    return mpath
+
+def read_manifest(path: str) -> Optional[dict]:
+    try:
+        with open(manifest_path(path)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def file_sha256(path: str, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class _HashingWriter:
+    """Text sink for DataFrame.to_csv that hashes and counts the bytes on their way to disk."""
+
+    def __init__(self, raw, encoding: str = "utf-8"):
+        self._raw = raw
+        self._encoding = encoding
+        self.sha = hashlib.sha256()
+        self.bytes = 0
+
+    def write(self, text: str) -> int:
+        data = text.encode(self._encoding)
+        self.sha.update(data)
+        self.bytes += len(data)
+        self._raw.write(data)
+        return len(text)
+
+# DuckDB vectors (2,048 rows each) fetched per pandas chunk when a relation is written to CSV
+CSV_CHUNK_VECTORS = 32
+# DataFrame.to_csv formats values (e.g. date-only timestamps) per block of this many cells
+_TO_CSV_CHUNK_CELLS = 100_000
+
+def write_csv_op(handle: Optional[str], path: str, include_header: bool = True, manifest: bool = True,
+                 con=None, relation: Optional[str] = None) -> str:
+    """Write a registry handle, or a DuckDB relation on `con` (pulled in bounded pandas chunks,
+    never whole), to CSV with a <path>.manifest.json of write-time stats."""
     os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    df.to_csv(path, index=False, header=include_header)
+    if relation is not None:
+        res = con.execute(f'SELECT * FROM "{relation}"')
+        block = max(_TO_CSV_CHUNK_CELLS // max(len(res.description), 1), 1)
+        rows, pending = 0, None
+        with open(path, "wb") as raw:
+            out = _HashingWriter(raw)
+            while True:
+                chunk = res.fetch_df_chunk(CSV_CHUNK_VECTORS)
+                pending = chunk if pending is None else pd.concat([pending, chunk], ignore_index=True)
+                # write whole to_csv blocks only, so the bytes match a whole-frame write
+                n = len(pending) if not len(chunk) else len(pending) // block * block
+                if n or (not len(chunk) and rows == 0):
+                    pending.iloc[:n].to_csv(out, index=False, header=include_header and rows == 0, chunksize=block)
+                    rows += n
+                    pending = pending.iloc[n:]
+                if not len(chunk):
+                    break
+        if manifest:
+            write_manifest(path, {
+                "format": "csv", "rows": rows, "bytes": out.bytes, "sha256": out.sha.hexdigest(),
+                "mtime_ns": os.stat(path).st_mtime_ns, "header": bool(include_header),
+                "written_at": pd.Timestamp.now("UTC").isoformat(), "columns": column_stats(con, relation),
+            })
+        return f"wrote {rows:,} rows to {path}"
+    df = registry_get(handle)
+    with open(path, "wb") as raw:
+        out = _HashingWriter(raw)
+        df.to_csv(out, index=False, header=include_header)
+    if manifest:
+        write_manifest(path, {
+            "format": "csv", "rows": int(len(df)), "bytes": out.bytes, "sha256": out.sha.hexdigest(),
+            "mtime_ns": os.stat(path).st_mtime_ns, "header": bool(include_header),
+            "written_at": pd.Timestamp.now("UTC").isoformat(), "columns": frame_stats(df),
+        })
     return f"wrote {len(df):,} rows to {path}"
 
-def dq_check_op(handle: str, min_rows: int = 1, nonnull_cols: Optional[List[str]] = None) -> str:
-    nonnull_cols = nonnull_cols or []
-    df = registry_get(handle)
-    ok = True
+def _dq_rules(types: Dict[str, str], min_rows: int, nonnull_cols, timestamp_col: str,
+              unique_cols, ranges, accepted_values) -> list:
+    """[(rule dict, {alias: SQL aggregate})] for every requested check, given the relation's
+    {column: DuckDB type}; rules on columns it does not have are kept (and skipped) so they
+    still show up in the report."""
+    q = _qident
+    rules = [({"rule": "min_rows", "min": min_rows}, {})]
+    for c in nonnull_cols or []:
+        rules.append(({"rule": "nonnull", "column": c}, {"nulls": f"COUNT(*) - COUNT({q(c)})"}))
+    if timestamp_col:
+        typ, ts = types.get(timestamp_col, ""), q(timestamp_col)
+        rule = {"rule": "freshness", "column": timestamp_col}
+        if typ.startswith(("DATE", "TIMESTAMP")):
+            aggs = {"max_ts": f"MAX({ts})"}
+        elif typ == "VARCHAR":
+            # text is compared as parsed timestamps, never as strings (dd/mm/yyyy maxes lexicographically);
+            # values that do not parse as ISO dates fail the rule instead of being ignored
+            aggs = {"max_ts": f"MAX(TRY_CAST({ts} AS TIMESTAMP))",
+                    "unparsed": f"COUNT({ts}) - COUNT(TRY_CAST({ts} AS TIMESTAMP))"}
+        else:
+            aggs = {}
+            if typ:
+                rule["error"] = f"{typ} is not a DATE/TIMESTAMP column"
+        rules.append((rule, aggs))
+    for key in unique_cols or []:
+        cols = [key] if isinstance(key, str) else list(key)
+        # like a UNIQUE constraint, keys with a NULL part never collide
+        full = " AND ".join(f"{q(c)} IS NOT NULL" for c in cols)
+        key_sql = f"({', '.join(q(c) for c in cols)})" if len(cols) == 1 else f"row({', '.join(q(c) for c in cols)})"
+        rules.append(({"rule": "unique", "columns": cols},
+                      {"duplicates": f"COUNT(*) FILTER (WHERE {full}) - COUNT(DISTINCT CASE WHEN {full} THEN {key_sql} END)"}))
+    for c, bounds in (ranges or {}).items():
+        lo, hi = (bounds.get("min"), bounds.get("max")) if isinstance(bounds, dict) else bounds
+        outside = []
+        if lo is not None:
+            outside.append(f"{q(c)} < {sql_literal(lo)}")
+        if hi is not None:
+            outside.append(f"{q(c)} > {sql_literal(hi)}")
+        outside = " OR ".join(outside)
+        rules.append(({"rule": "range", "column": c, "min": lo, "max": hi},
+                      {"violations": f"COUNT(*) FILTER (WHERE {outside or 'false'})",
+                       "observed_min": f"MIN({q(c)})", "observed_max": f"MAX({q(c)})"}))
+    for c, values in (accepted_values or {}).items():
+        allowed = ", ".join(sql_literal(v) for v in values) or "NULL"
+        rules.append(({"rule": "accepted_values", "column": c, "values": list(values)},
+                      {"violations": f"COUNT(*) FILTER (WHERE {q(c)} IS NOT NULL AND {q(c)} NOT IN ({allowed}))"}))
+    present = set(types)
+    for rule, aggs in rules:
+        missing = [c for c in rule.get("columns", [rule["column"]] if "column" in rule else []) if c not in present]
+        if missing:
+            rule["skipped"] = f"missing column(s): {', '.join(missing)}"
+            aggs.clear()
+    return rules
+
+def dq_check_op(handle: Optional[str] = None, min_rows: int = 1, nonnull_cols: Optional[List[str]] = None,
+                freshness_minutes: Optional[int] = None, timestamp_col: str = "",
+                unique_cols: Optional[list] = None, ranges: Optional[dict] = None,
+                accepted_values: Optional[dict] = None, con=None, relation: Optional[str] = None) -> str:
+    """Every check as one DuckDB aggregate over a registry handle or a relation on `con`
+    (one scan, no pandas copy). JSON: rows, status, first error and per-rule metrics."""
+    if relation is None:
+        con, relation = duckdb.connect(), "_dq_src"
+        con.register(relation, registry_get(handle))
+    types = {r[0]: r[1] for r in con.execute(f'DESCRIBE "{relation}"').fetchall()}
+    rules = _dq_rules(types, min_rows, nonnull_cols, timestamp_col if freshness_minutes else "",
+                      unique_cols, ranges, accepted_values)
+    exprs, slots = ["COUNT(*)"], []
+    for rule, aggs in rules:
+        for alias, expr in aggs.items():
+            slots.append((rule, alias))
+            exprs.append(expr)
+    row = con.execute(f'SELECT {", ".join(exprs)} FROM "{relation}"').fetchone()
+    n = int(row[0])
+    for (rule, alias), v in zip(slots, row[1:]):
+        rule[alias] = watermark_value(v)
+
     err = None
-    if len(df) < min_rows:
-        ok = False
-        err = f"min_rows check failed: {len(df)} < {min_rows}"
-    for c in nonnull_cols:
-        if c in df.columns and df[c].isna().any():
-            ok = False
-            err = f"nonnull check failed: {c}"
-            break
-    return json.dumps({"rows": int(len(df)), "status": bool(ok), "error": err})
+    for rule, _ in rules:
+        kind = rule["rule"]
+        if "skipped" in rule:
+            ok = True
+        elif kind == "min_rows":
+            rule["rows"] = n
+            ok = n >= min_rows
+        elif kind == "nonnull":
+            ok = rule["nulls"] == 0
+        elif kind == "unique":
+            ok = rule["duplicates"] == 0
+        elif kind == "freshness" and (rule.get("error") or rule.get("unparsed")):
+            if not rule.get("error"):
+                rule["error"] = f"{rule['unparsed']} values are not ISO dates/timestamps; cast the column"
+            ok, rule["max_lag_minutes"] = False, freshness_minutes
+        elif kind == "freshness":
+            ts = pd.to_datetime(rule["max_ts"], utc=True, errors="coerce") if rule["max_ts"] is not None else None
+            if ts is None or pd.isna(ts):
+                ok, rule["lag_minutes"] = n == 0, None
+            else:
+                rule["lag_minutes"] = round((pd.Timestamp.now("UTC") - ts).total_seconds() / 60.0, 2)
+                ok = rule["lag_minutes"] <= freshness_minutes
+            rule["max_lag_minutes"] = freshness_minutes
+        else:
+            ok = rule["violations"] == 0
+        rule["ok"] = bool(ok)
+        if not ok and err is None:
+            subject = rule.get("column") or ",".join(rule.get("columns", []))
+            err = f"{kind} check failed" + (f": {subject}" if subject else f": {n} < {min_rows}")
+    return json.dumps({"rows": n, "status": err is None, "error": err, "rules": [r for r, _ in rules]})
 
 def verify_csv_op(
     path: str,
@@ -54,7 +1109,10 @@ def verify_csv_op(
     max_lag_minutes: int = 180,
     delimiter: str = ",",
     encoding: str = "",
+    deep: bool = False,
 ) -> str:
+    """Row count, non-null and freshness checks for a written CSV. With a writer manifest
+    alongside, they are answered from it in O(1); deep=True re-reads the file (and its checksum)."""
     import pandas as pd, os, json
     nonnull_cols = nonnull_cols or []
     if not os.path.exists(path):
@@ -62,6 +1120,18 @@ def verify_csv_op(
     if os.path.getsize(path) == 0:
         return json.dumps({"status": False, "error": "empty_file"})
 
+    man = read_manifest(path)
+    if man is not None:
+        st = os.stat(path)
+        changed = man.get("bytes") != st.st_size
+        if not changed and not deep and man.get("mtime_ns") not in (None, st.st_mtime_ns):
+            # same size but touched since the write: only the checksum can tell a rewrite from a copy
+            changed = file_sha256(path) != man.get("sha256")
+        if changed:
+            return json.dumps({"status": False, "error": "manifest_mismatch: file changed since it was written"})
+    if man is not None and not deep:
+        return _verify_against_manifest(path, man, min_rows, nonnull_cols, timestamp_col, max_lag_minutes)
+
     # load only what we need, in chunks for safety
     usecols = None
     if nonnull_cols and timestamp_col:
@@ -92,7 +1162,7 @@ def verify_csv_op(
                 mx = pd.to_datetime(ch[timestamp_col], errors="coerce")
                 if not mx.empty and mx.notna().any():
                     m = mx.max()
-                    now = pd.Timestamp.utcnow()
+                    now = pd.Timestamp.now("UTC")
                     if m.tzinfo is None:
                         m = m.tz_localize("UTC")
                     lag_min = float((now - m).total_seconds()/60.0)
@@ -102,8 +1172,111 @@ def verify_csv_op(
         with open(path, "r", encoding=(encoding or "utf-8"), errors="ignore") as f:
             rows = sum(1 for _ in f) - 1
         mtime = os.path.getmtime(path)
-        lag_min = (pd.Timestamp.utcnow() - pd.to_datetime(mtime, unit="s", utc=True)).total_seconds()/60.0
+        lag_min = (pd.Timestamp.now("UTC") - pd.to_datetime(mtime, unit="s", utc=True)).total_seconds()/60.0
         fresh_ok = lag_min <= max_lag_minutes
 
     status = (rows >= min_rows) and nonnull_ok and fresh_ok
-    return json.dumps({"rows": int(rows), "nonnull_ok": nonnull_ok, "fresh_ok": fresh_ok, "lag_minutes": lag_min, "status": status})
+    out = {"rows": int(rows), "nonnull_ok": nonnull_ok, "fresh_ok": fresh_ok, "lag_minutes": lag_min, "status": status}
+    if man is not None:
+        # deep check: the bytes and row count on disk must still be what the writer produced
+        out["manifest_ok"] = file_sha256(path) == man.get("sha256") and (not need_df or rows == man.get("rows"))
+        out["status"] = bool(status and out["manifest_ok"])
+    out["checked"] = "read"
+    return json.dumps(out)
+
+# --- Parquet sink: written by DuckDB, verified from the footers alone
+
+PARQUET_COMPRESSION = "zstd"
+PARQUET_ROW_GROUP_SIZE = 122_880  # DuckDB's default row group
+
+def write_parquet_op(path: str, con, relation: str,
+                     compression: str = PARQUET_COMPRESSION, row_group_size: int = PARQUET_ROW_GROUP_SIZE,
+                     partition_by: Optional[List[str]] = None) -> dict:
+    """COPY a DuckDB relation on `con` to Parquet, optionally Hive-partitioned into a
+    directory. DuckDB streams it from its own (spillable) storage, so no pandas copy is
+    made. Written to a temp sibling and renamed into place, so readers never see a
+    half-written dataset. Returns {rows, files, bytes, seconds, ...}."""
+    import shutil
+    t0 = time.perf_counter()
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp = os.path.join(parent, f".{os.path.basename(path)}.tmp-{os.getpid()}")
+    opts = [f"FORMAT parquet", f"COMPRESSION {compression}", f"ROW_GROUP_SIZE {int(row_group_size)}"]
+    if partition_by:
+        opts.append(f"PARTITION_BY ({', '.join(_qident(c) for c in partition_by)})")
+    try:
+        # COPY reports the number of rows it wrote
+        rows = int(con.execute(f'COPY (SELECT * FROM "{relation}") TO {sql_literal(tmp)} ({", ".join(opts)})').fetchone()[0])
+        if os.path.exists(path):
+            old = os.path.join(parent, f".{os.path.basename(path)}.old-{os.getpid()}")
+            os.replace(path, old)
+            os.replace(tmp, path)
+            shutil.rmtree(old) if os.path.isdir(old) else os.remove(old)
+        else:
+            os.replace(tmp, path)
+    except Exception:
+        if os.path.isdir(tmp):
+            shutil.rmtree(tmp, ignore_errors=True)
+        elif os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    files = _parquet_files(path)
+    secs = time.perf_counter() - t0
+    return {"path": path, "rows": rows, "files": len(files), "bytes": sum(os.path.getsize(f) for f in files),
+            "seconds": round(secs, 3), "compression": compression, "partition_by": list(partition_by or [])}
+
+def _parquet_files(path: str) -> List[str]:
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "**", "*.parquet"), recursive=True))
+    return [path] if os.path.exists(path) else []
+
+def verify_parquet_op(path: str, min_rows: int = 1, nonnull_cols: Optional[List[str]] = None,
+                      timestamp_col: str = "", max_lag_minutes: int = 180) -> str:
+    """Row count, null counts and MAX(timestamp_col) from the Parquet footers only (no data pages)."""
+    nonnull_cols = nonnull_cols or []
+    files = _parquet_files(path)
+    if not files:
+        return json.dumps({"status": False, "error": f"file_not_found: {path}"})
+    con = duckdb.connect()
+    src = f"parquet_metadata([{', '.join(sql_literal(f) for f in files)}])"
+    rows = con.execute(f"SELECT COALESCE(SUM(n), 0) FROM (SELECT DISTINCT file_name, row_group_id, row_group_num_rows AS n FROM {src})").fetchone()[0]
+    wanted = list(dict.fromkeys(nonnull_cols + ([timestamp_col] if timestamp_col else [])))
+    stats = {}
+    if wanted:
+        marks = ", ".join(sql_literal(c) for c in wanted)
+        for col, nulls, mx in con.execute(f"SELECT path_in_schema, stats_null_count, stats_max_value FROM {src} WHERE path_in_schema IN ({marks})").fetchall():
+            st = stats.setdefault(col, {"nulls": 0, "max": []})
+            st["nulls"] = None if nulls is None or st["nulls"] is None else st["nulls"] + nulls
+            if mx is not None:
+                st["max"].append(mx)
+    # partition columns live in directory names, not in the files: they are never null
+    nonnull_ok = all(stats.get(c, {"nulls": 0})["nulls"] == 0 for c in nonnull_cols)
+    lag_min = None
+    if timestamp_col:
+        ts = pd.to_datetime(pd.Series(stats.get(timestamp_col, {}).get("max", []), dtype=object), utc=True, errors="coerce")
+        if ts.notna().any():
+            lag_min = float((pd.Timestamp.now("UTC") - ts.max()).total_seconds() / 60.0)
+    fresh_ok = lag_min is None or lag_min <= max_lag_minutes
+    status = rows >= min_rows and nonnull_ok and fresh_ok
+    return json.dumps({"rows": int(rows), "files": len(files), "nonnull_ok": nonnull_ok, "fresh_ok": fresh_ok,
+                       "lag_minutes": lag_min, "status": bool(status), "checked": "footers"})
+
+def _verify_against_manifest(path: str, man: dict, min_rows: int, nonnull_cols: List[str],
+                             timestamp_col: str, max_lag_minutes: int) -> str:
+    cols = man.get("columns", {})
+    rows = int(man["rows"])
+    nonnull_ok = all(cols.get(c, {}).get("nulls", 0) == 0 for c in nonnull_cols)
+    lag_min = None
+    if timestamp_col:
+        col = cols.get(timestamp_col, {})
+        # text columns: their string MAX is not the latest time
+        m = col["ts_max"] if "ts_max" in col else col.get("max")
+        m = pd.to_datetime(m, utc=True, errors="coerce") if m is not None else None
+        if m is not None and not pd.isna(m):
+            lag_min = float((pd.Timestamp.now("UTC") - m).total_seconds() / 60.0)
+    elif not nonnull_cols:
+        lag_min = (pd.Timestamp.now("UTC") - pd.to_datetime(os.path.getmtime(path), unit="s", utc=True)).total_seconds() / 60.0
+    fresh_ok = lag_min is None or lag_min <= max_lag_minutes
+    status = (rows >= min_rows) and nonnull_ok and fresh_ok
+    return json.dumps({"rows": rows, "nonnull_ok": nonnull_ok, "fresh_ok": fresh_ok, "lag_minutes": lag_min,
+                       "status": bool(status), "checked": "manifest"})
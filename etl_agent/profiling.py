@@ -0,0 +1,182 @@
+"""Span-style instrumentation for one run.
+
+run_prompt activates a Profiler per run; the executor, its stages/steps and the
+agent tools open spans with `span(name)`, which is a no-op when no profiler is
+active. A span records wall time, process CPU time (DuckDB's worker threads
+included), how much the process' peak RSS grew while it was open, and
+rows in/out and bytes read/written where the stage knows them. Spans are
+persisted to the memory DB (etl_agent_run_stages), printed with `--profile`
+or exported as Chrome trace JSON (chrome://tracing, Perfetto).
+"""
+import os, sys, json, time, threading, itertools, contextvars, functools
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:  # no getrusage (Windows): peak RSS is reported as 0
+    resource = None
+
+METRICS = ("rows_in", "rows_out", "bytes_read", "bytes_written")
+
+_profiler = contextvars.ContextVar("etl_agent_profiler", default=None)
+_current = contextvars.ContextVar("etl_agent_span", default=None)
+
+def _peak_rss_kb() -> int:
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # bytes on macOS, KiB elsewhere
+
+
+class Span:
+    def __init__(self, seq: int, name: str, parent, start: float):
+        self.seq, self.name = seq, name
+        self.parent = parent.seq if parent else None
+        self.depth = parent.depth + 1 if parent else 0
+        self.thread = threading.current_thread().name
+        self.tid = threading.get_ident()
+        self.start = start
+        self.wall_ms = self.cpu_ms = None
+        self.rss_delta_kb = 0
+        self.attrs = {}
+        self._cpu0, self._rss0 = time.process_time(), _peak_rss_kb()
+
+    def set(self, **attrs) -> "Span":
+        """Attach metrics (rows_in, rows_out, bytes_read, bytes_written) or other attributes."""
+        self.attrs.update({k: v for k, v in attrs.items() if v is not None})
+        return self
+
+    def _close(self, end: float) -> None:
+        self.wall_ms = round((end - self.start) * 1000, 3)
+        self.cpu_ms = round((time.process_time() - self._cpu0) * 1000, 3)
+        self.rss_delta_kb = max(0, _peak_rss_kb() - self._rss0)
+
+    def to_dict(self, t0: float = 0.0) -> dict:
+        out = {"seq": self.seq, "name": self.name, "parent": self.parent, "depth": self.depth,
+               "thread": self.thread, "start_ms": round((self.start - t0) * 1000, 3),
+               "wall_ms": self.wall_ms, "cpu_ms": self.cpu_ms, "rss_delta_kb": self.rss_delta_kb}
+        out.update({m: self.attrs.get(m) for m in METRICS})
+        out["attrs"] = {k: v for k, v in self.attrs.items() if k not in METRICS}
+        return out
+
+
+class _NullSpan:
+    def set(self, **attrs):
+        return self
+
+NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.started_at = time.time()
+        self._spans = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self):
+        """Make this the profiler of the current context (and of threads started via copy_context)."""
+        token = _profiler.set(self)
+        try:
+            yield self
+        finally:
+            _profiler.reset(token)
+
+    def _open(self, name: str, parent) -> Span:
+        return Span(next(self._seq), name, parent, time.perf_counter())
+
+    def _close(self, sp: Span) -> None:
+        sp._close(time.perf_counter())
+        with self._lock:
+            self._spans.append(sp)
+
+    def spans(self) -> list:
+        """Finished spans as dicts, in start order (start_ms relative to the profiler's start)."""
+        with self._lock:
+            done = sorted(self._spans, key=lambda s: s.seq)
+        return [s.to_dict(self.t0) for s in done]
+
+    def report(self) -> str:
+        """Indented per-stage breakdown (the `--profile` output)."""
+        rows = self.spans()
+        total = sum(r["wall_ms"] for r in rows if r["parent"] is None) or 1.0
+        mb = lambda b: f"{b / 1048576:,.1f}" if b is not None else "-"
+        num = lambda n: f"{n:,}" if n is not None else "-"
+        lines = [f"{'stage':<36}{'wall ms':>11}{'cpu ms':>11}{'+rss MB':>9}{'rows in':>12}{'rows out':>12}"
+                 f"{'read MB':>10}{'wrote MB':>10}{'%':>7}"]
+        for r in _tree_order(rows):
+            name = ("  " * r["depth"] + r["name"])[:35]
+            lines.append(f"{name:<36}{r['wall_ms']:>11,.1f}{r['cpu_ms']:>11,.1f}{r['rss_delta_kb'] / 1024:>9,.1f}"
+                         f"{num(r['rows_in']):>12}{num(r['rows_out']):>12}{mb(r['bytes_read']):>10}"
+                         f"{mb(r['bytes_written']):>10}{100 * r['wall_ms'] / total:>7.1f}")
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> dict:
+        """Chrome trace-event JSON: one complete ('X') event per span, one track per thread."""
+        pid = os.getpid()
+        with self._lock:
+            done = sorted(self._spans, key=lambda s: s.seq)
+        events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                  for tid, name in {s.tid: s.thread for s in done}.items()]
+        for s in done:
+            args = {"cpu_ms": s.cpu_ms, "rss_delta_kb": s.rss_delta_kb, **s.attrs}
+            events.append({"name": s.name, "cat": s.name.split(":", 1)[0], "ph": "X", "pid": pid, "tid": s.tid,
+                           "ts": round((s.start - self.t0) * 1e6, 1), "dur": round(s.wall_ms * 1000, 1),
+                           "args": {k: v for k, v in args.items() if v is not None}})
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"started_at": self.started_at}}
+
+    def write_chrome_trace(self, path: str) -> str:
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f, default=str)
+        return path
+
+
+def _tree_order(rows: list) -> list:
+    # depth-first so children print under their parent (concurrent spans interleave by seq)
+    children = {}
+    for r in rows:
+        children.setdefault(r["parent"], []).append(r)
+    out, stack = [], list(reversed(children.get(None, [])))
+    while stack:
+        r = stack.pop()
+        out.append(r)
+        stack.extend(reversed(children.get(r["seq"], [])))
+    return out
+
+
+def active_profiler():
+    return _profiler.get()
+
+def current_span():
+    """The innermost open span of this context, or a no-op span."""
+    return _current.get() or NULL_SPAN
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block as a child of the current span; yields the span so metrics can be set on it."""
+    prof = _profiler.get()
+    if prof is None:
+        yield NULL_SPAN
+        return
+    sp = prof._open(name, _current.get()).set(**attrs)
+    token = _current.set(sp)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current.reset(token)
+        prof._close(sp)
+
+def traced(fn):
+    """Decorator: run `fn` inside a span named '<module>:<function>'."""
+    name = f"{fn.__module__.rsplit('.', 1)[-1]}:{fn.__name__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return fn(*args, **kwargs)
+    return wrapper
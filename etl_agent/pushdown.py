@@ -0,0 +1,222 @@
+"""Projection and predicate pushdown from transform SQL into db source queries.
+
+The transform SQL is parsed with DuckDB's own parser (json_serialize_sql) and
+every place it reads a db input is located. A WHERE conjunct is pushed into the
+upstream query only when the same conjunct filters *every* read of the input
+and it compares a column of that input with literals in a NULL-rejecting way
+(=, <>, <, <=, >, >=, BETWEEN, IN, IS NOT NULL). Strings are pushed for = and IN
+only, since range order depends on the upstream collation. The transform SQL
+keeps all its filters, so the upstream only has to return a superset of the
+rows DuckDB keeps; anything it cannot prove is left where it was.
+
+Columns are pruned to the identifiers the SQL names (sqlscan.column_refs; star
+projections keep everything), matched against the upstream columns from a
+zero-row probe of the query.
+
+inputs.<name>.pushdown (or source.db.pushdown): false turns it off.
+"""
+import json, datetime, decimal, threading
+from typing import Dict, List, Optional, Set
+import duckdb
+
+_COMPARE = {"COMPARE_EQUAL": "=", "COMPARE_NOTEQUAL": "<>", "COMPARE_LESSTHAN": "<",
+            "COMPARE_LESSTHANOREQUALTO": "<=", "COMPARE_GREATERTHAN": ">", "COMPARE_GREATERTHANOREQUALTO": ">="}
+_FLIP = {"=": "=", "<>": "<>", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+_NUMBERS = {"TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT", "USMALLINT", "UINTEGER",
+            "UBIGINT", "FLOAT", "DOUBLE", "DECIMAL"}
+# operators safe to push per literal kind
+_OPS_FOR = {"number": {"=", "<>", "<", "<=", ">", ">=", "in", "between"},
+            "date": {"=", "<>", "<", "<=", ">", ">=", "in", "between"},
+            "timestamp": {"=", "<>", "<", "<=", ">", ">=", "in", "between"},
+            "string": {"=", "in"}, "bool": {"="}}
+
+_columns_memo: Dict[tuple, List[str]] = {}
+_memo_lock = threading.Lock()
+
+
+def _parse(sql: str) -> Optional[list]:
+    # DuckDB's parser as JSON; None for anything it will not serialize (DDL, syntax errors)
+    try:
+        out = json.loads(duckdb.connect().execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0])
+    except duckdb.Error:
+        return None
+    return None if out.get("error") else out["statements"]
+
+
+def _literal(node: dict):
+    # (python value, kind) for a literal, else None
+    if node.get("class") == "CONSTANT":
+        v = node["value"]
+        tid = v["type"]["id"]
+        if v["is_null"]:
+            return None
+        if tid == "DECIMAL":
+            return decimal.Decimal(v["value"]).scaleb(-v["type"]["type_info"]["scale"]), "number"
+        if tid in _NUMBERS:
+            return v["value"], "number"
+        if tid == "VARCHAR":
+            return v["value"], "string"
+        return None
+    if node.get("class") == "CAST" and node["child"].get("class") == "CONSTANT":
+        inner = _literal(node["child"])
+        if not inner or inner[1] != "string":
+            return None
+        text, target = inner[0], node["cast_type"]["id"]
+        try:
+            if target == "DATE":
+                return datetime.date.fromisoformat(text), "date"
+            if target == "TIMESTAMP":
+                return datetime.datetime.fromisoformat(text), "timestamp"
+        except ValueError:
+            return None
+        if target == "BOOLEAN" and text.lower() in ("t", "true", "f", "false"):
+            return text.lower() in ("t", "true"), "bool"
+    return None
+
+
+def _column(node: dict, site: dict) -> Optional[str]:
+    # lower-cased column name when `node` is a column of this read site
+    if node.get("class") != "COLUMN_REF":
+        return None
+    names = node["column_names"]
+    if len(names) == 1 and site["single"]:
+        return names[0].lower()
+    if len(names) == 2 and names[0].lower() == site["alias"]:
+        return names[1].lower()
+    return None
+
+
+def _predicate(node: dict, site: dict) -> Optional[tuple]:
+    # canonical (column, op, values) for a pushable conjunct, else None
+    cls, typ = node.get("class"), node.get("type")
+    if cls == "COMPARISON" and typ in _COMPARE:
+        op = _COMPARE[typ]
+        col, lit = _column(node["left"], site), _literal(node["right"])
+        if col is None or lit is None:
+            col, lit, op = _column(node["right"], site), _literal(node["left"]), _FLIP[op]
+        if col is None or lit is None or op not in _OPS_FOR[lit[1]]:
+            return None
+        return col, op, (lit[0],)
+    if cls == "OPERATOR" and typ == "COMPARE_IN":
+        col = _column(node["children"][0], site)
+        lits = [_literal(c) for c in node["children"][1:]]
+        if col is None or not lits or None in lits or len({k for _, k in lits}) != 1 \
+                or "in" not in _OPS_FOR[lits[0][1]]:
+            return None
+        return col, "in", tuple(v for v, _ in lits)
+    if cls == "BETWEEN":
+        col, lo, hi = _column(node["input"], site), _literal(node["lower"]), _literal(node["upper"])
+        if col is None or lo is None or hi is None or lo[1] != hi[1] or "between" not in _OPS_FOR[lo[1]]:
+            return None
+        return col, "between", (lo[0], hi[0])
+    if cls == "OPERATOR" and typ == "OPERATOR_IS_NOT_NULL":
+        col = _column(node["children"][0], site)
+        return (col, "is not null", ()) if col else None
+    return None
+
+
+def _conjuncts(node: Optional[dict]) -> list:
+    if not node:
+        return []
+    if node.get("class") == "CONJUNCTION" and node.get("type") == "CONJUNCTION_AND":
+        return [c for ch in node["children"] for c in _conjuncts(ch)]
+    return [node]
+
+
+def _base_tables(ref: Optional[dict]) -> list:
+    # tables joined directly in one FROM clause (subqueries are visited on their own)
+    if not ref:
+        return []
+    if ref.get("type") == "BASE_TABLE":
+        return [ref]
+    if ref.get("type") == "JOIN":
+        return _base_tables(ref.get("left")) + _base_tables(ref.get("right"))
+    return []
+
+
+def _walk(node, table: str, acc: dict) -> None:
+    if isinstance(node, list):
+        for n in node:
+            _walk(n, table, acc)
+        return
+    if not isinstance(node, dict):
+        return
+    if node.get("type") == "BASE_TABLE" and node.get("table_name", "").lower() == table:
+        acc["reads"] += 1
+    if node.get("type") == "SELECT_NODE":
+        tables = _base_tables(node.get("from_table"))
+        for t in tables:
+            if t["table_name"].lower() != table or t.get("schema_name") or t.get("sample") or t.get("at_clause"):
+                continue
+            site = {"alias": (t.get("alias") or t["table_name"]).lower(), "single": len(tables) == 1}
+            preds = {p for p in (_predicate(c, site) for c in _conjuncts(node.get("where_clause"))) if p}
+            acc["sites"].append(preds)
+    for m in (node.get("cte_map") or {}).get("map", []) if node.get("type") == "SELECT_NODE" else []:
+        if m["key"].lower() == table:
+            acc["shadowed"] = True
+    for v in node.values():
+        if isinstance(v, (dict, list)):
+            _walk(v, table, acc)
+
+
+def predicates(sqls: List[str], table: str) -> List[tuple]:
+    """Conjuncts every read of `table` in `sqls` filters on: [(column, op, values)], column lower-cased."""
+    acc = {"reads": 0, "sites": [], "shadowed": False}
+    table = table.lower()
+    for sql in sqls:
+        stmts = _parse(sql)
+        if stmts is None:
+            return []
+        _walk(stmts, table, acc)
+    if acc["shadowed"] or not acc["sites"] or acc["reads"] != len(acc["sites"]):
+        return []
+    common = set.intersection(*acc["sites"])
+    return sorted(common, key=lambda p: (p[0], p[1], repr(p[2])))
+
+
+def upstream_columns(conn_str: str, query: str) -> List[str]:
+    """Column names `query` returns, from a zero-row probe (memoized per process)."""
+    from sqlalchemy import text
+    from etl_agent.engines import get_engine
+    from etl_agent.ops import strip_sql
+    key = (conn_str, query)
+    if key not in _columns_memo:
+        with get_engine(conn_str).connect() as c:
+            cols = list(c.execute(text(f"SELECT * FROM ({strip_sql(query)}) AS _probe WHERE 1=0")).keys())
+        with _memo_lock:
+            _columns_memo[key] = cols
+    return _columns_memo[key]
+
+
+def rewrite(conn_str: str, query: str, refs: Optional[Set[str]], preds: List[tuple], always=()) -> Optional[dict]:
+    """{query, params, columns, predicates} selecting only the referenced columns and rows, or None
+    when nothing can be pushed."""
+    from etl_agent.engines import get_engine
+    from etl_agent.ops import strip_sql
+    from etl_agent.schemacache import keep_columns
+    cols = upstream_columns(conn_str, query)
+    by_lower = {c.lower(): c for c in cols}
+    keep = keep_columns(cols, refs, always)
+    preds = [p for p in preds if p[0] in by_lower]  # a SELECT alias, not an upstream column
+    if len(keep) == len(cols) and not preds:
+        return None
+    quote = get_engine(conn_str).dialect.identifier_preparer.quote
+    params, terms, shown = {}, [], []
+    for col, op, values in preds:
+        names = []
+        for v in values:
+            names.append(f":_pd{len(params)}")
+            params[f"_pd{len(params)}"] = v
+        q = quote(by_lower[col])
+        if op == "is not null":
+            terms.append(f"{q} IS NOT NULL")
+        elif op == "in":
+            terms.append(f"{q} IN ({', '.join(names)})")
+        elif op == "between":
+            terms.append(f"{q} BETWEEN {names[0]} AND {names[1]}")
+        else:
+            terms.append(f"{q} {op} {names[0]}")
+        shown.append(f"{by_lower[col]} {op} {', '.join(str(v) for v in values)}".strip())
+    select = "*" if len(keep) == len(cols) else ", ".join(quote(c) for c in keep)
+    sql = f"SELECT {select} FROM ({strip_sql(query)}) AS _src" + (f" WHERE {' AND '.join(terms)}" if terms else "")
+    return {"query": sql, "params": params, "columns": None if select == "*" else keep, "predicates": shown}
@@ -1,27 +1,120 @@
 import os
-from agents import Runner, SQLiteSession
-from etl_agent.agents import planner         # (and greeter if you use greet())
-from etl_agent.templates import EXECUTOR_SNIPPET
+from etl_agent.profiling import Profiler, span
+# The agents SDK (and OpenAI), the tool schemas and the memory DB are imported only
+# when a prompt actually needs planning; YAML plans go straight to the executor.
+
+PLAN_CACHE_TTL = int(os.getenv("ETL_AGENT_PLAN_CACHE_TTL", 24 * 3600))
+_REQUIRED_PLAN_KEYS = ("source", "load")
+# every run is recorded in etl_agent_runs / etl_agent_run_stages unless this is "0"
+RUN_HISTORY = os.getenv("ETL_AGENT_RUN_HISTORY", "1") != "0"
+_PLAN_KEYS = ("limits:", "source:", "transform:", "load:", "checks:", "verify:", "alerts:", "udfs:")
+
+def executor_namespace() -> dict:
+    """The executor module's namespace: imported once per process and reused by every run
+    (each run_from_plan still gets its own registry scope and DuckDB connection)."""
+    from etl_agent import executor
+    return vars(executor)
 
 def _expand_env(text: str) -> str:
     return os.path.expandvars(text or "")
 
 def greet() -> str:
+    from agents import Runner, SQLiteSession
+    from etl_agent.agents import planner
     sess = SQLiteSession("etl_agent_greeting")
     res = Runner.run_sync(planner, "hello", session=sess)
     return res.final_output
 
-def run_prompt(prompt: str):
-    prompt = os.path.expandvars(prompt or "")
-    ns = {}; exec(EXECUTOR_SNIPPET, ns)
+def _valid_plan(ns: dict, plan_yaml: str) -> bool:
+    try:
+        doc = ns["_to_yaml_map"](plan_yaml)
+    except Exception:
+        return False
+    return all(k in doc for k in _REQUIRED_PLAN_KEYS)
+
+def plan_prompt(raw: str, prompt: str, ns: dict, use_cache: bool = True, refresh: bool = False):
+    """Return (plan_yaml, cache_key, hit). Repeat prompts are served from the memory DB."""
+    from etl_agent import memory
+    use_cache = use_cache and os.getenv("ETL_AGENT_PLAN_CACHE", "1") != "0"
+    key = memory.plan_cache_key(raw, prompt)
+    if use_cache and not refresh:
+        try:
+            memory.init()
+            cached = memory.get_cached_plan(key, ttl_seconds=PLAN_CACHE_TTL)
+        except Exception:
+            cached = None  # memory DB unavailable: plan with the LLM as before
+        if cached and _valid_plan(ns, cached):
+            return cached, key, True
+    # cache miss: only now pay for the agents SDK and the planner
+    from agents import Runner, SQLiteSession
+    from etl_agent.agents import planner
+    sess = SQLiteSession("etl_agent_run")
+    plan_yaml = Runner.run_sync(planner, prompt, session=sess).final_output
+    if use_cache and _valid_plan(ns, plan_yaml):
+        try:
+            memory.put_cached_plan(key, raw, plan_yaml)
+        except Exception:
+            pass
+    return plan_yaml, key, False
+
+def _start_run(raw: str, plan_yaml: str):
+    if not RUN_HISTORY:
+        return None
+    try:
+        from etl_agent import memory
+        memory.init()
+        return memory.start_run(raw, plan_yaml)
+    except Exception:
+        return None  # memory DB unavailable: the run itself must not fail
 
-    # Offline if env set OR prompt already looks like YAML
-    first = prompt.lstrip().lower()
-    if os.getenv("ETL_AGENT_OFFLINE") == "1" or first.startswith(("limits:", "source:", "transform:", "load:", "checks:", "verify:", "alerts:")):
-        plan_yaml = prompt
-    else:
-        sess = SQLiteSession("etl_agent_run")
-        plan_yaml = Runner.run_sync(planner, prompt, session=sess).final_output
+def _finish_run(run_id, prof: Profiler, result=None, error: Exception = None):
+    if not run_id:
+        return
+    res = result if isinstance(result, dict) else {}
+    load = [sp for sp in prof.spans() if sp["name"] == "load"]
+    try:
+        from etl_agent import memory
+        memory.finish_run(run_id, "error" if error else res.get("status", "unknown"),
+                          rows_written=(load[0]["rows_out"] or 0) if load else 0,
+                          dq_json=res.get("dq"), verify_json=res.get("verify"),
+                          error=f"{type(error).__name__}: {error}" if error else None)
+        memory.record_stages(run_id, prof.spans())
+    except Exception:
+        pass
 
-    return ns["run_from_plan"](plan_yaml)
+def run_prompt(prompt: str, use_cache: bool = True, refresh_plan: bool = False, profiler: Profiler = None):
+    """Plan (unless the prompt is a plan) and run; every stage is timed on `profiler` and the
+    run plus its stages are recorded in the memory DB."""
+    raw = prompt or ""
+    prompt = os.path.expandvars(raw)
+    prof = profiler or Profiler()
 
+    with prof.activate():
+        with span("startup"):
+            ns = executor_namespace()  # the imports: only a cold process pays them
+        # Offline if env set OR prompt already looks like YAML
+        first = prompt.lstrip().lower()
+        if os.getenv("ETL_AGENT_OFFLINE") == "1" or first.startswith(_PLAN_KEYS):
+            plan_yaml, key, hit = prompt, None, None
+        else:
+            with span("plan") as sp:
+                plan_yaml, key, hit = plan_prompt(raw, prompt, ns, use_cache=use_cache, refresh=refresh_plan)
+                sp.set(cache="hit" if hit else "miss")
+        run_id = _start_run(raw, plan_yaml)
+        try:
+            with span("run"):
+                result = ns["run_from_plan"](plan_yaml)
+        except Exception as e:
+            _finish_run(run_id, prof, error=e)
+            # a cached plan that no longer executes must not be replayed every hour
+            if hit:
+                from etl_agent import memory
+                memory.invalidate_plan_cache(key)
+            raise
+    _finish_run(run_id, prof, result)
+    if isinstance(result, dict):
+        if hit is not None:
+            result["plan_cache"] = "hit" if hit else "miss"
+        if run_id:
+            result["run_id"] = run_id
+    return result
@@ -0,0 +1,171 @@
+"""Cached CSV source schemas and typed, column-pruned reads.
+
+A CSV source is fingerprinted by its header line. The first read infers types
+with pandas (exactly as an untyped read would) and stores a compact schema in
+the memory DB (etl_agent_source_schema). Later reads skip inference: pyarrow's
+multithreaded CSV reader gets explicit column types, low-cardinality strings
+are dictionary-encoded, integers are narrowed to the smallest type holding
+them, and only the columns the transform SQL can reference are parsed. A file
+that no longer fits its cached schema is re-inferred and the entry refreshed.
+
+Narrowed integers are widened back to BIGINT at the SQL surface (see
+widen_sql), so plan arithmetic overflows exactly where it did before.
+
+limits.typed_reads: false turns this off for a plan; ETL_AGENT_SCHEMA_CACHE=0
+keeps schemas in the process only.
+"""
+import os, json, hashlib, threading
+from typing import Dict, List, Optional, Set, Tuple
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pcsv
+import pyarrow.compute as pc
+from etl_agent.ops import CSV_NULLS
+
+PERSIST = os.getenv("ETL_AGENT_SCHEMA_CACHE", "1") != "0"
+# a string column is dictionary-encoded when it has at most this many distinct values per row
+DICT_MAX_RATIO = 0.5
+_NARROWED = b"etl_agent.narrowed"
+_ARROW_TYPES = {"int64": pa.int64(), "float64": pa.float64(), "bool": pa.bool_(), "string": pa.string(),
+                "dictionary": pa.dictionary(pa.int32(), pa.string())}
+_INT_SIZES = [(pa.int8(), 2**7), (pa.int16(), 2**15), (pa.int32(), 2**31)]
+
+def header_key(path: str) -> str:
+    """Schema fingerprint: hash of the header line (files sharing a header share a schema)."""
+    with open(path, "rb") as f:
+        header = f.readline().rstrip(b"\r\n")
+    return hashlib.sha256(header).hexdigest()[:16]
+
+def infer_schema(df: pd.DataFrame) -> dict:
+    """Compact type per column of a pandas-inferred frame: int64|float64|bool|string|dictionary."""
+    types = {}
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_bool_dtype(s) or pd.api.types.infer_dtype(s, skipna=True) == "boolean":
+            types[col] = "bool"
+        elif pd.api.types.is_integer_dtype(s):
+            types[col] = "int64"
+        elif pd.api.types.is_float_dtype(s):
+            types[col] = "float64"
+        else:
+            distinct = s.nunique(dropna=True)
+            types[col] = "dictionary" if len(s) and distinct <= DICT_MAX_RATIO * len(s) else "string"
+    return {"columns": [str(c) for c in df.columns], "types": types}
+
+def _arrow_schema(schema: dict, columns: List[str]) -> pa.Schema:
+    return pa.schema([(c, _ARROW_TYPES[schema["types"][c]]) for c in columns])
+
+def narrow_ints(table: pa.Table) -> pa.Table:
+    """Cast int64 columns to the smallest integer type holding their values (recorded in the metadata)."""
+    narrowed = []
+    for i, field in enumerate(table.schema):
+        if field.type != pa.int64() or table.num_rows == 0:
+            continue
+        mm = pc.min_max(table.column(i)).as_py()
+        if mm["min"] is None:
+            continue
+        bound = max(-mm["min"] - 1, mm["max"])
+        target = next((t for t, limit in _INT_SIZES if bound < limit), None)
+        if target is not None:
+            table = table.set_column(i, field.name, table.column(i).cast(target))
+            narrowed.append(field.name)
+    return table.replace_schema_metadata({_NARROWED: json.dumps(narrowed).encode()}) if narrowed else table
+
+def widen_sql(table) -> Optional[str]:
+    """SELECT list restoring narrowed integers to BIGINT, or None when nothing was narrowed."""
+    meta = getattr(table, "schema", None) and table.schema.metadata
+    narrowed = set(json.loads(meta[_NARROWED])) if meta and _NARROWED in meta else set()
+    if not narrowed:
+        return None
+    return ", ".join(f'CAST("{f.name}" AS BIGINT) AS "{f.name}"' if f.name in narrowed else f'"{f.name}"'
+                     for f in table.schema)
+
+def keep_columns(columns: List[str], refs: Optional[Set[str]], always=()) -> List[str]:
+    """Columns the SQL may read (`refs`: lower-cased identifiers, None = all), in file order."""
+    if refs is None:
+        return list(columns)
+    keep = [c for c in columns if c.lower() in refs or c in always]
+    return keep or list(columns)
+
+
+class SchemaCache:
+    # process-wide: a resident worker reads each header's schema from the DB once
+    _memo: Dict[str, dict] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, persist: bool = PERSIST):
+        self.persist = persist
+        self.stats = {"cached": 0, "inferred": 0, "refreshed": 0}
+
+    @classmethod
+    def from_plan(cls, limits: dict) -> Optional["SchemaCache"]:
+        """None when limits.typed_reads is false."""
+        return cls() if limits.get("typed_reads", True) else None
+
+    def get(self, key: str) -> Optional[dict]:
+        if key in self._memo:
+            return self._memo[key]
+        schema = None
+        if self.persist:
+            try:
+                from etl_agent import memory
+                memory.init()
+                schema = memory.get_source_schema(key)
+            except Exception:
+                schema = None  # memory DB unavailable: infer as if new
+        if schema:
+            with self._lock:
+                self._memo[key] = schema
+        return schema
+
+    def put(self, key: str, schema: dict, path: str) -> None:
+        with self._lock:
+            self._memo[key] = schema
+        if self.persist:
+            try:
+                from etl_agent import memory
+                memory.init()
+                memory.put_source_schema(key, {**schema, "source": path})
+            except Exception:
+                pass
+
+    def _typed(self, path: str, schema: dict, columns: List[str]) -> pa.Table:
+        types = _arrow_schema(schema, columns)
+        return pcsv.read_csv(path, convert_options=pcsv.ConvertOptions(
+            column_types=types, include_columns=columns, null_values=CSV_NULLS,
+            strings_can_be_null=True, quoted_strings_can_be_null=True))
+
+    def read_csv(self, path: str, refs: Optional[Set[str]] = None, always=()) -> Tuple[pa.Table, str]:
+        """One file as an (un-narrowed) Arrow table of the referenced columns, and how its
+        schema was obtained: cached | inferred | refreshed."""
+        key = header_key(path)
+        schema = self.get(key)
+        status = "inferred"
+        if schema:
+            try:
+                table = self._typed(path, schema, keep_columns(schema["columns"], refs, always))
+                self.stats["cached"] += 1
+                return table, "cached"
+            except (pa.ArrowInvalid, KeyError):
+                status = "refreshed"  # values no longer fit the cached types
+        # the same read an untyped load_csv does; the frame is dropped once converted
+        df = pd.read_csv(path)
+        schema = infer_schema(df)
+        self.put(key, schema, path)
+        self.stats[status] += 1
+        columns = keep_columns(schema["columns"], refs, always)
+        try:
+            return pa.Table.from_pandas(df[columns], schema=_arrow_schema(schema, columns), preserve_index=False), status
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # mixed-type object column: let Arrow parse the text with the new schema
+            return self._typed(path, schema, columns), status
+
+    def read_files(self, paths: List[str], refs: Optional[Set[str]] = None, always=()) -> Tuple[pa.Table, List[str]]:
+        """Several files with one header -> one narrowed table, plus each file's schema status."""
+        tables, statuses = [], []
+        for p in paths:
+            t, st = self.read_csv(p, refs, always)
+            tables.append(t)
+            statuses.append(st)
+        table = tables[0] if len(tables) == 1 else pa.concat_tables(tables, promote_options="permissive")
+        return narrow_ints(table), statuses
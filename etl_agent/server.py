@@ -0,0 +1,287 @@
+"""`etl_agent serve` / `etl_agent submit`: a resident worker and its client.
+
+The server keeps one warm process: imports, the executor snippet, pooled
+SQLAlchemy engines and the plan cache survive across jobs, so a small plan
+costs its own work only. Jobs queue on a bounded thread pool and their
+report_status events can be followed live.
+
+HTTP API (localhost TCP or a Unix socket):
+  POST /jobs               {"prompt": "..."} -> {"job_id", "status"}   (?wait=1 blocks for the result)
+  GET  /jobs/<id>          job status, timings and result
+  GET  /jobs/<id>/events   status events as NDJSON, streamed until the job ends
+  GET  /health             {"status": "ok", "jobs": {...}}
+"""
+import os, sys, json, time, socket, argparse, threading, itertools, traceback
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from typing import Optional
+
+DEFAULT_PORT = int(os.getenv("ETL_AGENT_SERVE_PORT", 8799))
+# finished jobs kept for GET /jobs/<id>
+MAX_FINISHED_JOBS = 1000
+
+
+class Job:
+    def __init__(self, job_id: str, prompt: str, use_cache: bool = True):
+        self.id = job_id
+        self.prompt = prompt
+        self.use_cache = use_cache
+        self.status = "queued"
+        self.submitted = time.time()
+        self.started = self.finished = None
+        self.result = self.error = None
+        self.events = []
+        self.cond = threading.Condition()
+
+    def emit(self, event: dict) -> None:
+        with self.cond:
+            self.events.append(event)
+            self.cond.notify_all()
+
+    def done(self) -> bool:
+        return self.status in ("ok", "failed", "error")
+
+    def to_dict(self) -> dict:
+        out = {"job_id": self.id, "status": self.status, "submitted": self.submitted,
+               "queued_seconds": round((self.started or time.time()) - self.submitted, 4)}
+        if self.started:
+            out["run_seconds"] = round((self.finished or time.time()) - self.started, 4)
+        if self.result is not None:
+            out["result"] = self.result
+        if self.error:
+            out["error"] = self.error
+        return out
+
+
+class JobQueue:
+    def __init__(self, concurrency: int = 2):
+        self.pool = ThreadPoolExecutor(max_workers=max(1, int(concurrency)), thread_name_prefix="etl-job")
+        self.jobs = {}
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, prompt: str, use_cache: bool = True) -> Job:
+        job = Job(f"job-{int(time.time())}-{next(self._seq)}", prompt, use_cache)
+        with self._lock:
+            self.jobs[job.id] = job
+            self._trim()
+        self.pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def counts(self) -> dict:
+        out = {}
+        for j in list(self.jobs.values()):
+            out[j.status] = out.get(j.status, 0) + 1
+        return out
+
+    def _run(self, job: Job) -> None:
+        from etl_agent.ops import status_sink
+        from etl_agent.runtime import run_prompt
+        job.status, job.started = "running", time.time()
+        job.emit({"ts": job.started, "step": "job", "detail": "started"})
+        try:
+            with status_sink(job.emit):
+                job.result = run_prompt(job.prompt, use_cache=job.use_cache)
+            ok = isinstance(job.result, dict) and job.result.get("status") == "ok"
+            status = "ok" if ok else "failed"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.emit({"ts": time.time(), "step": "job", "detail": job.error, "traceback": traceback.format_exc(limit=5)})
+            status = "error"
+        job.finished = time.time()
+        with job.cond:
+            job.status = status
+            job.events.append({"ts": job.finished, "step": "job", "detail": status})
+            job.cond.notify_all()
+
+    def _trim(self) -> None:
+        finished = [j for j in self.jobs.values() if j.done()]
+        for j in sorted(finished, key=lambda j: j.finished)[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[j.id]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    queue: JobQueue = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        if os.getenv("ETL_AGENT_SERVE_LOG", "0") == "1":
+            super().log_message(fmt, *args)
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else "unix"
+
+    def _json(self, code: int, body) -> None:
+        data = json.dumps(body, default=str).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path, _, _ = self.path.partition("?")
+        parts = [p for p in path.split("/") if p]
+        if parts == ["health"]:
+            return self._json(200, {"status": "ok", "pid": os.getpid(), "jobs": self.queue.counts()})
+        if len(parts) >= 2 and parts[0] == "jobs":
+            job = self.queue.get(parts[1])
+            if job is None:
+                return self._json(404, {"error": f"unknown job {parts[1]}"})
+            if parts[2:] == ["events"]:
+                return self._stream(job)
+            if not parts[2:]:
+                return self._json(200, job.to_dict())
+        self._json(404, {"error": f"no route for GET {path}"})
+
+    def do_POST(self):
+        path, _, query = self.path.partition("?")
+        if path.rstrip("/") != "/jobs":
+            return self._json(404, {"error": f"no route for POST {path}"})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        except ValueError as e:
+            return self._json(400, {"error": f"invalid JSON: {e}"})
+        prompt = body.get("prompt") or body.get("plan")
+        if not prompt:
+            return self._json(400, {"error": "body needs 'prompt' (prompt text or plan YAML)"})
+        job = self.queue.submit(prompt, use_cache=body.get("use_cache", True))
+        if "wait=1" in query.split("&") or body.get("wait"):
+            with job.cond:
+                job.cond.wait_for(job.done)
+            return self._json(200, job.to_dict())
+        self._json(202, {"job_id": job.id, "status": job.status})
+
+    def _stream(self, job: Job) -> None:
+        # NDJSON over chunked transfer: one line per report_status event until the job ends
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        sent = 0
+        while True:
+            with job.cond:
+                job.cond.wait_for(lambda: len(job.events) > sent or job.done(), timeout=30)
+                batch, finished = job.events[sent:], job.done()
+            sent += len(batch)
+            for ev in batch:
+                line = (json.dumps(ev, default=str) + "\n").encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.flush()
+            if finished and sent == len(job.events):
+                break
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class _UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+def make_server(queue: JobQueue, host: str = "127.0.0.1", port: int = DEFAULT_PORT, unix_socket: str = ""):
+    handler = type("Handler", (_Handler,), {"queue": queue})
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        return _UnixHTTPServer(unix_socket, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve_main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="etl_agent serve", description="Resident ETL worker with an HTTP/Unix-socket API")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--socket", default=os.getenv("ETL_AGENT_SERVE_SOCKET", ""), help="Listen on this Unix socket instead of TCP.")
+    ap.add_argument("-c", "--concurrency", type=int, default=int(os.getenv("ETL_AGENT_SERVE_CONCURRENCY", 2)),
+                    help="Jobs run at once; the rest wait in the queue.")
+    args = ap.parse_args(argv)
+
+    from etl_agent import runtime
+    runtime.executor_namespace()  # warm before the first job arrives
+    queue = JobQueue(args.concurrency)
+    server = make_server(queue, args.host, args.port, args.socket)
+    where = args.socket or f"http://{args.host}:{args.port}"
+    print(f"etl_agent serving on {where} (concurrency {args.concurrency})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+    return 0
+
+
+# --- client
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+def _connect(url: str = "", unix_socket: str = "", timeout=None):
+    if unix_socket:
+        return _UnixConnection(unix_socket, timeout=timeout)
+    host = (url or f"http://127.0.0.1:{DEFAULT_PORT}").split("://", 1)[-1].rstrip("/")
+    return http.client.HTTPConnection(host, timeout=timeout)
+
+
+def _request(conn, method: str, path: str, body: Optional[dict] = None) -> dict:
+    data = json.dumps(body).encode() if body is not None else None
+    conn.request(method, path, body=data, headers={"Content-Type": "application/json"} if data else {})
+    resp = conn.getresponse()
+    out = json.loads(resp.read() or b"{}")
+    if resp.status >= 400:
+        raise RuntimeError(out.get("error") or f"HTTP {resp.status}")
+    return out
+
+
+def submit(prompt: str, url: str = "", unix_socket: str = "", follow: bool = False, use_cache: bool = True,
+           on_event=None) -> dict:
+    """Submit a prompt/plan to a running server and return the finished job."""
+    conn = _connect(url, unix_socket)
+    try:
+        if not follow:
+            return _request(conn, "POST", "/jobs?wait=1", {"prompt": prompt, "use_cache": use_cache})
+        job_id = _request(conn, "POST", "/jobs", {"prompt": prompt, "use_cache": use_cache})["job_id"]
+        conn.request("GET", f"/jobs/{job_id}/events")
+        resp = conn.getresponse()
+        for line in resp:
+            if line.strip() and on_event:
+                on_event(json.loads(line))
+        return _request(conn, "GET", f"/jobs/{job_id}")
+    finally:
+        conn.close()
+
+
+def submit_main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="etl_agent submit", description="Send a prompt or plan YAML to `etl_agent serve`")
+    ap.add_argument("-p", "--prompt", help="Prompt text OR path to a file containing it (default: stdin).")
+    ap.add_argument("--url", default=os.getenv("ETL_AGENT_SERVE_URL", ""), help=f"Server URL (default http://127.0.0.1:{DEFAULT_PORT}).")
+    ap.add_argument("--socket", default=os.getenv("ETL_AGENT_SERVE_SOCKET", ""), help="Server Unix socket.")
+    ap.add_argument("-f", "--follow", action="store_true", help="Stream status events to stderr while the job runs.")
+    ap.add_argument("--no-plan-cache", action="store_true")
+    args = ap.parse_args(argv)
+
+    from etl_agent.cli import _read_prompt_arg
+    prompt = _read_prompt_arg(args.prompt) if args.prompt else sys.stdin.read()
+    show = lambda ev: print(f"STATUS[{ev.get('step')}]: {ev.get('detail')}", file=sys.stderr)
+    job = submit(prompt, url=args.url, unix_socket=args.socket, follow=args.follow,
+                 use_cache=not args.no_plan_cache, on_event=show)
+    print(json.dumps(job, indent=2, default=str))
+    return 0 if job.get("status") == "ok" else 1
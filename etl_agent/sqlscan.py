@@ -0,0 +1,49 @@
+"""Lightweight SQL scanning for the executor.
+
+Not a parser: literals and comments are blanked out and the remaining
+identifier tokens are matched against known names. Matching is
+case-insensitive like DuckDB's unquoted identifiers, and errs on the side of
+reporting a reference (a CTE that shadows a step name still counts).
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.DOTALL)
+_IDENT = re.compile(r'"((?:[^"]|"")+)"|([A-Za-z_][A-Za-z0-9_$]*)')
+# constructs that read columns without naming them: SELECT * / t.* / DISTINCT ON (...) *,
+# COLUMNS(...), NATURAL joins and PIVOT's implicit grouping
+_ANY_COLUMN = re.compile(r"(?:\bselect|\bdistinct|\ball|,|\.|\))\s*\*|\bcolumns\s*\(|\bnatural\b|\b(?:un)?pivot\b",
+                         re.IGNORECASE)
+
+def strip_literals(sql: str) -> str:
+    """Blank out string literals and comments so their contents are not read as names."""
+    return _LITERALS.sub(" ", sql or "")
+
+def identifiers(sql: str) -> Set[str]:
+    """Every (lower-cased) identifier token in `sql`, quoted or not."""
+    out = set()
+    for quoted, bare in _IDENT.findall(strip_literals(sql)):
+        out.add((quoted.replace('""', '"') if quoted else bare).lower())
+    return out
+
+def references(sql: str, names: Iterable[str]) -> List[str]:
+    """The subset of `names` that `sql` mentions, in the order given."""
+    idents = identifiers(sql)
+    return [n for n in names if n.lower() in idents]
+
+def column_refs(sqls: Iterable[str]) -> Optional[Set[str]]:
+    """Identifiers the SQL could read as input columns, or None when it may read any column."""
+    out = set()
+    for sql in sqls:
+        if _ANY_COLUMN.search(strip_literals(sql)):
+            return None
+        out |= identifiers(sql)
+    return out
+
+def step_dependencies(steps: List[dict]) -> Dict[str, List[str]]:
+    """{step name: earlier step names its SQL reads} for transform.steps."""
+    deps, seen = {}, []
+    for st in steps:
+        deps[st["name"]] = references(st["sql"], seen)
+        seen.append(st["name"])
+    return deps
@@ -0,0 +1,118 @@
+"""Content-addressed memoization of transform steps across runs.
+
+A step's key hashes its SQL together with the keys of everything it reads:
+earlier steps, and inputs fingerprinted from their files (size/mtime, or a
+content checksum with `checksum: true`). Inputs without files (db/api) have
+no key, so steps reading them are never cached. Results are Parquet files in
+a local directory; the index lives in the memory DB and is evicted LRU-first
+once the directory grows past `max_bytes`.
+
+transform.cache: true | {dir, max_bytes, checksum}
+"""
+import os, json, hashlib, threading
+from typing import Dict, Optional
+import duckdb
+from etl_agent.ops import expand_paths, file_fingerprint
+
+DEFAULT_DIR = os.getenv("ETL_AGENT_STEP_CACHE_DIR", os.path.join(".etl_agent_cache", "steps"))
+DEFAULT_MAX_BYTES = int(os.getenv("ETL_AGENT_STEP_CACHE_BYTES", str(5 * 1024**3)))
+
+def _sha(obj) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()
+
+def file_checksum(path: str, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class StepCache:
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None, checksum: bool = False):
+        from etl_agent import memory
+        self.memory = memory
+        memory.init()
+        self.dir = directory or DEFAULT_DIR
+        self.max_bytes = int(max_bytes or DEFAULT_MAX_BYTES)
+        self.checksum = checksum
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+        self.used = set()  # keys hit or stored by this run; eviction never drops them
+        self._lock = threading.Lock()
+        os.makedirs(self.dir, exist_ok=True)
+
+    @classmethod
+    def from_plan(cls, cfg) -> Optional["StepCache"]:
+        """None unless transform.cache is set (true, or a dict of options)."""
+        if not cfg:
+            return None
+        cfg = cfg if isinstance(cfg, dict) else {}
+        return cls(cfg.get("dir"), cfg.get("max_bytes"), bool(cfg.get("checksum", False)))
+
+    def input_key(self, spec: dict, state=None) -> Optional[str]:
+        """Fingerprint of a file-backed input (plus its incremental state), else None."""
+        if spec.get("kind") not in ("csv", "json") or not spec.get("path"):
+            return None
+        files = expand_paths(spec["path"])
+        if self.checksum:
+            prints = [[f, os.path.getsize(f), file_checksum(f)] for f in files]
+        else:
+            prints = [[f] + file_fingerprint(f) for f in files]
+        return _sha({"files": prints, "json_path": spec.get("json_path", ""), "state": state})
+
+    def step_key(self, sql: str, upstream: Dict[str, Optional[str]]) -> Optional[str]:
+        """Hash of the step SQL and its upstream keys; None when any upstream is unkeyed."""
+        if any(k is None for k in upstream.values()):
+            return None
+        return _sha({"sql": " ".join(sql.split()), "upstream": upstream, "duckdb": duckdb.__version__})
+
+    def lookup(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        path = self.memory.get_cached_step(key)
+        if path and os.path.exists(path):
+            with self._lock:
+                self.stats["hits"] += 1
+                self.used.add(key)
+            return path
+        if path:
+            self.memory.drop_cached_step(key)  # file removed behind our back
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def store(self, key: Optional[str], step: str, cur, relation: str) -> Optional[str]:
+        """COPY `relation` (a table/view name visible to `cur`) into the cache under `key`."""
+        if key is None:
+            return None
+        path = os.path.join(self.dir, f"{key}.parquet")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        cur.execute(f"COPY (SELECT * FROM \"{relation}\") TO '{tmp}' (FORMAT parquet)")
+        os.replace(tmp, path)
+        rows = cur.execute(f"SELECT COUNT(*) FROM read_parquet('{path}')").fetchone()[0]
+        self.memory.put_cached_step(key, step, path, os.path.getsize(path), int(rows))
+        with self._lock:
+            self.stats["stored"] += 1
+            self.used.add(key)
+        return path
+
+    def evict(self) -> int:
+        """Drop least recently used entries until the cache fits in max_bytes.
+
+        Entries this run hit or stored are kept even if that leaves the cache over budget.
+        """
+        entries = self.memory.list_cached_steps()
+        total, n = sum(b or 0 for _, _, b in entries), 0
+        for key, path, nbytes in entries:
+            if total <= self.max_bytes:
+                break
+            if key in self.used:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.memory.drop_cached_step(key)
+            total -= nbytes or 0
+            n += 1
+        self.stats["evicted"] += n
+        return n
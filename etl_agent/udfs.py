@@ -0,0 +1,111 @@
+"""Plan-level Python UDFs, registered on the run's DuckDB connection as Arrow UDFs.
+
+    udfs:
+      clean_name:
+        args: [VARCHAR]
+        returns: VARCHAR
+        code: |
+          def clean_name(s):
+              return pc.utf8_capitalize(pc.utf8_trim_whitespace(s))
+      bucket: {function: "mypkg.rules:bucket", args: [DOUBLE], returns: INTEGER, parallel: true}
+
+Step SQL calls them like built-ins (SELECT clean_name(name) FROM input_df). DuckDB
+hands the function one vector (2,048 rows) per call as pyarrow arrays over its own
+buffers and takes back any array of the same length, so no pandas frame is built
+and nothing is copied whole. NULL inputs give NULL without a call unless
+`nulls: pass`; `on_error: null` turns exceptions into NULLs instead of failing the
+step. Calls are serialized by default, for functions that are not thread-safe;
+with `parallel: true` DuckDB's worker threads run batches concurrently
+(pyarrow.compute kernels release the GIL).
+
+Inline `code` runs in-process with pa, pc and np in scope. Plans can come from an LLM
+or a `serve` client, so it is refused unless ETL_AGENT_INLINE_UDFS=1; `function:`
+entries only import code that is already installed.
+"""
+import os, re, json, time, hashlib, inspect, importlib, threading, functools, contextlib
+from typing import Callable, Dict, Optional
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def load_function(name: str, spec: dict) -> Callable:
+    """The Python callable behind a udfs entry: `function: module:attr` or inline `code`."""
+    if spec.get("function"):
+        module, _, attr = spec["function"].replace(":", ".").rpartition(".")
+        if not module:
+            raise ValueError(f"udf {name!r}: function must be 'module:attr'; got {spec['function']!r}")
+        return getattr(importlib.import_module(module), attr)
+    if spec.get("code"):
+        if os.getenv("ETL_AGENT_INLINE_UDFS", "0") != "1":
+            raise ValueError(f"udf {name!r}: inline code is disabled; set ETL_AGENT_INLINE_UDFS=1 to allow it, "
+                             f"or use function: module:attr")
+        ns = {"pa": pa, "pc": pc, "np": np}
+        exec(compile(spec["code"], f"<udf {name}>", "exec"), ns)
+        if not callable(ns.get(name)):
+            raise ValueError(f"udf {name!r}: code must define a function named {name}")
+        return ns[name]
+    raise ValueError(f"udf {name!r}: give either function or code")
+
+
+class UdfSet:
+    def __init__(self, specs: dict):
+        self.specs = {}
+        for name, spec in specs.items():
+            if not _NAME.match(name):
+                raise ValueError(f"udf {name!r}: not a valid SQL function name")
+            if "returns" not in spec:
+                raise ValueError(f"udf {name!r}: returns (a DuckDB type) is required")
+            self.specs[name] = {**spec, "args": list(spec.get("args") or [])}
+        self.functions = {name: load_function(name, spec) for name, spec in self.specs.items()}
+        self.stats = {name: {"calls": 0, "rows": 0, "ms": 0.0} for name in self.specs}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_plan(cls, plan: dict) -> Optional["UdfSet"]:
+        """None when the plan has no udfs section."""
+        return cls(plan["udfs"]) if plan.get("udfs") else None
+
+    def keys(self) -> Dict[str, str]:
+        """{name: fingerprint of its definition}, so cached steps that call a UDF follow its changes."""
+        out = {}
+        for name, spec in self.specs.items():
+            try:
+                source = spec.get("code") or inspect.getsource(self.functions[name])
+            except (OSError, TypeError):
+                source = spec["function"]
+            doc = {k: spec.get(k) for k in ("args", "returns", "nulls", "on_error")}
+            out[name] = hashlib.sha256(json.dumps({**doc, "source": source}, sort_keys=True).encode()).hexdigest()[:16]
+        return out
+
+    def _wrap(self, name: str, fn: Callable, parallel: bool) -> Callable:
+        guard = contextlib.nullcontext() if parallel else threading.Lock()
+        stats = self.stats[name]
+
+        @functools.wraps(fn)  # DuckDB checks the arity against the wrapped signature
+        def call(*arrays):
+            t0 = time.perf_counter()
+            with guard:
+                out = fn(*arrays)
+            ms = (time.perf_counter() - t0) * 1000
+            with self._lock:
+                stats["calls"] += 1
+                stats["rows"] += len(arrays[0]) if arrays else 1
+                stats["ms"] += ms
+            return out
+        return call
+
+    def register(self, con) -> None:
+        """Create every UDF on `con` (cursors of the connection see them too)."""
+        for name, spec in self.specs.items():
+            con.create_function(name, self._wrap(name, self.functions[name], bool(spec.get("parallel"))),
+                                spec["args"], spec["returns"], type="arrow",
+                                null_handling="special" if spec.get("nulls") == "pass" else "default",
+                                exception_handling="return_null" if spec.get("on_error") == "null" else "default",
+                                side_effects=bool(spec.get("side_effects", False)))
+
+    def report(self) -> dict:
+        with self._lock:
+            return {n: {**s, "ms": round(s["ms"], 1)} for n, s in self.stats.items()}
@@ -0,0 +1,84 @@
+import os, sys, json, sqlite3, tempfile, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import pytest
+
+# the memory DB (plan/step/schema caches, run history) is picked at import: keep it out of the checkout
+os.environ.setdefault("etl_agent_MEMORY_URL", f"sqlite:///{tempfile.mkdtemp(prefix='etl_agent_test_')}/memory.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROWS = [{"id": i, "name": f"item {i}", "price": i * 1.5} for i in range(95)]
+PAGE = 10
+
+
+class _Stub(BaseHTTPRequestHandler):
+    """/page (with or without totalPages), /offset and /cursor over ROWS; /flaky answers
+    429 to every other request."""
+    hits = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path in ("/page", "/page-nototal"):
+            p = int(q.get("page", 1))
+            body = {"data": {"items": ROWS[(p - 1) * PAGE:p * PAGE]}}
+            if url.path == "/page":
+                body["totalPages"] = -(-len(ROWS) // PAGE)
+        elif url.path == "/offset":
+            o = int(q.get("offset", 0))
+            body = {"items": ROWS[o:o + int(q.get("limit", PAGE))]}
+        elif url.path == "/cursor":
+            c = int(q.get("cursor", 0))
+            body = {"items": ROWS[c:c + PAGE], "next": c + PAGE if c + PAGE < len(ROWS) else None}
+        elif url.path == "/flaky":
+            type(self).hits += 1
+            if type(self).hits % 2:
+                self.send_response(429)
+                self.send_header("Retry-After", "0")
+                self.end_headers()
+                return
+            body = {"items": ROWS[:3]}
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        out = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+
+@pytest.fixture(scope="session")
+def stub_api():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Stub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+@pytest.fixture
+def source_db(tmp_path):
+    path = tmp_path / "src.db"
+    with sqlite3.connect(path) as c:
+        c.execute("CREATE TABLE t (id INTEGER, grp TEXT, v REAL, note TEXT)")
+        c.executemany("INSERT INTO t VALUES (?, ?, ?, ?)",
+                      [(i, "ab"[i % 2], i / 4, None if i % 3 else f"n{i}") for i in range(100)])
+    return f"sqlite:///{path}"
+
+
+@pytest.fixture(scope="session")
+def pg_url(tmp_path_factory):
+    """A Postgres URL: ETL_AGENT_TEST_PG_URL, else a throwaway pgserver instance, else skip."""
+    if os.getenv("ETL_AGENT_TEST_PG_URL"):
+        return os.environ["ETL_AGENT_TEST_PG_URL"]
+    pgserver = pytest.importorskip("pgserver")
+    pytest.importorskip("psycopg2")
+    data = tmp_path_factory.mktemp("pg")
+    server = pgserver.get_server(str(data), cleanup_mode="stop")
+    yield f"postgresql+psycopg2://postgres@/postgres?host={data}"
+    server.cleanup()
@@ -0,0 +1,67 @@
+import json
+import duckdb
+import pandas as pd
+import pytest
+from etl_agent.ops import dq_check_op, registry_put
+
+
+@pytest.fixture
+def con():
+    con = duckdb.connect()
+    now = pd.Timestamp.now("UTC").tz_localize(None)
+    con.execute("CREATE TABLE t AS SELECT * FROM (VALUES "
+                "(1, 'a', 5.0::DOUBLE, ?::TIMESTAMP, 'x'), (2, 'b', 50.0, ?::TIMESTAMP, 'y'), "
+                "(2, NULL, -1.0, ?::TIMESTAMP, 'z')) v(id, name, price, ts, kind)",
+                [now, now - pd.Timedelta(days=3), now - pd.Timedelta(days=10)])
+    return con
+
+
+def _dq(con, **kw):
+    return json.loads(dq_check_op(con=con, relation="t", **kw))
+
+
+def _rule(res, kind, **match):
+    return next(r for r in res["rules"] if r["rule"] == kind and all(r.get(k) == v for k, v in match.items()))
+
+
+def test_all_rules_in_one_pass(con):
+    res = _dq(con, min_rows=3, nonnull_cols=["id", "name"], unique_cols=["id", ["id", "kind"]],
+              ranges={"price": {"min": 0, "max": 100}}, accepted_values={"kind": ["x", "y"]},
+              freshness_minutes=60, timestamp_col="ts")
+    assert res["rows"] == 3 and not res["status"]
+    assert _rule(res, "nonnull", column="id")["ok"] and _rule(res, "nonnull", column="name")["nulls"] == 1
+    assert _rule(res, "unique", columns=["id"])["duplicates"] == 1
+    assert _rule(res, "unique", columns=["id", "kind"])["ok"]
+    rng = _rule(res, "range", column="price")
+    assert rng["violations"] == 1 and rng["observed_min"] == -1.0
+    assert _rule(res, "accepted_values", column="kind")["violations"] == 1
+    assert _rule(res, "freshness")["ok"]
+    # the first failing rule, in rule order, is the error
+    assert res["error"] == "nonnull check failed: name"
+
+
+def test_missing_columns_are_skipped(con):
+    res = _dq(con, nonnull_cols=["nope"], ranges={"gone": [0, 1]})
+    assert res["status"] and all("skipped" in r for r in res["rules"][1:])
+
+
+def test_min_rows(con):
+    res = _dq(con, min_rows=5)
+    assert not res["status"] and res["error"] == "min_rows check failed: 3 < 5"
+
+
+@pytest.mark.parametrize("values, ok", [
+    (["2026-01-01", "2099-01-01"], True),
+    # month-first text would max lexicographically; it fails instead of passing silently
+    (["12/01/2025", "10/16/2026"], False),
+])
+def test_text_freshness_is_parsed(values, ok):
+    h = registry_put(pd.DataFrame({"ts": values}), "dq")
+    res = json.loads(dq_check_op(h, freshness_minutes=10**9, timestamp_col="ts"))
+    assert _rule(res, "freshness")["ok"] is ok
+
+
+def test_numeric_timestamp_column_is_an_error():
+    res = json.loads(dq_check_op(registry_put(pd.DataFrame({"ts": [1, 2]}), "dq"),
+                                 freshness_minutes=5, timestamp_col="ts"))
+    assert not res["status"] and "not a DATE/TIMESTAMP" in _rule(res, "freshness")["error"]
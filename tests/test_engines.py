@@ -0,0 +1,36 @@
+import threading
+import pytest
+from etl_agent.engines import configure_pool, get_engine, POOL_DEFAULTS
+
+
+@pytest.fixture
+def url(tmp_path):
+    return f"sqlite:///{tmp_path / 'e.db'}"
+
+
+def test_pool_settings_get_their_own_engine(url):
+    plain = get_engine(url)
+    assert get_engine(url) is plain
+    with configure_pool({"size": 2, "recycle": 60}) as opts:
+        assert opts["pool_size"] == 2 and opts["pool_recycle"] == 60
+        sized = get_engine(url)
+        assert sized is not plain and sized.pool.size() == 2
+    # leaving the scope restores the defaults, and the default engine
+    assert get_engine(url) is plain
+
+
+def test_pool_settings_do_not_leak_across_threads(url):
+    seen = {}
+    with configure_pool({"size": 3}):
+        t = threading.Thread(target=lambda: seen.update(eng=get_engine(url)))
+        t.start()
+        t.join()
+        mine = get_engine(url)
+    assert mine.pool.size() == 3
+    assert seen["eng"] is not mine and seen["eng"].pool.size() == POOL_DEFAULTS["pool_size"]
+
+
+def test_unknown_pool_key_is_rejected():
+    with pytest.raises(ValueError, match="limits.pool"):
+        with configure_pool({"sise": 2}):
+            pass
@@ -0,0 +1,27 @@
+import pandas as pd
+import pytest
+import etl_agent.ops as ops
+from etl_agent.ops import registry_put, bulk_load_postgres
+from etl_agent.engines import get_engine
+
+
+def _count(url, table):
+    return int(pd.read_sql(f"SELECT COUNT(*) AS n FROM {table}", get_engine(url))["n"][0])
+
+
+def test_replace_recreates_the_table(pg_url):
+    bulk_load_postgres(registry_put(pd.DataFrame({"a": [1, 2, 3]}), "t"), pg_url, "rep_ok", mode="replace")
+    st = bulk_load_postgres(registry_put(pd.DataFrame({"b": ["x"]}), "t"), pg_url, "rep_ok", mode="replace")
+    assert st["rows_written"] == 1
+    assert list(pd.read_sql("SELECT * FROM rep_ok", get_engine(pg_url)).columns) == ["b"]
+
+
+def test_failed_replace_keeps_the_old_table(pg_url, monkeypatch):
+    bulk_load_postgres(registry_put(pd.DataFrame({"a": [1, 2, 3]}), "t"), pg_url, "rep_keep", mode="replace")
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("copy failed")
+    monkeypatch.setattr(ops, "_copy_into", fail)
+    with pytest.raises(RuntimeError):
+        bulk_load_postgres(registry_put(pd.DataFrame({"a": [9]}), "t"), pg_url, "rep_keep", mode="replace")
+    assert _count(pg_url, "rep_keep") == 3
@@ -0,0 +1,81 @@
+import os, json
+import duckdb
+import pandas as pd
+import pytest
+from etl_agent.ops import registry_put, write_csv_op, verify_csv_op, read_manifest, file_sha256
+
+
+@pytest.fixture
+def written(tmp_path):
+    path = str(tmp_path / "out.csv")
+    df = pd.DataFrame({"id": [1, 2, 3], "name": ["a", None, "c"],
+                       "ts": pd.to_datetime(["2026-01-01", "2026-01-02", "2026-01-03"])})
+    write_csv_op(registry_put(df, "t"), path)
+    return path
+
+
+def _verify(path, **kw):
+    return json.loads(verify_csv_op(path, **kw))
+
+
+def test_manifest_records_the_write(written):
+    man = read_manifest(written)
+    assert man["rows"] == 3 and man["bytes"] == os.path.getsize(written)
+    assert man["sha256"] == file_sha256(written)
+    assert man["columns"]["name"]["nulls"] == 1
+
+
+def test_verify_answers_from_manifest(written):
+    out = _verify(written, min_rows=3, nonnull_cols=["id"])
+    assert out["status"] and out["checked"] == "manifest" and out["rows"] == 3
+    assert not _verify(written, nonnull_cols=["name"])["status"]
+
+
+def test_touched_file_still_verifies(written):
+    st = os.stat(written)
+    os.utime(written, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert _verify(written)["status"]
+
+
+def test_same_size_rewrite_is_a_mismatch(written):
+    with open(written) as f:
+        text = f.read()
+    with open(written, "w") as f:
+        f.write(text.replace("a", "b"))
+    out = _verify(written)
+    assert not out["status"] and out["error"].startswith("manifest_mismatch")
+
+
+def test_size_change_is_a_mismatch(written):
+    with open(written, "a") as f:
+        f.write("4,d,2026-01-04\n")
+    assert _verify(written)["error"].startswith("manifest_mismatch")
+
+
+def test_deep_verify_rereads_the_file(written):
+    out = _verify(written, deep=True, nonnull_cols=["id"])
+    assert out["status"] and out["manifest_ok"] and out["checked"] == "read"
+
+
+def test_relation_write_matches_frame_write(written, tmp_path):
+    con = duckdb.connect()
+    con.register("src", pd.read_csv(written, parse_dates=["ts"]))
+    con.execute("CREATE TABLE final AS SELECT * FROM src")
+    path = str(tmp_path / "rel.csv")
+    write_csv_op(None, path, con=con, relation="final")
+    with open(written, "rb") as a, open(path, "rb") as b:
+        assert a.read() == b.read()
+    assert read_manifest(path)["sha256"] == read_manifest(written)["sha256"]
+    assert _verify(path, min_rows=3)["status"]
+
+
+def test_text_timestamps_compare_as_times(tmp_path):
+    path = str(tmp_path / "text_ts.csv")
+    recent = (pd.Timestamp.now() - pd.Timedelta(days=1)).strftime("%m/%d/%Y")
+    # as strings "12/31/2000" sorts last
+    write_csv_op(registry_put(pd.DataFrame({"ts": ["12/31/2000", recent]}), "t"), path)
+    assert read_manifest(path)["columns"]["ts"]["ts_max"].startswith(recent[-4:])
+    fast = _verify(path, timestamp_col="ts", max_lag_minutes=3 * 24 * 60)
+    deep = _verify(path, timestamp_col="ts", max_lag_minutes=3 * 24 * 60, deep=True)
+    assert fast["fresh_ok"] and deep["fresh_ok"]
+    assert abs(fast["lag_minutes"] - deep["lag_minutes"]) < 1
@@ -0,0 +1,63 @@
+import json, os
+import duckdb
+import pandas as pd
+import pytest
+from etl_agent.executor import run_from_plan
+from etl_agent.ops import write_parquet_op, verify_parquet_op
+
+
+@pytest.fixture
+def con():
+    con = duckdb.connect()
+    now = pd.Timestamp.now("UTC").tz_localize(None)
+    con.execute("CREATE TABLE t AS SELECT i AS id, i % 3 AS grp, CASE WHEN i = 7 THEN NULL ELSE i END AS v, "
+                "?::TIMESTAMP - to_minutes(i) AS ts FROM range(50) r(i)", [now])
+    return con
+
+
+def _verify(path, **kw):
+    return json.loads(verify_parquet_op(str(path), **kw))
+
+
+def test_write_and_verify_from_footers(con, tmp_path):
+    path = tmp_path / "out.parquet"
+    st = write_parquet_op(str(path), con, "t", row_group_size=16)
+    assert st["rows"] == 50 and st["files"] == 1 and st["bytes"] == os.path.getsize(path)
+    out = _verify(path, min_rows=50, nonnull_cols=["id"], timestamp_col="ts", max_lag_minutes=5)
+    assert out["status"] and out["checked"] == "footers" and out["rows"] == 50 and out["lag_minutes"] < 5
+    assert not _verify(path, nonnull_cols=["v"])["nonnull_ok"]
+
+
+def test_partitioned_write(con, tmp_path):
+    path = tmp_path / "out"
+    st = write_parquet_op(str(path), con, "t", partition_by=["grp"])
+    assert st["files"] == 3 and sorted(os.listdir(path)) == ["grp=0", "grp=1", "grp=2"]
+    # partition columns live in directory names: never null
+    assert _verify(path, min_rows=50, nonnull_cols=["grp", "id"])["status"]
+
+
+def test_rewrite_replaces_the_dataset(con, tmp_path):
+    path = tmp_path / "out"
+    write_parquet_op(str(path), con, "t", partition_by=["grp"])
+    con.execute("CREATE TABLE small AS SELECT * FROM t WHERE grp = 0")
+    write_parquet_op(str(path), con, "small", partition_by=["grp"])
+    assert os.listdir(path) == ["grp=0"] and _verify(path)["rows"] == 17
+    assert [p for p in os.listdir(tmp_path) if p.startswith(".")] == []
+
+
+def test_missing_path_fails(tmp_path):
+    assert _verify(tmp_path / "nope.parquet")["error"].startswith("file_not_found")
+
+
+def test_plan_loads_to_parquet(tmp_path):
+    src = tmp_path / "in.csv"
+    src.write_text("id,grp\n" + "".join(f"{i},{i % 2}\n" for i in range(20)))
+    out = tmp_path / "out"
+    res = run_from_plan(f"""
+source: {{kind: csv, csv: {{path: "{src}"}}}}
+transform: {{sql: SELECT * FROM input_df}}
+load: {{to: parquet, file_path: "{out}", partition_by: [grp]}}
+checks: {{min_rows: 1, nonnull_cols: [id]}}
+""")
+    assert res["status"] == "ok" and res["verify"]["rows"] == 20 and res["verify"]["files"] == 2
+    assert duckdb.sql(f"SELECT SUM(id) FROM read_parquet('{out}/**/*.parquet')").fetchone()[0] == 190
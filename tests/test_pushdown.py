@@ -0,0 +1,38 @@
+import pytest
+from etl_agent.executor import run_from_plan
+
+
+def _plan(conn_str, out, stream=True, sql="SELECT grp, COUNT(*) AS n, SUM(v) AS v FROM big "
+                                         "WHERE id >= 40 AND grp = 'a' GROUP BY grp"):
+    return f"""
+source:
+  inputs:
+    big: {{kind: db, conn_str: "{conn_str}", query: "SELECT * FROM t", stream: {str(stream).lower()}, fetch_size: 9}}
+transform:
+  sql: "{sql}"
+load: {{to: csv, file_path: "{out}"}}
+checks: {{min_rows: 1}}
+"""
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_pushdown_into_sqlite(source_db, tmp_path, stream):
+    out = tmp_path / "out.csv"
+    res = run_from_plan(_plan(source_db, out, stream))
+    assert res["status"] == "ok"
+    pushed = res["pushdown"]["big"]
+    # only the referenced columns and the shared predicates reach the upstream query
+    assert pushed["columns"] == ["id", "grp", "v"]
+    assert "WHERE" in pushed["query"] and "fallback" not in pushed
+    if stream:
+        assert res["extract_stream"]["big"]["rows"] == 30
+    assert out.read_text().splitlines()[1].startswith("a,30,")
+
+
+def test_pushdown_off_gives_same_result(source_db, tmp_path):
+    a, b = tmp_path / "a.csv", tmp_path / "b.csv"
+    run_from_plan(_plan(source_db, a))
+    plain = _plan(source_db, b).replace("fetch_size: 9}", "fetch_size: 9, pushdown: false}")
+    res = run_from_plan(plain)
+    assert "pushdown" not in res
+    assert a.read_text() == b.read_text()
@@ -0,0 +1,51 @@
+import os
+import pandas as pd
+import pytest
+from etl_agent.ops import DataFrameRegistry, registry_scope, registry_configure, registry_put, registry_get, _DF_REGISTRY
+
+
+def _frame(n=10_000, seed=0):
+    return pd.DataFrame({"a": range(seed, seed + n), "b": [float(i) for i in range(n)]})
+
+
+def test_over_budget_frames_spill_and_reload(tmp_path):
+    reg = DataFrameRegistry(budget_bytes=200_000, spill_dir=str(tmp_path))
+    first = reg.put(_frame(), "x")
+    second = reg.put(_frame(seed=1), "x")
+    # the least recently used frame went to Parquet; the one just put stays resident
+    assert reg.stats()["spilled"] == 1 and os.listdir(tmp_path)
+    assert reg.resident_bytes() <= 200_000
+    pd.testing.assert_frame_equal(reg.get(first), _frame())
+    assert reg.stats()["reloads"] == 1 and reg.stats()["spilled"] == 1  # reloading it spilled `second`
+    pd.testing.assert_frame_equal(reg.get(second), _frame(seed=1))
+
+
+def test_free_removes_the_spill_file(tmp_path):
+    reg = DataFrameRegistry(budget_bytes=1, spill_dir=str(tmp_path))
+    h = reg.put(_frame(), "x")
+    reg.put(_frame(), "x")
+    assert os.listdir(tmp_path)
+    reg.free(h)
+    assert h not in reg and not os.listdir(tmp_path)
+    with pytest.raises(KeyError):
+        reg.get(h)
+
+
+def test_scope_frees_its_handles_and_keeps_its_own_budget(tmp_path):
+    spilled = []
+    with registry_scope() as owned:
+        registry_configure(1, str(tmp_path), on_spill=lambda h, p: spilled.append((h, p)))
+        a = registry_put(_frame(), "x")
+        b = registry_put(_frame(), "x")
+        assert owned == [a, b] and spilled and spilled[0][0] == a and os.path.exists(spilled[0][1])
+        pd.testing.assert_frame_equal(registry_get(a), _frame())
+    assert a not in _DF_REGISTRY and b not in _DF_REGISTRY and not os.listdir(tmp_path)
+    # the scope's budget did not touch the registry-wide default
+    assert _DF_REGISTRY.budget_bytes != 1
+
+
+def test_object_columns_are_sized_deeply():
+    small = DataFrameRegistry()
+    h1 = small.put(pd.DataFrame({"s": pd.Series(["x"] * 5_000, dtype=object)}), "s")
+    h2 = small.put(pd.DataFrame({"s": pd.Series(["x" * 200] * 5_000, dtype=object)}), "s")
+    assert small._sizes[h2] > small._sizes[h1] + 5_000 * 150
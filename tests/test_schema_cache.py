@@ -0,0 +1,65 @@
+import pyarrow as pa
+import pytest
+from etl_agent.executor import run_from_plan
+from etl_agent.schemacache import SchemaCache, widen_sql
+
+
+@pytest.fixture(autouse=True)
+def fresh_memo(monkeypatch):
+    monkeypatch.setattr(SchemaCache, "_memo", {})
+
+
+@pytest.fixture
+def csv(tmp_path):
+    path = tmp_path / "in.csv"
+    path.write_text("Id,Kind,Price,Note\n" + "".join(f"{i},{'ab'[i % 2]},{i / 2},n{i}\n" for i in range(40)))
+    return path
+
+
+def test_second_read_uses_the_cached_schema(csv):
+    cache = SchemaCache(persist=False)
+    first, how = cache.read_files([str(csv)])
+    assert how == ["inferred"]
+    second, how = cache.read_files([str(csv)])
+    assert how == ["cached"] and second.equals(first)
+    assert pa.types.is_dictionary(second.schema.field("Kind").type)
+    # small integers are narrowed, and widened back at the SQL surface
+    assert second.schema.field("Id").type == pa.int8()
+    assert 'CAST("Id" AS BIGINT)' in widen_sql(second)
+    assert cache.stats == {"cached": 1, "inferred": 1, "refreshed": 0}
+
+
+def test_only_referenced_columns_are_read(csv):
+    cache = SchemaCache(persist=False)
+    cache.read_files([str(csv)])
+    table, _ = cache.read_files([str(csv)], refs={"price"}, always=["Id"])
+    assert table.column_names == ["Id", "Price"]
+
+
+def test_values_that_no_longer_fit_refresh_the_schema(csv):
+    cache = SchemaCache(persist=False)
+    cache.read_files([str(csv)])
+    csv.write_text(csv.read_text() + "x,a,1.0,n\n")
+    table, how = cache.read_files([str(csv)])
+    assert how == ["refreshed"] and table.num_rows == 41 and pa.types.is_string(table.schema.field("Id").type)
+
+
+def test_schema_persists_in_the_memory_db(csv):
+    SchemaCache(persist=True).read_files([str(csv)])
+    SchemaCache._memo.clear()
+    _, how = SchemaCache(persist=True).read_files([str(csv)])
+    assert how == ["cached"]
+
+
+def test_typed_reads_match_untyped(csv, tmp_path):
+    def run(typed):
+        out = tmp_path / f"out_{typed}.csv"
+        res = run_from_plan(f"""
+source: {{kind: csv, csv: {{path: "{csv}"}}}}
+limits: {{typed_reads: {str(typed).lower()}}}
+transform: {{sql: "SELECT Kind, SUM(Id * 1000000000) AS s, MAX(Price) AS p FROM input_df GROUP BY Kind ORDER BY Kind"}}
+load: {{to: csv, file_path: "{out}"}}
+""")
+        assert res["status"] == "ok"
+        return out.read_text()
+    assert run(True) == run(False)
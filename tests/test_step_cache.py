@@ -0,0 +1,82 @@
+import os
+import pytest
+from etl_agent.executor import run_from_plan
+
+
+@pytest.fixture
+def plan(tmp_path):
+    src = tmp_path / "sales.csv"
+    src.write_text("Store,Dept,Weekly_Sales\n" + "".join(f"{i % 5},{i % 3},{i * 10}.5\n" for i in range(60)))
+    out = tmp_path / "out.csv"
+    yml = f"""
+source: {{inputs: {{sales: {{kind: csv, path: "{src}"}}}}}}
+transform:
+  cache: {{dir: "{tmp_path / 'cache'}"}}
+  steps:
+    - name: base
+      sql: SELECT Store, Dept, Weekly_Sales FROM sales WHERE Weekly_Sales > 0
+    - name: by_store
+      sql: SELECT Store, SUM(Weekly_Sales) AS ws FROM base GROUP BY Store
+    - name: by_dept
+      materialize: true
+      sql: SELECT Dept, SUM(Weekly_Sales) AS ws FROM base GROUP BY Dept
+    - name: final
+      sql: |
+        SELECT b.Store, b.Dept, s.ws AS store_ws, d.ws AS dept_ws
+        FROM (SELECT DISTINCT Store, Dept FROM base) b
+        JOIN by_store s USING (Store) JOIN by_dept d USING (Dept) ORDER BY 1, 2
+load: {{to: csv, file_path: "{out}"}}
+checks: {{min_rows: 1}}
+"""
+    return yml, src, out
+
+
+def _cache(res):
+    return {n: st.get("cache") for n, st in res["transform"]["steps"].items()}
+
+
+def test_second_run_hits(plan):
+    yml, _, out = plan
+    first = run_from_plan(yml)
+    assert first["status"] == "ok" and _cache(first)["final"] == "miss"
+    expected = out.read_text()
+    second = run_from_plan(yml)
+    assert second["status"] == "ok"
+    # stored steps are read back from Parquet, so nothing above them runs
+    assert _cache(second) == {"by_dept": "hit", "final": "hit"}
+    assert out.read_text() == expected
+    assert second["dq"]["rows"] == first["dq"]["rows"]
+
+
+def test_changed_input_invalidates(plan):
+    yml, src, out = plan
+    run_from_plan(yml)
+    with open(src, "a") as f:
+        f.write("9,9,1000.5\n")
+    st = os.stat(src)
+    os.utime(src, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    res = run_from_plan(yml)
+    # views (by_store) are never stored; every stored step is recomputed
+    assert _cache(res) == {"base": "miss", "by_store": "off", "by_dept": "miss", "final": "miss"}
+    assert "9,9," in out.read_text()
+
+
+def test_changed_sql_invalidates_only_downstream(plan):
+    yml, _, _ = plan
+    run_from_plan(yml)
+    res = run_from_plan(yml.replace("SUM(Weekly_Sales) AS ws FROM base GROUP BY Dept",
+                                    "MAX(Weekly_Sales) AS ws FROM base GROUP BY Dept"))
+    assert _cache(res) == {"base": "hit", "by_store": "off", "by_dept": "miss", "final": "miss"}
+
+
+def test_eviction_keeps_entries_this_run_reads(plan):
+    yml, _, out = plan
+    run_from_plan(yml)
+    expected = out.read_text()
+    # over budget: the hit final step is a view over its Parquet file until load and verify finish
+    tight = yml.replace('cache: {dir:', 'cache: {max_bytes: 10, dir:')
+    res = run_from_plan(tight)
+    assert res["status"] == "ok" and _cache(res) == {"by_dept": "hit", "final": "hit"}
+    assert out.read_text() == expected
+    assert res["transform"]["cache"]["evicted"] >= 1  # base was not read this run
+    assert _cache(run_from_plan(tight))["final"] == "hit"
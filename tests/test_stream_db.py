@@ -0,0 +1,18 @@
+import duckdb
+import pytest
+from etl_agent.ops import stream_db_op
+
+
+def test_stream_db_batches(source_db):
+    con = duckdb.connect()
+    stats = stream_db_op(source_db, "SELECT * FROM t", con, "big", fetch_size=7)
+    assert stats["rows"] == 100 and stats["batches"] == 15
+    assert con.execute("SELECT COUNT(*), SUM(id) FROM big").fetchone() == (100, 4950)
+    # an all-null first batch column is not typed INTEGER
+    assert con.execute("SELECT typeof(note) FROM big LIMIT 1").fetchone()[0] == "VARCHAR"
+
+
+def test_stream_db_empty_result_keeps_columns(source_db):
+    con = duckdb.connect()
+    stream_db_op(source_db, "SELECT id, grp FROM t WHERE id < 0", con, "empty")
+    assert [d[0] for d in con.execute("SELECT * FROM empty").description] == ["id", "grp"]
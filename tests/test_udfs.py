@@ -0,0 +1,62 @@
+import duckdb
+import pyarrow.compute as pc
+import pytest
+from etl_agent.udfs import UdfSet
+
+CLEAN = {"args": ["VARCHAR"], "returns": "VARCHAR",
+         "code": "def clean(s):\n    return pc.utf8_upper(pc.utf8_trim_whitespace(s))\n"}
+
+
+@pytest.fixture
+def inline(monkeypatch):
+    monkeypatch.setenv("ETL_AGENT_INLINE_UDFS", "1")
+
+
+def _con(udfs):
+    con = duckdb.connect()
+    udfs.register(con)
+    return con
+
+
+def test_inline_code_needs_opt_in(monkeypatch):
+    monkeypatch.delenv("ETL_AGENT_INLINE_UDFS", raising=False)
+    with pytest.raises(ValueError, match="ETL_AGENT_INLINE_UDFS"):
+        UdfSet({"clean": CLEAN})
+
+
+def test_inline_udf_runs_on_vectors(inline):
+    udfs = UdfSet({"clean": CLEAN})
+    con = _con(udfs)
+    rows = con.execute("SELECT clean(s) FROM (VALUES (' ab '), (NULL), ('c')) t(s)").fetchall()
+    # NULL in, NULL out, without a call
+    assert rows == [("AB",), (None,), ("C",)]
+    rep = udfs.report()["clean"]
+    assert rep["calls"] == 1 and rep["rows"] == 2
+
+
+def checked_sqrt(x):
+    return pc.sqrt_checked(x)
+
+
+def test_function_entry_and_on_error(monkeypatch):
+    # importable functions need no opt-in
+    monkeypatch.delenv("ETL_AGENT_INLINE_UDFS", raising=False)
+    udfs = UdfSet({"root": {"function": "test_udfs:checked_sqrt", "args": ["DOUBLE"], "returns": "DOUBLE",
+                            "on_error": "null"}})
+    assert _con(udfs).execute("SELECT root(4.0), root(-1.0)").fetchall() == [(2.0, None)]
+
+
+def test_keys_follow_the_definition(inline):
+    a = UdfSet({"clean": CLEAN}).keys()["clean"]
+    b = UdfSet({"clean": {**CLEAN, "code": CLEAN["code"].replace("upper", "lower")}}).keys()["clean"]
+    assert a != b and a == UdfSet({"clean": CLEAN}).keys()["clean"]
+
+
+@pytest.mark.parametrize("spec, msg", [
+    ({"code": "x = 1", "returns": "INTEGER"}, "must define a function"),
+    ({"function": "nomodule", "returns": "INTEGER"}, "module:attr"),
+    ({"args": ["INTEGER"]}, "returns"),
+])
+def test_bad_definitions_fail_up_front(inline, spec, msg):
+    with pytest.raises(ValueError, match=msg):
+        UdfSet({"f": spec})
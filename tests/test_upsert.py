@@ -0,0 +1,60 @@
+import json
+import pandas as pd
+import pytest
+from etl_agent.ops import registry_put, bulk_load_postgres, verify_table_op
+from etl_agent.engines import get_engine
+
+
+def _upsert(url, table, df, batch):
+    return bulk_load_postgres(registry_put(df, "t"), url, table, mode="upsert", key_cols=["id"],
+                              tag={"batch": batch})
+
+
+def test_batch_tag_does_not_count_as_a_change(pg_url):
+    df = pd.DataFrame({"id": [1, 2, 3], "v": [10, 20, 30]})
+    assert _upsert(pg_url, "ups_tag", df, "b1")["inserted"] == 3
+    again = _upsert(pg_url, "ups_tag", df, "b2")
+    assert (again["inserted"], again["updated"], again["unchanged"]) == (0, 0, 3)
+    changed = _upsert(pg_url, "ups_tag", df.assign(v=[10, 21, 30]), "b3")
+    assert (changed["updated"], changed["unchanged"]) == (1, 2)
+    tags = pd.read_sql("SELECT id, batch FROM ups_tag ORDER BY id", get_engine(pg_url))
+    # the changed row takes the new batch id, the others keep theirs
+    assert list(tags["batch"]) == ["b1", "b3", "b1"]
+    ver = json.loads(verify_table_op(pg_url, "ups_tag", mode="fast", expected_rows=1,
+                                     batch_col="batch", batch_id="b3"))
+    assert ver["run_rows"] == 1 and ver["status"]
+
+
+def _read(url, table):
+    return pd.read_sql(f"SELECT * FROM {table} ORDER BY 1", get_engine(url))
+
+
+def test_merge_inserts_updates_and_dedupes(pg_url):
+    base = pd.DataFrame({"id": [1, 2, 3], "v": ["a", "b", "c"]})
+    st = bulk_load_postgres(registry_put(base, "t"), pg_url, "ups_merge", mode="upsert", key_cols=["id"])
+    assert (st["inserted"], st["index_created"], st["method"]) == (3, True, "copy+merge")
+    # duplicate keys: the last row wins; small merge batches commit one after another
+    batch = pd.DataFrame({"id": [3, 4, 4, 5], "v": ["c", "x", "d", "e"]})
+    st = bulk_load_postgres(registry_put(batch, "t"), pg_url, "ups_merge", mode="upsert", key_cols=["id"],
+                            merge_rows=1)
+    assert (st["inserted"], st["updated"], st["unchanged"], st["duplicates"]) == (2, 0, 1, 1)
+    assert st["merge_batches"] == 3 and not st["index_created"]
+    assert _read(pg_url, "ups_merge")["v"].tolist() == ["a", "b", "c", "d", "e"]
+
+
+def test_composite_keys_and_keys_only(pg_url):
+    df = pd.DataFrame({"a": [1, 1], "b": [1, 2]})
+    for _ in range(2):
+        st = bulk_load_postgres(registry_put(df, "t"), pg_url, "ups_keys", mode="upsert", key_cols=["a", "b"])
+    # no non-key columns: conflicts do nothing
+    assert (st["inserted"], st["unchanged"]) == (0, 2) and len(_read(pg_url, "ups_keys")) == 2
+
+
+@pytest.mark.parametrize("df, keys, msg", [
+    (pd.DataFrame({"id": [1, None], "v": [1, 2]}), ["id"], "NULL in key_cols"),
+    (pd.DataFrame({"id": [1], "v": [1]}), ["nope"], "not in the data"),
+    (pd.DataFrame({"id": [1], "v": [1]}), [], "needs key_cols"),
+])
+def test_bad_keys_are_rejected(pg_url, df, keys, msg):
+    with pytest.raises(ValueError, match=msg):
+        bulk_load_postgres(registry_put(df, "t"), pg_url, "ups_bad", mode="upsert", key_cols=keys)
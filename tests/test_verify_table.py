@@ -0,0 +1,51 @@
+import json
+import pandas as pd
+from etl_agent.ops import registry_put, bulk_load_postgres, verify_table_op
+from etl_agent.engines import get_engine
+
+
+def _fast(url, table, **kw):
+    return json.loads(verify_table_op(url, table, mode="fast", **kw))
+
+
+def test_fast_verify_counts_the_batch_only_through_an_index(pg_url):
+    df = pd.DataFrame({"id": [1, 2, 3], "ts": pd.Timestamp.now("UTC")})
+    bulk_load_postgres(registry_put(df, "t"), pg_url, "ver_fast", mode="replace", tag={"batch": "b1"})
+    out = _fast(pg_url, "ver_fast", expected_rows=3, batch_col="batch", batch_id="b1")
+    assert out["run_rows_source"].startswith("load rowcount") and out["status"]
+    out = _fast(pg_url, "ver_fast", batch_col="batch", batch_id="b1")
+    assert out["run_rows"] is None and out["run_rows_source"].startswith("skipped")
+    with get_engine(pg_url).begin() as c:
+        c.exec_driver_sql("CREATE INDEX ON ver_fast (batch)")
+    out = _fast(pg_url, "ver_fast", expected_rows=3, batch_col="batch", batch_id="b1")
+    assert out["run_rows_source"] == "batch=b1" and out["run_rows"] == 3 and out["status"]
+
+
+def test_fast_verify_without_ts_index_skips_freshness(pg_url):
+    df = pd.DataFrame({"id": [1], "ts": pd.Timestamp("2000-01-01", tz="UTC")})
+    bulk_load_postgres(registry_put(df, "t"), pg_url, "ver_ts", mode="replace")
+    out = _fast(pg_url, "ver_ts", ts_col="ts", max_lag_minutes=5, expected_rows=1)
+    # skipped, so neither passed nor failed
+    assert out["lag_ok"] is None and "no index on ts" in out["warning"] and out["status"]
+    with get_engine(pg_url).begin() as c:
+        c.exec_driver_sql("CREATE INDEX ON ver_ts (ts)")
+    out = _fast(pg_url, "ver_ts", ts_col="ts", max_lag_minutes=5, expected_rows=1)
+    assert out["lag_ok"] is False and not out["status"]
+
+
+def test_exact_and_auto_modes(pg_url, monkeypatch):
+    df = pd.DataFrame({"id": [1, 2], "ts": pd.Timestamp.now("UTC")})
+    bulk_load_postgres(registry_put(df, "t"), pg_url, "ver_exact", mode="replace")
+    out = json.loads(verify_table_op(pg_url, "ver_exact", ts_col="ts", mode="exact"))
+    assert out["rows"] == 2 and out["lag_ok"] and out["status"] and "mode" not in out
+    # auto stays exact for small tables, and goes to the catalog past the threshold
+    assert "mode" not in json.loads(verify_table_op(pg_url, "ver_exact", mode="auto"))
+    monkeypatch.setattr("etl_agent.ops.VERIFY_EXACT_MAX_ROWS", -1)
+    assert json.loads(verify_table_op(pg_url, "ver_exact", mode="auto", expected_rows=2))["mode"] == "fast"
+
+
+def test_fast_mode_errors(pg_url, tmp_path):
+    assert "table not found" in json.loads(verify_table_op(pg_url, "ver_missing", mode="fast"))["error"]
+    assert not json.loads(verify_table_op(pg_url, "ver_exact", mode="quick"))["status"]
+    lite = f"sqlite:///{tmp_path / 'v.db'}"
+    assert "needs a Postgres target" in json.loads(verify_table_op(lite, "t", mode="fast"))["error"]